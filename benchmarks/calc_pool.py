@@ -0,0 +1,73 @@
+"""First-call and steady-state latency of calc, old vs. worker pool.
+
+Run from the repo root with ``python -m benchmarks.calc_pool``.
+"""
+import asyncio
+import statistics
+import time
+
+from cogs.utils.calc import CalcPool
+
+EXPRESSIONS = [
+    'integrate(sin(x)**2, x)',
+    'factorint(2**64 + 1)',
+    'solve(x**2 - 2, x)',
+    'expand((x + y)**8)',
+]
+
+
+def old_calc(body):
+    # what calc used to do on every call, minus the discord bits
+    env = {}
+    exec(f'from sympy.abc import *\nfrom sympy import *\n'
+         f'def func():\n  return {body}', env)
+    return str(env['func']())
+
+
+def report(name, first, rest):
+    print(f'{name:<24} first: {first * 1000:9.2f}ms   '
+          f'steady median: {statistics.median(rest) * 1000:8.2f}ms   '
+          f'max: {max(rest) * 1000:8.2f}ms')
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+async def timed_async(coro):
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+async def main(rounds=20):
+    loop = asyncio.get_event_loop()
+
+    # == New: pool, cold start ==
+    pool = CalcPool(loop)
+    first = await timed_async(pool.evaluate(EXPRESSIONS[0]))
+    rest = [await timed_async(pool.evaluate(e))
+            for _ in range(rounds) for e in EXPRESSIONS]
+    report('pool (cold start)', first, rest)
+    pool.close()
+
+    # == New: pool warmed at cog load, like the bot does ==
+    pool = CalcPool(loop)
+    await pool.warm()
+    first = await timed_async(pool.evaluate(EXPRESSIONS[0]))
+    rest = [await timed_async(pool.evaluate(e))
+            for _ in range(rounds) for e in EXPRESSIONS]
+    report('pool (pre-warmed)', first, rest)
+    pool.close()
+
+    # == Old: in process, on the event loop ==
+    # (last, so the pools above don't fork with sympy already imported)
+    first = timed(old_calc, EXPRESSIONS[0])
+    rest = [timed(old_calc, e) for _ in range(rounds) for e in EXPRESSIONS]
+    report('old (in process)', first, rest)
+
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(main())
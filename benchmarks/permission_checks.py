@@ -0,0 +1,118 @@
+"""Cost of the permission check every mod command runs, the old getattr per
+permission version vs. precompiled masks.
+
+The channel here hands back ready made Permissions, so the old numbers
+don't include resolving roles and overwrites, which the permission cache
+also takes away.
+
+Run from the repo root with ``python -m benchmarks.permission_checks``.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import discord
+
+from cogs.utils.checks import PermissionMask, check_permissions
+from cogs.utils.permcache import PermissionCache
+
+CALLS = 100_000
+
+PERMS = {'manage_messages': True}
+MANY = {'manage_messages': True, 'read_message_history': True,
+        'send_messages': True, 'kick_members': False}
+
+
+def old_test(resolved, perms, check=all):
+    return check(
+        getattr(resolved, name, None) == value for name, value in perms.items()
+    )
+
+
+async def old_check_permissions(ctx, perms, *, check=all, check_both=False):
+    # what checks.check_permissions used to be, check_self left out
+    owner = await ctx.bot.is_owner(ctx.author)
+    if owner and not check_both:
+        return True
+
+    if check_both:
+        resolved1 = ctx.channel.permissions_for(ctx.author)
+        resolved1_check = old_test(resolved1, perms, check)
+        resolved2 = ctx.channel.permissions_for(ctx.guild.me)
+        resolved2_check = old_test(resolved2, perms, check)
+        return (resolved1_check or owner) and resolved2_check
+
+    return old_test(ctx.channel.permissions_for(ctx.author), perms, check)
+
+
+def make_ctx():
+    member_perms = discord.Permissions.none()
+    member_perms.manage_messages = True
+    member_perms.read_message_history = True
+    member_perms.send_messages = True
+
+    guild = SimpleNamespace(id=1)
+    me = SimpleNamespace(id=2, guild=guild)
+    author = SimpleNamespace(id=3, guild=guild)
+    guild.me = me
+
+    async def is_owner(user):
+        return user.id == 0
+
+    channel = SimpleNamespace(id=4, guild=guild,
+                              permissions_for=lambda member: member_perms)
+    bot = SimpleNamespace(is_owner=is_owner, owns=lambda user: user.id == 0,
+                          perm_cache=PermissionCache())
+    return SimpleNamespace(bot=bot, guild=guild, author=author,
+                           channel=channel)
+
+
+def per_call(func, calls=CALLS, rounds=5):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / calls * 1e9
+
+
+def per_call_async(loop, coro_func, calls=CALLS, rounds=5):
+    async def batch():
+        for _ in range(calls):
+            await coro_func()
+
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        loop.run_until_complete(batch())
+        best = min(best, time.perf_counter() - start)
+    return best / calls * 1e9
+
+
+def main():
+    ctx = make_ctx()
+    resolved = ctx.channel.permissions_for(ctx.author)
+
+    print('testing resolved permissions:')
+    for name, perms in (('1 perm', PERMS), ('4 perms', MANY)):
+        mask = PermissionMask(perms)
+        assert old_test(resolved, perms) == mask.test(resolved)
+        old = per_call(lambda: old_test(resolved, perms))
+        new = per_call(lambda: mask.test(resolved))
+        print(f'  {name:<8} old: {old:>7.0f}ns   new: {new:>7.0f}ns   '
+              f'({old / new:.1f}x)')
+
+    print('\nthe whole check, check_both=True:')
+    loop = asyncio.new_event_loop()
+    mask = PermissionMask(PERMS)
+    old = per_call_async(loop, lambda: old_check_permissions(
+        ctx, PERMS, check_both=True))
+    new = per_call(lambda: check_permissions(ctx, mask, check_both=True))
+    print(f'  {"":<8} old: {old:>7.0f}ns   new: {new:>7.0f}ns   '
+          f'({old / new:.1f}x)')
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
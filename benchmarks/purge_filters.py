@@ -0,0 +1,96 @@
+"""Throughput of the purge filters over 10k synthetic messages, old lambdas
+vs. compiled filters.
+
+Run from the repo root with ``python -m benchmarks.purge_filters``.
+"""
+import random
+import re
+import string
+import time
+from types import SimpleNamespace
+
+import emoji
+
+from cogs.utils import filters
+
+MESSAGES = 10_000
+
+WORDS = ['hello', 'there', 'lol', 'the', 'bot', 'is', 'broken', 'again',
+         'free', 'nitro', 'check', 'this', 'out', 'pls', 'why', 'ok']
+EXTRAS = ['', '', '', ' https://example.com/x', ' discord.gg/abcdef',
+          ' \N{THUMBS UP SIGN}', ' <:kek:410612082929565696>', ' naïve',
+          ' \N{FACE WITH TEARS OF JOY}\N{FACE WITH TEARS OF JOY}']
+
+
+def make_messages(count, seed=0):
+    rng = random.Random(seed)
+    users = [SimpleNamespace(id=i, bot=i % 10 == 0, roles=[0] * (i % 3))
+             for i in range(50)]
+
+    messages = []
+    for _ in range(count):
+        words = rng.choices(WORDS, k=rng.randint(1, 40))
+        content = ' '.join(words) + rng.choice(EXTRAS)
+        messages.append(SimpleNamespace(
+            content=content,
+            author=rng.choice(users),
+            embeds=[],
+            attachments=[None] if rng.random() < 0.05 else [],
+        ))
+    return messages
+
+
+URL = r'(?:https?:\/\/)?(?:[\w]+\.)(?:\.?[\w]{2,})+'
+
+# what the purge subcommands used to do, per message. Note that urls and
+# regex used re.match, so the old urls check only ever looked at the very
+# start of a message and isn't doing the same amount of work.
+OLD = {
+    'emoji': lambda m: any([c in emoji.UNICODE_EMOJI for c in m.content])
+    or re.match(r'<:.+:[0-9]+>', m.content),
+    'urls': lambda m: re.match(URL, m.content),
+    'nonascii': lambda m: any([c not in string.printable for c in m.content]),
+    'regex': lambda m: re.match(r'.*nitro', m.content),
+}
+
+NEW = {
+    'emoji': filters.has_emoji(),
+    'urls': filters.has_url(),
+    'nonascii': filters.non_ascii(),
+    'regex': filters.matches(r'.*nitro'),
+}
+
+
+def throughput(check, messages, rounds=5):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for m in messages:
+            check(m)
+        best = min(best, time.perf_counter() - start)
+    return len(messages) / best
+
+
+def main():
+    messages = make_messages(MESSAGES)
+
+    start = time.perf_counter()
+    filters.compile_filter('emoji')
+    print(f'compiling a filter: {(time.perf_counter() - start) * 1000:.2f}ms'
+          f' (the emoji tables are built at import)\n')
+
+    for name in OLD:
+        old = throughput(OLD[name], messages)
+        new = throughput(NEW[name], messages)
+        print(f'{name:<10} old: {old:>12,.0f} msg/s   '
+              f'new: {new:>12,.0f} msg/s   ({new / old:.1f}x)')
+
+    # three separate purges used to mean three history scans
+    combined = filters.compile_filter('bots or (emoji and not urls) or '
+                                      'with:"free nitro"')
+    print(f'\n{"combined":<10} {throughput(combined, messages):>17,.0f} msg/s'
+          f' in one scan')
+
+
+if __name__ == '__main__':
+    main()
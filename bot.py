@@ -22,7 +22,16 @@ from discord.ext.commands.view import StringView
 import config
 from cogs.utils.config import Config
 from cogs.utils.context import Context
+from cogs.utils.members import MemberCache
+from cogs.utils.nameindex import MemberIndex
+from cogs.utils.outbound import OutboundScheduler
 from cogs.utils.paginator import CannotPaginate
+from cogs.utils.paste import PasteStore
+from cogs.utils.permcache import PermissionCache
+from cogs.utils.ratelimit import RateLimited, SpamGuard
+from cogs.utils.recent import RecentMessages
+from cogs.utils.rerun import RerunCache
+from cogs.utils.session import PooledSession
 
 description = "I'm a bot that does stuff"
 
@@ -40,6 +49,7 @@ initial_extensions = [
     'cogs.jokes',
     'cogs.custom',
     'cogs.logging',
+    'cogs.debug',
 ]
 
 
@@ -61,11 +71,15 @@ def _prefix(bot, msg):
 
 class TorGenius(commands.Bot):
     def __init__(self):
+        member_policy = getattr(config, 'member_cache', 'full')
+
         super().__init__(
             command_prefix=_prefix,
             description=description,
             pm_help=None,
-            help_attrs=dict(hidden=True)
+            help_attrs=dict(hidden=True),
+            # only chunk big guilds if we're keeping everyone anyway
+            fetch_offline_members=member_policy == 'full'
         )
 
         _ = self.is_owner(discord.User)
@@ -78,7 +92,30 @@ class TorGenius(commands.Bot):
             r'([NM][a-zA-Z\d]{23}[.][a-zA-Z\d]{6}[.][a-zA-Z\d]{27})'
         )
 
-        self.lockdown = {}
+        self.spam_guard = SpamGuard()
+        self.perm_cache = PermissionCache()
+        self.member_index = MemberIndex()
+        self.member_cache = MemberCache(
+            self,
+            policy=member_policy,
+            active_ttl=getattr(config, 'member_active_ttl', 3600.0)
+        )
+
+        # filled in at login, see refresh_app_info
+        self.app_info = None
+        self.owner_ids = set(getattr(config, 'owner_ids', ()))
+
+        self.outbound = OutboundScheduler(self.loop)
+        self.session = PooledSession(self.loop)
+        self.reruns = RerunCache(ttl=getattr(config, 'rerun_ttl', 300.0))
+        self.recent = RecentMessages(
+            per_channel=getattr(config, 'recent_messages', 200)
+        )
+        self.pastes = PasteStore(
+            self.loop,
+            base_url=getattr(config, 'paste_url', None),
+            port=getattr(config, 'paste_port', 8080)
+        )
 
         self.prefixes = Config('prefixes.json')
 
@@ -125,9 +162,18 @@ class TorGenius(commands.Bot):
             )
         elif isinstance(error, CannotPaginate):
             await ctx.send(error)
+        elif isinstance(error, RateLimited):
+            # only say something once in a while, or the warnings end up
+            # being spam too
+            if error.locked:
+                if self.spam_guard.should_notify(('channel', ctx.channel.id)):
+                    await ctx.send(f'Commands are locked here for the next '
+                                   f'{error.retry_after:.0f} seconds because '
+                                   f'of spam.')
+            elif self.spam_guard.should_notify(ctx.author.id):
+                await ctx.author.send(f'Slow down! Try again in '
+                                      f'{error.retry_after:.0f} seconds.')
         elif isinstance(error, commands.CheckFailure):
-            if self.lockdown.get(ctx.channel, None):
-                return
             if ctx.command.name == 'calc':
                 return await ctx.send(f'You are not allowed to use this '
                                       f'command. If you want to do some math, '
@@ -167,9 +213,30 @@ class TorGenius(commands.Bot):
                 sorted(prefixes, reverse=True, key=lambda p: p[0])
             )
 
+    async def refresh_app_info(self):
+        self.app_info = await self.application_info()
+        self.owner_id = self.app_info.owner.id
+        self.owner_ids.add(self.owner_id)
+
+    def owns(self, user):
+        """Like is_owner, but without the await, since it's all cached at
+        login"""
+        return user.id in self.owner_ids
+
+    async def is_owner(self, user):
+        if self.app_info is None:
+            await self.refresh_app_info()
+        return self.owns(user)
+
     async def on_ready(self):
         print(f'Ready: {self.user} (ID: {self.user.id})')
 
+        # a fresh session, so there might be a gap in what we've seen
+        self.recent.clear()
+        self.perm_cache.clear()
+        self.member_index.clear()
+        self.member_cache.start()
+
         if not hasattr(self, 'uptime'):
             # noinspection PyAttributeOutsideInit
             self.uptime = datetime.datetime.now()
@@ -246,10 +313,35 @@ class TorGenius(commands.Bot):
         if ctx.command is None:
             if "just monika" in message.content.lower():
                 await ctx.send('Just Monika')
-            elif message.content == 'neat' and await self.is_owner(ctx.author) or message.content == 'sudo neat':
+            elif message.content == 'neat' and self.owns(ctx.author) or message.content == 'sudo neat':
                 await ctx.send('neat')
             return
 
+        if message.guild is not None and message.webhook_id is None \
+                and not isinstance(message.author, discord.Member):
+            # not cached, but checks and such need a Member
+            try:
+                member = await self.member_cache.fetch(message.guild,
+                                                       message.author.id)
+            except discord.HTTPException:
+                # the command still gets to run with just the User
+                member = None
+            if member is not None:
+                message.author = member
+
+        self.reruns.track(message.id, message.channel.id)
+
+        # in its own task so that editing the message can cancel it
+        task = self.loop.create_task(self._invoke_with_db(ctx))
+        self.reruns.start(message.id, task)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.reruns.finish(message.id, task)
+
+    async def _invoke_with_db(self, ctx):
         async with ctx.acquire(ctx, None):
             await self.invoke(ctx)
 
@@ -263,13 +355,109 @@ class TorGenius(commands.Bot):
         return ret
 
     async def on_message(self, message):
+        self.recent.add(message)
+        if message.guild is not None:
+            self.member_cache.seen(message.guild.id, message.author.id)
         if message.author.bot:
             return
         await self.process_commands(message)
 
+    async def on_message_edit(self, before, after):
+        self.recent.edit(after)
+
+        # Thanks 『 ᴺᵉᵏᵒ 』#0001 for the idea
+        if after.author.bot or before.content == after.content:
+            # embeds loading in count as edits too
+            return
+
+        entry = self.reruns.pop(after.id)
+        if entry is None:
+            return
+
+        self.reruns.cancel(after.id)
+        self.reruns.reruns += 1
+
+        for response_id in entry.responses:
+            try:
+                await self.http.delete_message(entry.channel_id, response_id)
+            except discord.HTTPException:
+                # already gone
+                pass
+
+        await self.process_commands(after)
+
+    # the raw events, since the others only fire for messages discord.py
+    # still has cached, and the buffer has way more than that
+
+    async def on_raw_message_delete(self, payload):
+        self.recent.delete(payload.channel_id, payload.message_id)
+
+    async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            self.recent.delete(payload.channel_id, message_id)
+
+    # permissions only change when one of these happens
+
+    async def on_guild_role_update(self, before, after):
+        self.perm_cache.forget_guild(after.guild.id)
+
+    async def on_guild_role_delete(self, role):
+        self.perm_cache.forget_guild(role.guild.id)
+
+    async def on_guild_channel_update(self, before, after):
+        self.perm_cache.forget_channel(after.guild.id, after.id)
+
+    async def on_guild_channel_delete(self, channel):
+        self.perm_cache.forget_channel(channel.guild.id, channel.id)
+
+    async def on_guild_update(self, before, after):
+        # the owner has every permission
+        self.perm_cache.forget_guild(after.id)
+
+    # member changes, for both the permission cache and the member index
+
+    async def on_member_join(self, member):
+        self.member_index.add(member)
+
+    async def on_member_update(self, before, after):
+        if before.roles != after.roles:
+            self.perm_cache.forget_member(after.guild.id, after.id)
+        self.member_index.update(before, after)
+
+    async def on_member_remove(self, member):
+        self.perm_cache.forget_member(member.guild.id, member.id)
+        self.member_index.remove(member)
+
+    async def on_member_uncache(self, member):
+        # dropped by the member cache policy, not actually gone
+        await self.on_member_remove(member)
+
+    async def on_member_recache(self, member):
+        # put back by the member cache policy, not actually new
+        await self.on_member_join(member)
+
+    async def on_guild_remove(self, guild):
+        self.perm_cache.forget_guild(guild.id)
+        self.member_index.forget(guild.id)
+
     def run(self):
         super().run(config.token, reconnect=True)
 
+    async def login(self, *args, **kwargs):
+        await super().login(*args, **kwargs)
+        await self.refresh_app_info()
+
+    async def start(self, *args, **kwargs):
+        await self.pastes.start()
+        await super().start(*args, **kwargs)
+
+    async def close(self):
+        self.outbound.close()
+        self.member_cache.close()
+        await self.session.close()
+        await self.pastes.close()
+        await super().close()
+
     # ur face is a redeclaration
     # noinspection PyRedeclaration
     @property
@@ -10,24 +10,34 @@
 # sh command and run_subprocess from dango.py
 
 import asyncio
+import codecs
 import collections
 import copy
 import datetime
 import inspect
 import io
+import json
+import os
 import random
+import re
+import signal
 import subprocess
+import tempfile
 import textwrap
 import time
 import traceback
 from contextlib import redirect_stdout
 
-import aiohttp
 import discord
 from discord.ext import commands
 from texttable import Texttable
 
+import config
+from cogs.utils import explain, timing
+from cogs.utils.cache import ResultCache, normalize_code
+from cogs.utils.calc import CalcPool, cacheable
 from cogs.utils.context import Context
+from cogs.utils.paginator import CursorPages
 
 
 async def run_subprocess(cmd, loop=None):
@@ -50,26 +60,103 @@ async def run_subprocess(cmd, loop=None):
     return [s.decode('utf8') for s in res]
 
 
-async def haste_upload(text):
-    text = str(text)
-    with aiohttp.ClientSession() as session:
-        async with session.post('https://hastebin.com/documents/', data=text,
-                                headers={'Content-Type': 'text/plain'}) as r:
-            r = await r.json()
-            return f'https://hastebin.com/{r["key"]}'
+# how long sh commands get before they're killed, in seconds
+SH_TIMEOUT = 120
+# how much of the output is shown in the live message, in characters
+SH_WINDOW = 1800
+# how much output is kept for the attachment at the end, in bytes
+SH_MAX_BYTES = 8 * 1000 * 1000
+# how often the live message is edited, in seconds
+SH_EDIT_INTERVAL = 1.5
 
+# how many rows the sql command shows at a time
+SQL_PAGE_ROWS = 15
+# statements that take row locks, and give rows back with RETURNING
+SQL_WRITES = re.compile(r'\b(insert|update|delete|merge)\b', re.IGNORECASE)
+# leaves room in the 2000 character message for the code block and footer
+SQL_RENDER_LIMIT = 1850
+# discord's upload limit
+SQL_MAX_UPLOAD = 8 * 1024 * 1024
 
-async def gist_upload(files, public=False, description=''):
-    description = str(description)
-    data = {
-        'description': description,
-        'public': public,
-        'files': files
-    }
-    with aiohttp.ClientSession() as session:
-        async with session.post('https://api.github.com/gists', json=data) as r:
-            json = await r.json()
-            return json['html_url']
+
+def kill_process_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        # not on posix, or it's already gone
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+class StreamedProcess:
+    """Runs a shell command, keeping a rolling window of its output for a
+    live message and spilling all of it (up to a cap) to a temporary file.
+    """
+
+    def __init__(self, cmd, *, timeout=SH_TIMEOUT, window=SH_WINDOW,
+                 max_bytes=SH_MAX_BYTES):
+        self.cmd = cmd
+        self.timeout = timeout
+        self.window = window
+        self.max_bytes = max_bytes
+
+        self.tail = ''
+        self.total_bytes = 0
+        self.timed_out = False
+        self.returncode = None
+        self.spill = tempfile.TemporaryFile()
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+    @property
+    def truncated(self):
+        return self.total_bytes > self.max_bytes
+
+    def _feed(self, chunk):
+        if self.total_bytes < self.max_bytes:
+            self.spill.write(chunk[:self.max_bytes - self.total_bytes])
+        self.total_bytes += len(chunk)
+        self.tail = (self.tail + self._decoder.decode(chunk))[-self.window:]
+
+    async def run(self, on_output):
+        """Run the command, calling ``on_output`` after every read."""
+        # own process group, so the whole tree can be killed on timeout
+        proc = await asyncio.create_subprocess_shell(
+            self.cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+
+        async def pump():
+            while True:
+                chunk = await proc.stdout.read(4096)
+                if not chunk:
+                    break
+                self._feed(chunk)
+                on_output(self)
+            # the shell can still be running after closing its output, so
+            # it gets whatever's left of the timeout to finish
+            return await proc.wait()
+
+        try:
+            self.returncode = await asyncio.wait_for(pump(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out = True
+            kill_process_group(proc)
+        except asyncio.CancelledError:
+            kill_process_group(proc)
+            raise
+
+        # only the group of a command that overran or got cancelled is
+        # killed, things like `nohup ... &` are left running on purpose
+        if self.returncode is None:
+            self.returncode = await proc.wait()
+        self.tail = (self.tail + self._decoder.decode(b'', final=True))[
+            -self.window:]
+        self.spill.seek(0)
+        return self
 
 
 class Admin:
@@ -79,26 +166,25 @@ class Admin:
         self.bot = bot
         self._last_result = None
         self.sessions = set()
-        self.messages = {}
 
         # The following is for the new repl
         self.repl_sessions = {}
         self.repl_embeds = {}
 
+        self.calc_pool = CalcPool(bot.loop)
+        bot.loop.create_task(self.calc_pool.warm())
+        self.calc_cache = ResultCache(
+            'calc', persist=getattr(config, 'persist_result_cache', False),
+            ttl=getattr(config, 'calc_cache_ttl', 86400.0)
+        )
+
+    def __unload(self):
+        self.calc_pool.close()
+
     @staticmethod
     def cleanup_code(content):
         return content.replace('```py\n', '').strip('` \n')
 
-    async def on_message_edit(self, before, after):
-        # Thanks 『 ᴺᵉᵏᵒ 』#0001 for the idea
-        result = self.messages.get(before.id)
-        if not result:
-            return
-
-        trigger, resp = result
-        await resp.delete()
-        await self.bot.process_commands(after)
-
     async def send_response(self, ctx, content, inp, extra=None,
                             file_type='py', raw=False):
         if extra:
@@ -111,32 +197,23 @@ class Admin:
         if extra is None:
             if content:
                 try:
-                    m = await ctx.send(
+                    await ctx.send(
                         content if raw else f'```{file_type}\n{content}\n```'
                     )
-                    self.messages[ctx.message.id] = (ctx.message, m)
                 except discord.HTTPException:
-                    key = await gist_upload(
-                        {f'in.{file_type}': {'content': inp},
-                         f'out.{file_type}': {'content': content}})
-                    m = await ctx.send(key)
-                    self.messages[ctx.message.id] = (ctx.message, m)
+                    await ctx.paste((f'in.{file_type}', inp),
+                                    (f'out.{file_type}', content))
         else:
             try:
-                m = await ctx.send(
+                await ctx.send(
                     content if raw else f'```{file_type}\n{content}{extra}\n```'
                 )
-                self.messages[ctx.message.id] = (ctx.message, m)
             except discord.HTTPException:
-                key = await gist_upload(
-                    {f'in.{file_type}': {'content': inp},
-                     f'out.{file_type}': {'content': content + extra}})
-                m = await ctx.send(key)
-                self.messages[ctx.message.id] = (ctx.message, m)
+                await ctx.paste((f'in.{file_type}', inp),
+                                (f'out.{file_type}', content + extra))
 
-    async def __local_check(self, ctx):
-        k = await self.bot.is_owner(ctx.author)
-        return k
+    def __local_check(self, ctx):
+        return self.bot.owns(ctx.author)
 
     @staticmethod
     def get_syntax_error(e):
@@ -147,9 +224,53 @@ class Admin:
 
     @commands.command()
     async def sh(self, ctx, *, cmd):
-        """Run a batch command on the bot's host"""
+        """Run a batch command on the bot's host, streaming its output"""
+        await ctx.trigger_typing()
+
+        def render(process, status='running...'):
+            # keep the output from closing our code block early
+            output = process.tail.replace('```', '`\u200b``')
+            return f'```sh\n{output}\n```\n*{status}*'
+
+        process = StreamedProcess(cmd)
+        message = await ctx.send(render(process))
+        last_edit = 0
+
+        def on_output(_):
+            nonlocal last_edit
+            now = time.monotonic()
+            if now - last_edit >= SH_EDIT_INTERVAL:
+                last_edit = now
+                # not awaited, edits that pile up get merged by the queue
+                self.bot.outbound.edit(message, content=render(process))
+
+        with process.spill:
+            try:
+                await process.run(on_output)
+            except NotImplementedError:
+                # no subprocess support in this event loop
+                await message.delete()
+                return await self.old_sh(ctx, cmd)
+
+            if process.timed_out:
+                status = f'killed after {process.timeout}s'
+            else:
+                status = f'exited with {process.returncode}'
+
+            await self.bot.outbound.edit(message,
+                                         content=render(process, status))
+
+            if process.total_bytes > len(process.tail.encode('utf-8')):
+                # there's more than what fits in the message
+                note = f'Output truncated to {SH_MAX_BYTES} bytes.' \
+                    if process.truncated else None
+                await ctx.send(
+                    note,
+                    file=discord.File(process.spill, filename='output.txt')
+                )
+
+    async def old_sh(self, ctx, cmd):
         # https://github.com/khazhyk/dango.py/blob/master/plugins/debug.py#L144-L153
-        await ctx.channel.trigger_typing()
         sout, serr = await run_subprocess(cmd)
 
         out = ''
@@ -255,10 +376,9 @@ class Admin:
 
             await self.send_response(ctx, value, to_compile, extra=ret)
 
-    @commands.command(pass_context=True)
-    async def calc(self, ctx, *, body: str):
-        """Evaluates code and returns the result, with sympy"""
-
+    @commands.command(hidden=True, name='timeit')
+    async def _timeit(self, ctx, *, body: str):
+        """Benchmarks some Python code, which can use await"""
         env = {
             'bot': self.bot,
             'ctx': ctx,
@@ -272,42 +392,73 @@ class Admin:
         env.update(globals())
 
         body = self.cleanup_code(body)
-        body = body.splitlines()
-        body[-1] = f'return {body[-1]}'
-        body = '\n'.join(body)
-
-        stdout = io.StringIO()
+        try:
+            func = timing.compile_snippet(body, env)
+        except SyntaxError as e:
+            return await ctx.send(self.format_error(e))
 
-        to_compile = f'from sympy.abc import *\nfrom sympy import *\n' \
-                     f'async def func():\n{textwrap.indent(body, "  ")}'
+        await ctx.trigger_typing()
 
         # noinspection PyBroadException
         try:
-            exec(to_compile, env)
-        except SyntaxError as e:
-            return await self.send_response(
-                ctx, self.format_error(e), None, raw=True
+            with redirect_stdout(io.StringIO()):
+                number, samples = await timing.bench(func)
+        except Exception:
+            return await ctx.send(f'```py\n{traceback.format_exc()}\n```')
+
+        summary = timing.summarize(samples)
+        await ctx.send(
+            f'`{number}` loops \N{MULTIPLICATION SIGN} `{len(samples)}` runs'
+            f' ({"async" if timing.is_async(body) else "sync"}): ' +
+            ', '.join(f'{name} **{timing.format_time(value)}**'
+                      for name, value in summary.items())
+        )
+
+    @commands.command(pass_context=True)
+    async def calc(self, ctx, *, body: str):
+        """Evaluates code and returns the result, with sympy"""
+        await self.run_calc(ctx, body)
+
+    @commands.command(pass_context=True)
+    async def latex(self, ctx, *, body: str):
+        """Same as calc, but the result is given as LaTeX"""
+        await self.run_calc(ctx, body, latex=True)
+
+    async def run_calc(self, ctx, body, *, latex=False):
+        # runs in a warm worker process, so it has no access to the bot
+        body = self.cleanup_code(body)
+        key = f'{"latex" if latex else "str"}:{normalize_code(body)}'
+        # things like randint(1, 6) would be stuck on their first answer
+        use_cache = cacheable(body)
+
+        cached = None
+        if use_cache:
+            cached = await self.calc_cache.get(key, connection=ctx.db)
+        if cached is not None:
+            stdout, result = cached
+        else:
+            start = time.perf_counter()
+            stdout, result, error = await self.calc_pool.evaluate(
+                body, latex=latex
             )
 
-        func = env['func']
+            if error is not None:
+                return await self.send_response(ctx, stdout, body,
+                                                extra=error)
+
+            if use_cache:
+                await self.calc_cache.put(key, (stdout, result),
+                                          time.perf_counter() - start,
+                                          connection=ctx.db)
+
         # noinspection PyBroadException
         try:
-            with redirect_stdout(stdout):
-                ret = await func()
-        except Exception:
-            value = stdout.getvalue()
-            await self.send_response(
-                ctx, value, to_compile, extra=traceback.format_exc()
-            )
-        else:
-            value = stdout.getvalue()
-            # noinspection PyBroadException
-            try:
-                await ctx.auto_react(ctx.emojis.check)
-            except:
-                pass
+            await ctx.auto_react(ctx.emojis.check)
+        except:
+            pass
 
-            await self.send_response(ctx, value, to_compile, extra=ret)
+        await self.send_response(ctx, stdout, body, extra=result,
+                                 file_type='tex' if latex else 'py')
 
     @commands.command(pass_context=True, hidden=True)
     async def old_repl(self, ctx):
@@ -461,58 +612,175 @@ class Admin:
         async with new_ctx.acquire(new_ctx, None):
             await self.bot.invoke(new_ctx)
 
-    @commands.command(hidden=True)
+    @commands.group(hidden=True, invoke_without_command=True)
     async def sql(self, ctx, *, query: str):
-        """Run some SQL."""
-        # the imports are here because I imagine some people would want to use
-        # this cog as a base for their other cog, and since this one is kinda
-        # odd and unnecessary for most people, I will make it easy to remove
-        # for those people.
+        """Run some SQL.
+
+        Rows come out of a server side cursor a page at a time, so a huge
+        SELECT never has to be in memory all at once.
+        """
         query = self.cleanup_code(query)
 
-        is_multistatement = query.count(';') > 1
-        if is_multistatement:
-            # fetch does not support multiple statements
-            strategy = ctx.db.execute
-        else:
-            strategy = ctx.db.fetch
+        if query.count(';') > 1:
+            # cursors and prepared statements don't do multiple statements
+            # noinspection PyBroadException
+            try:
+                start = time.perf_counter()
+                status = await ctx.db.execute(query)
+                dt = (time.perf_counter() - start) * 1000.0
+            except Exception:
+                return await ctx.send(f'```py\n{traceback.format_exc()}\n```')
+            return await ctx.send(f'`{dt:.2f}ms: {status}`')
 
         # noinspection PyBroadException
         try:
             start = time.perf_counter()
-            results = await strategy(query)
-            dt = (time.perf_counter() - start) * 1000.0
+            stmt = await ctx.db.prepare(query)
+            if not stmt.get_attributes():
+                # doesn't return rows, so just show the status instead. Not
+                # in a transaction, things like VACUUM can't run in one.
+                status = await ctx.db.execute(query)
+                dt = (time.perf_counter() - start) * 1000.0
+                return await ctx.send(f'`{dt:.2f}ms: {status}`')
+
+            if SQL_WRITES.search(query):
+                # a write holds its row locks until its transaction is
+                # over, so anything with RETURNING is fetched all at once
+                # instead of being paged through
+                rows = await stmt.fetch()
+                offset = 0
+
+                async def fetch(n):
+                    nonlocal offset
+                    page = rows[offset:offset + n]
+                    offset += n
+                    return page
+
+                return await self.page_rows(ctx, fetch, start)
+
+            # the cursor only lives as long as the transaction, so this stays
+            # open for as long as someone is paging through the results
+            async with ctx.db.transaction():
+                cursor = await stmt.cursor()
+                await self.page_rows(ctx, cursor.fetch, start)
+        except Exception:
+            await ctx.send(f'```py\n{traceback.format_exc()}\n```')
+
+    @staticmethod
+    async def page_rows(ctx, fetch_rows, start):
+        """Paginates rows, ``fetch_rows(n)`` being a coroutine that gets the
+        next ``n`` of them"""
+        rows = await fetch_rows(SQL_PAGE_ROWS)
+        dt = (time.perf_counter() - start) * 1000.0
+
+        if not rows:
+            return await ctx.send(f'`{dt:.2f}ms: no rows`')
+
+        seen = len(rows)
+        more = seen == SQL_PAGE_ROWS
+        first_page = render_rows(rows, 1, more)
+        first_page += f'\n*First page fetched in {dt:.2f}ms*'
+
+        async def fetch():
+            nonlocal seen
+            page = await fetch_rows(SQL_PAGE_ROWS)
+            if not page:
+                return None, False
+
+            offset, seen = seen, seen + len(page)
+            has_more = len(page) == SQL_PAGE_ROWS
+            return render_rows(page, offset + 1, has_more), has_more
+
+        pages = CursorPages(ctx, fetch=fetch, first_page=first_page,
+                            more=more)
+        await pages.paginate()
+
+    @sql.command(name='csv', hidden=True)
+    async def sql_csv(self, ctx, *, query: str):
+        """Run some SQL and attach every row as a CSV file.
+
+        The rows are streamed straight into a temporary file by COPY, so
+        this works no matter how many there are (as long as the file fits
+        in an upload).
+        """
+        # COPY wants a bare query, no trailing semicolon
+        query = self.cleanup_code(query).strip().rstrip(';')
+
+        with tempfile.TemporaryFile() as f:
+            # noinspection PyBroadException
+            try:
+                start = time.perf_counter()
+                status = await ctx.db.copy_from_query(query, output=f,
+                                                      format='csv',
+                                                      header=True)
+                dt = (time.perf_counter() - start) * 1000.0
+            except Exception:
+                return await ctx.send(f'```py\n{traceback.format_exc()}\n```')
+
+            size = f.tell()
+            if size > SQL_MAX_UPLOAD:
+                return await ctx.send(f'The CSV came out to '
+                                      f'{size / 1024 / 1024:.1f} MiB, which '
+                                      f'is too big to upload.')
+
+            f.seek(0)
+            await ctx.send(f'*{status} in {dt:.2f}ms*',
+                           file=discord.File(f, 'results.csv'))
+
+    @sql.command(name='explain', hidden=True)
+    async def sql_explain(self, ctx, *, query: str):
+        """EXPLAIN ANALYZE some SQL and summarize the plan.
+
+        The query is actually run, but inside a transaction that gets rolled
+        back afterwards, so it's safe to explain writes too.
+        """
+        query = self.cleanup_code(query).strip().rstrip(';')
+
+        # noinspection PyBroadException
+        try:
+            tr = ctx.db.transaction()
+            await tr.start()
+            try:
+                raw = await ctx.db.fetchval(
+                    f'EXPLAIN (ANALYZE, BUFFERS, VERBOSE, FORMAT JSON) {query}'
+                )
+            finally:
+                await tr.rollback()
+
+            explained = explain.parse(raw)
+            nodes = explain.flatten(explained['Plan'])
+            rows = await explain.table_rows(ctx.db, nodes)
+            totals = await explain.statement_totals(
+                ctx.db, explained.get('Query Identifier'), query
+            )
         except Exception:
             return await ctx.send(f'```py\n{traceback.format_exc()}\n```')
 
-        rows = len(results)
-        if is_multistatement or rows == 0:
-            return await ctx.send(f'`{dt:.2f}ms: {results}`')
+        e = discord.Embed(title='Query plan', colour=discord.Colour.blurple())
+        for name, value in explain.summarize(explained, rows, totals):
+            e.add_field(name=name, value=value[:1024], inline=False)
 
-        data = [list(results[0].keys())]
-        data.extend([list(r.values()) for r in results])
-        table = Texttable()
-        table.set_cols_dtype(['t'] * len(data[0]))
-        table.add_rows(data)
-        render = table.draw()
+        await ctx.send(embed=e)
+        await ctx.paste(('plan.json', json.dumps(explained, indent=2)))
 
-        fmt = f'```\n{render}\n```\n*Returned {Plural(row=rows)} in {dt:.2f}ms*'
-        if len(fmt) > 2000:
-            await ctx.send((await haste_upload(fmt)))
-        else:
-            await ctx.send(fmt)
 
+def render_rows(rows, first, more):
+    """Draws some records as a table in a code block, numbered from
+    ``first``."""
+    data = [list(rows[0].keys())]
+    data.extend([list(r.values()) for r in rows])
+    table = Texttable()
+    table.set_cols_dtype(['t'] * len(data[0]))
+    table.add_rows(data)
+    render = table.draw()
 
-class Plural:
-    def __init__(self, **attr):
-        iterator = attr.items()
-        self.name, self.value = next(iter(iterator))
+    last = first + len(rows) - 1
+    footer = f'*Rows {first}-{last}{"" if more else " (end)"}*'
+    if len(render) > SQL_RENDER_LIMIT:
+        render = render[:SQL_RENDER_LIMIT] + '\N{HORIZONTAL ELLIPSIS}'
+        footer += ' *(cut off, use `sql csv` to see everything)*'
 
-    def __str__(self):
-        v = self.value
-        if v == 0 or v > 1:
-            return f'{v} {self.name}s'
-        return f'{v} {self.name}'
+    return f'```\n{render}\n```\n{footer}'
 
 
 def setup(bot):
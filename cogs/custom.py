@@ -95,7 +95,8 @@ class CustomCommands:
             entries=[
                 name for name, e in self.config
                 if query in e['text'] or query in name
-            ]
+            ],
+            pack=True
         )
 
         if not p.entries:
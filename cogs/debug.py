@@ -0,0 +1,245 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+import copy
+import tracemalloc
+from collections import OrderedDict
+
+import discord
+from discord.ext import commands
+
+from cogs.utils import memory
+from cogs.utils.context import Context
+from cogs.utils.members import POLICIES
+from cogs.utils.profiling import Profiler
+
+
+# snapshots hold on to every traced allocation, so don't keep too many
+MAX_SNAPSHOTS = 8
+
+
+def format_stats(stats):
+    return '\n'.join(f'**{name}**: {value}' for name, value in stats.items())
+
+
+class Debug:
+    """Owner commands for poking at the bot's internals"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        # name -> tracemalloc.Snapshot, oldest first
+        self.snapshots = OrderedDict()
+
+    def __unload(self):
+        self.snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def __local_check(self, ctx):
+        return self.bot.owns(ctx.author)
+
+    @commands.command(hidden=True)
+    async def stats(self, ctx):
+        """Show the bot's internal counters"""
+        e = discord.Embed(title='Stats', color=discord.Color.blurple())
+
+        e.add_field(name='HTTP', value=format_stats(self.bot.session.stats()))
+        e.add_field(name='Outbound',
+                    value=format_stats(self.bot.outbound.stats()))
+        e.add_field(name='Pastes', value=format_stats(self.bot.pastes.stats()))
+        e.add_field(name='Reruns', value=format_stats(self.bot.reruns.stats()))
+        e.add_field(name='Anti-spam',
+                    value=format_stats(self.bot.spam_guard.stats()))
+        e.add_field(name='Permissions',
+                    value=format_stats(self.bot.perm_cache.stats()))
+        e.add_field(name='Members',
+                    value=format_stats(self.bot.member_cache.stats()))
+        e.add_field(name='Member index',
+                    value=format_stats(self.bot.member_index.stats()))
+        e.add_field(name='Recent messages',
+                    value=format_stats(self.bot.recent.stats()))
+
+        for cog_name, attr in (('Admin', 'calc_cache'),
+                               ('Search', 'quick_cache')):
+            cache = getattr(self.bot.get_cog(cog_name), attr, None)
+            if cache is not None:
+                e.add_field(name=f'{cache.name.title()} cache',
+                            value=format_stats(cache.stats()))
+
+        info = self.bot.get_cog('Info')
+        if info is not None:
+            e.add_field(name='Swatches',
+                        value=format_stats(info.swatches.stats()))
+
+        await ctx.send(embed=e)
+
+    @commands.command(hidden=True)
+    async def profile(self, ctx, *, command_line):
+        """Run a command with the profiler on and show where the time went.
+
+        Only that one invocation is profiled, the rest of the bot isn't.
+        Background tasks the command starts aren't included either.
+        """
+        fake_msg = copy.copy(ctx.message)
+
+        # noinspection PyProtectedMember
+        fake_msg._update(
+            ctx.message.channel,
+            dict(
+                content=ctx.prefix + command_line
+            )
+        )
+
+        new_ctx = await self.bot.get_context(fake_msg, cls=Context)
+        if new_ctx.command is None:
+            return await ctx.send('No command called that.')
+
+        profiler = Profiler()
+        async with new_ctx.acquire(new_ctx, None):
+            await profiler.run(self.bot.invoke(new_ctx))
+
+        top = '\n'.join(profiler.top())
+        await ctx.send(f'Took {profiler.wall_time * 1000:.2f}ms, '
+                       f'{sum(profiler.samples.values())} samples. '
+                       f'Top functions by cumulative time:\n'
+                       f'```\n{top[:1800]}\n```')
+        await ctx.paste(('profile.folded', profiler.folded()),
+                        ('profile.txt', profiler.report()))
+
+    @commands.group(hidden=True, invoke_without_command=True)
+    async def mem(self, ctx):
+        """Show memory usage and gc counts"""
+        rss = memory.rss()
+        lines = [
+            f'**RSS**: {memory.format_bytes(rss) if rss else "unknown"}',
+            '**gc**: ' + ', '.join(
+                f'gen {gen}: {pending} pending, {collections} collections'
+                for gen, (pending, collections)
+                in enumerate(memory.gc_counts())
+            ),
+        ]
+
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f'**Traced**: {memory.format_bytes(current)} '
+                         f'(peak {memory.format_bytes(peak)})')
+            lines.append(f'**Snapshots**: '
+                         f'{", ".join(self.snapshots) or "none"}')
+        else:
+            lines.append('**Traced**: not tracing')
+
+        await ctx.send('\n'.join(lines))
+
+    @mem.command(name='guilds', hidden=True)
+    async def mem_guilds(self, ctx, count: int = 10):
+        """Estimate how much memory the biggest guilds' members take up, now
+        and with every member cache policy"""
+        guilds = sorted(self.bot.guilds, reverse=True,
+                        key=lambda g: g.member_count or len(g.members))
+        rows = [('guild', 'cached', 'now', *POLICIES)]
+        for guild in guilds[:count]:
+            estimate = self.bot.member_cache.estimate(guild)
+            rows.append((
+                guild.name[:20], str(len(guild.members)),
+                *(memory.format_bytes(int(estimate[k]))
+                  for k in ('now', *POLICIES))
+            ))
+
+        widths = [max(len(cell) for cell in column) for column in zip(*rows)]
+        table = '\n'.join('  '.join(cell.ljust(width)
+                                    for cell, width in zip(row, widths))
+                          for row in rows)
+        await ctx.send(f'Policy: **{self.bot.member_cache.policy}**\n'
+                       f'```\n{table[:1900]}\n```')
+
+    @mem.command(name='start', hidden=True)
+    async def mem_start(self, ctx, frames: int = 25):
+        """Start tracing allocations, keeping `frames` frames of each.
+
+        Allocations get credited to the closest cog in their frames, so
+        with too few frames things end up credited to discord.py instead.
+        """
+        if tracemalloc.is_tracing():
+            return await ctx.send('Already tracing.')
+
+        tracemalloc.start(frames)
+        await ctx.auto_react()
+
+    @mem.command(name='stop', hidden=True)
+    async def mem_stop(self, ctx):
+        """Stop tracing and throw out all the snapshots"""
+        tracemalloc.stop()
+        self.snapshots.clear()
+        await ctx.auto_react()
+
+    @mem.command(name='snap', hidden=True)
+    async def mem_snap(self, ctx, name: str):
+        """Take a snapshot and save it as `name`"""
+        if not tracemalloc.is_tracing():
+            return await ctx.send('Not tracing, use `mem start` first.')
+
+        snapshot = await self.bot.loop.run_in_executor(None,
+                                                       memory.take_snapshot)
+        self.snapshots.pop(name, None)
+        self.snapshots[name] = snapshot
+        while len(self.snapshots) > MAX_SNAPSHOTS:
+            self.snapshots.popitem(last=False)
+
+        current, _ = tracemalloc.get_traced_memory()
+        await ctx.send(f'Saved `{name}`, '
+                       f'{memory.format_bytes(current)} traced.')
+
+    @mem.command(name='diff', hidden=True)
+    async def mem_diff(self, ctx, old: str, new: str = None):
+        """Show what grew between two snapshots.
+
+        If `new` isn't given, it's compared against right now.
+        """
+        try:
+            before = self.snapshots[old]
+            if new is None:
+                if not tracemalloc.is_tracing():
+                    return await ctx.send('Not tracing anymore.')
+                after = None
+            else:
+                after = self.snapshots[new]
+        except KeyError as e:
+            return await ctx.send(f'No snapshot called {e}.')
+
+        def work():
+            # all of this is slow with a lot of traces, so it's done off
+            # the event loop
+            nonlocal after
+            if after is None:
+                after = memory.take_snapshot()
+            return (memory.diff_by_module(before, after),
+                    memory.diff_by_line(before, after))
+
+        await ctx.trigger_typing()
+        by_module, by_line = await self.bot.loop.run_in_executor(None, work)
+
+        e = discord.Embed(title=f'{old} \N{RIGHTWARDS ARROW} {new or "now"}',
+                          color=discord.Color.blurple())
+        e.add_field(name='By module', inline=False, value='\n'.join(
+            f'`{memory.format_bytes(size, sign=True)}` ({count:+}) {module}'
+            for module, size, count in by_module[:10]
+        )[:1024] or 'Nothing changed.')
+
+        lines = []
+        for stat in by_line[:10]:
+            frame = stat.traceback[0]
+            lines.append(f'`{memory.format_bytes(stat.size_diff, sign=True)}`'
+                         f' {memory.module_for(frame.filename)}:'
+                         f'{frame.lineno}')
+        e.add_field(name='By line', inline=False,
+                    value='\n'.join(lines)[:1024] or 'Nothing changed.')
+
+        await ctx.send(embed=e)
+        await ctx.paste(('diff.txt', '\n'.join(
+            str(stat) for stat in by_line[:200]
+        )))
+
+
+def setup(bot):
+    bot.add_cog(Debug(bot))
@@ -10,9 +10,9 @@ import json
 from urllib import request
 from discord.ext import commands
 
-from cogs.admin import gist_upload
 from cogs.utils.checks import tor_only
 from cogs.utils.encode_operations import EncodeOperations
+from cogs.utils.nameindex import IndexedMember
 
 log = logging.getLogger(__name__)
 
@@ -133,7 +133,7 @@ class Fun:
         await ctx.send(' '.join(random.sample(choices, len(choices))))
 
     @commands.command()
-    async def warn(self, ctx, member: commands.MemberConverter, *, _=None):
+    async def warn(self, ctx, member: IndexedMember, *, _=None):
         """Meme warn. Doesn't actually do anything."""
         member = ctx.author if not member else member
         text = await commands.clean_content().convert(ctx, member.name)
@@ -171,7 +171,7 @@ class Fun:
         if iterations > 10:
             return await ctx.send("You can't do that many interations.")
 
-        await ctx.channel.trigger_typing()
+        await ctx.trigger_typing()
 
         for _ in range(1, iterations):
             message = getattr(
@@ -182,11 +182,7 @@ class Fun:
             )(message)
 
         if len(message) > 600:
-            key = await gist_upload(
-                {'encoding': {'content': message}}
-            )
-
-            await ctx.send(key)
+            await ctx.paste(('encoding.txt', message))
         else:
             await ctx.send(f'```{message}```')
 
@@ -215,10 +211,10 @@ class Fun:
         m = await ctx.send(gen_message())
         await asyncio.sleep(random.uniform(.5, 2.5))
         for _ in range(1, count):
-            await m.edit(content=gen_message())
+            await self.bot.outbound.edit(m, content=gen_message())
             await asyncio.sleep(random.uniform(.5, 2.5))
 
-        await m.edit(content='Done for real!')
+        await self.bot.outbound.edit(m, content='Done for real!')
 
     @staticmethod
     async def on_message(message):
@@ -1,14 +1,14 @@
 import io
 import locale
-from collections import Counter
+import time
 from datetime import datetime
 
 import discord
 import humanize
-from PIL import Image, ImageDraw
 from discord.ext import commands
 
-from cogs.utils import db
+from cogs.utils import db, histogram, swatches
+from cogs.utils.memberstats import MemberStats
 from cogs.utils.paginator import Pages
 
 # following is from
@@ -32,7 +32,7 @@ class LangTable(db.Table, table_name='lang'):
 # use function here because we don't need `ctx`
 # We also call it with a splat, so we get one at a time
 def parse_color(arg):
-    arg.strip('#')  # so what if it ends in "#"
+    arg = arg.strip('#')  # so what if it ends in "#"
 
     # Try to cast to int
     try:
@@ -52,6 +52,11 @@ def parse_color(arg):
 class Info:
     def __init__(self, bot):
         self.bot = bot
+        # guild id -> MemberStats, made the first time they're asked for
+        self.member_stats = {}
+        self.swatches = swatches.SwatchCache()
+        # guild id -> GuildDates, also made the first time they're asked for
+        self.member_dates = {}
 
     @staticmethod
     async def __error(ctx, err):
@@ -104,6 +109,50 @@ class Info:
         await ctx.send(f'{member.display_name} created their account '
                        f'{format_time(member.created_at)}')
 
+    @commands.command(name='histogram', aliases=['joins'])
+    @commands.guild_only()
+    async def date_histogram(self, ctx, kind: str.lower = 'joined',
+                             days: int = None):
+        """Graph when everyone joined, or when their accounts were made
+
+        `kind` is either joined or created. Goes back `days` days, or all
+        the way back if that's left out."""
+        if kind not in histogram.KINDS:
+            raise commands.BadArgument(
+                f'That has to be one of {", ".join(histogram.KINDS)}.'
+            )
+        if days is not None and days <= 0:
+            raise commands.BadArgument('That has to be at least one day.')
+
+        dates = self.member_dates.get(ctx.guild.id)
+        if dates is None:
+            dates = self.member_dates[ctx.guild.id] = \
+                histogram.GuildDates(ctx.guild.members)
+
+        values = dates[kind]
+        if not values:
+            return await ctx.send('There aren\'t any dates to show.')
+
+        end = time.time()
+        # nobody's older than the oldest date, and a huge days would go
+        # past what datetime can even show
+        start = max(end - days * 86400, values[0]) if days else values[0]
+        counts = dates.histogram(kind, start, end)
+
+        title = f'{ctx.guild.name}: members by ' \
+                f'{"join" if kind == "joined" else "account creation"} date'
+        png = await self.bot.loop.run_in_executor(
+            None, histogram.render, counts, start, end, title
+        )
+        message = f'{sum(counts)} members, up to {max(counts)} in one bar.'
+        if self.bot.member_cache.policy != 'full':
+            # everyone else was never fetched, or got pruned
+            message += ' This only counts members that are cached, which ' \
+                       'with the current member cache policy isn\'t ' \
+                       'everyone.'
+        await ctx.send(message, file=discord.File(io.BytesIO(png),
+                                                  filename=f'{kind}.png'))
+
     @commands.command()
     async def emojis(self, ctx, *, query=''):
         """List the servers emojis without spamming."""
@@ -113,91 +162,112 @@ class Info:
         if not entries:
             return await ctx.send('No results found for query.')
 
-        p = Pages(ctx, entries=entries)
+        p = Pages(ctx, entries=entries, pack=True)
         await p.paginate()
 
-    @commands.command()
-    async def games(self, ctx, *, query: str.lower = ''):
-        """Search or list games, sorted by most common"""
-
-        count = Counter([
-            u.activity.name
-            for u in ctx.guild.members
-            if u.activity and query in u.activity.name.lower()
-        ])
+    def stats_for(self, guild):
+        stats = self.member_stats.get(guild.id)
+        if stats is None:
+            stats = self.member_stats[guild.id] = MemberStats(guild.members)
+        return stats
 
-        p = Pages(ctx, entries=[
-            f'**{i[0]}**: {i[1]}' for i in count.most_common()
-        ])
+    async def ranked(self, ctx, kind, query):
+        counter = self.stats_for(ctx.guild)[kind]
+        entries = [f'**{key}**: {count}'
+                   for key, count in counter.most_common(query)]
 
+        p = Pages(ctx, entries=entries, pack=True)
         await p.paginate()
 
+    @commands.command()
+    async def games(self, ctx, *, query: str.lower = ''):
+        """Search or list games, sorted by most common"""
+        await self.ranked(ctx, 'games', query)
+
     @commands.command()
     async def names(self, ctx, *, query: str.lower = ''):
         """Search or list names on this guild, sorted by most common"""
-
-        count = Counter([
-            u.name
-            for u in ctx.guild.members
-            if query in u.name.lower()
-        ])
-
-        p = Pages(ctx, entries=[
-            f'**{i[0]}**: {i[1]}' for i in count.most_common()
-        ])
-
-        await p.paginate()
+        await self.ranked(ctx, 'names', query)
 
     @commands.command()
     async def nicks(self, ctx, *, query: str.lower = ''):
         """Search or list nicks on this guild, sorted by most common"""
+        await self.ranked(ctx, 'nicks', query)
+
+    # == Keeping member_stats and member_dates up to date ==
+
+    async def on_member_join(self, member):
+        for cache in (self.member_stats, self.member_dates):
+            cached = cache.get(member.guild.id)
+            if cached is not None:
+                cached.add(member)
+
+    async def on_member_remove(self, member):
+        for cache in (self.member_stats, self.member_dates):
+            cached = cache.get(member.guild.id)
+            if cached is not None:
+                cached.remove(member)
+
+    async def on_member_uncache(self, member):
+        # the member cache policy dropped them, so they're not counted
+        # anymore either
+        await self.on_member_remove(member)
+
+    async def on_member_recache(self, member):
+        await self.on_member_join(member)
+
+    async def on_member_update(self, before, after):
+        # presence updates (games) come through here too
+        stats = self.member_stats.get(after.guild.id)
+        if stats is not None:
+            stats.update(before, after)
+
+    async def on_guild_remove(self, guild):
+        self.member_stats.pop(guild.id, None)
+        self.member_dates.pop(guild.id, None)
+
+    async def on_guild_available(self, guild):
+        # its members were (re)chunked, so whatever was counted before
+        # could be missing people
+        self.member_stats.pop(guild.id, None)
+        self.member_dates.pop(guild.id, None)
+
+    async def on_ready(self):
+        # anything could have changed while we weren't connected, and this
+        # is when the first member chunks are all in
+        self.member_stats.clear()
+        self.member_dates.clear()
+
+    async def send_swatch(self, ctx, kind, colors, filename):
+        try:
+            png = await self.swatches.render(
+                self.bot.loop, kind, [c.value for c in colors]
+            )
+        except ValueError as e:
+            return await ctx.send(e)
 
-        count = Counter([
-            u.display_name
-            for u in ctx.guild.members
-            if query in u.display_name.lower()
-        ])
-
-        p = Pages(ctx, entries=[
-            f'**{i[0]}**: {i[1]}' for i in count.most_common()
-        ])
+        await ctx.send(file=discord.File(io.BytesIO(png), filename=filename))
 
-        await p.paginate()
-
-    @commands.command()
+    @commands.group(invoke_without_command=True)
     async def color(self, ctx, *colors: parse_color):
         """Generate a color(s)"""
+        if not colors:
+            return await ctx.show_help('color')
 
-        # == Parsing ==
-
-        colors = [(
-            col.value >> 16,
-            col.value >> 8 & 0xff,
-            col.value & 0xff
-        ) for col in colors]
-
-        # == Drawing ==
-
-        # Each square is 256 by 256
-        width = 256 * len(colors)
-
-        # background is same color as start to be lazy
-        image = Image.new('RGB', (width, 256), colors[0])
-        draw = ImageDraw.Draw(image)
+        await self.send_swatch(
+            ctx, 'grid', colors,
+            'color.png' if len(colors) == 1 else 'colors.png'
+        )
 
-        for i in range(1, len(colors)):
-            draw.rectangle((256 * i, 0, 256 * (i + 1), 256), colors[i])
+    @color.command(name='gradient')
+    async def color_gradient(self, ctx, *colors: parse_color):
+        """A gradient going through some colors"""
+        await self.send_swatch(ctx, 'gradient', colors, 'gradient.png')
 
-        # == Sending ==
-        bio = io.BytesIO()
-        image.save(bio, 'PNG')
-        bio.seek(0)
-        await ctx.send(
-            file=discord.File(
-                bio,
-                filename='color.png' if len(colors) == 1 else 'colors.png'
-            )
-        )
+    @color.command(name='palette', aliases=['shades'])
+    async def color_palette(self, ctx, *colors: parse_color):
+        """Shades and tints of some colors"""
+        await self.send_swatch(ctx, 'palette', colors, 'palette.png')
 
     @commands.command()
     async def uptime(self, ctx, exact: bool = False):
@@ -8,7 +8,7 @@ class BotLogging:
         self.bot = bot
 
     async def on_command(self, ctx):
-        is_owner = await self.bot.is_owner(ctx.author)
+        is_owner = self.bot.owns(ctx.author)
         if ctx.guild is None and not is_owner:
             await self.bot.get_channel(400869729323057162).send(
                 f'Command ran in DM by {ctx.author}: '
@@ -3,11 +3,12 @@ import re
 import textwrap
 from math import floor
 
-import aiohttp
 import discord
 from PIL import Image, ImageFont, ImageDraw
 from discord.ext import commands
 
+from cogs.utils.nameindex import IndexedMember
+
 
 # Meme commands improved by Samrux :)
 
@@ -22,10 +23,8 @@ image_url = re.compile(
 )
 
 
-async def download(url):
-    async with aiohttp.ClientSession() as sess:
-        async with sess.get(url) as r:
-            return io.BytesIO(await r.read())
+async def download(session, url):
+    return io.BytesIO(await session.content(url))
 
 
 def img_bio(img):
@@ -78,10 +77,13 @@ class RichArgument(commands.Converter):
     async def convert(self, ctx, argument):
         # Avatar
         try:
-            possible_member = await commands.MemberConverter().convert(ctx, argument)
+            # not loose, or most text would turn into someone's avatar
+            possible_member = await IndexedMember(loose=False).convert(
+                ctx, argument
+            )
             url = possible_member.avatar_url_as(format='png')
             url = url.replace('gif', 'png').strip('<>')
-            img = await download(url)
+            img = await download(ctx.bot.session, url)
             return Image.open(img).convert('RGBA')
 
         except commands.BadArgument:
@@ -89,7 +91,7 @@ class RichArgument(commands.Converter):
 
         # Image
         if re.fullmatch(image_url, argument):
-            img = await download(argument.strip('<>'))
+            img = await download(ctx.bot.session, argument.strip('<>'))
             return Image.open(img).convert('RGBA')
 
         # Text
@@ -119,7 +121,7 @@ class Memes:
         # :no_entry: emoji
         emoji = 'https://emojipedia-us.s3.amazonaws.com/thumbs/240/twitter/' \
                 '120/no-entry-sign_1f6ab.png'
-        emoji = await download(emoji)
+        emoji = await download(self.bot.session, emoji)
         emoji = Image.open(emoji)
         emoji = emoji.convert('RGBA')
 
@@ -100,7 +100,8 @@ class Meta:
         p = Pages(
             ctx,
             entries=[f'`{p[0]}`' + (' (regex)' if p[1] else '')
-                     for p in prefixes if search in p[0].lower()]
+                     for p in prefixes if search in p[0].lower()],
+            pack=True
         )
         await p.paginate()
 
@@ -284,9 +285,12 @@ class Meta:
 
         after = time.monotonic()
 
-        await m.edit(content=f'{m.content.strip("! 🏓")}, '
-                             f'{round((after-before)*1000, 2)}ms of message '
-                             f'latency! 🏓')
+        await self.bot.outbound.edit(
+            m,
+            content=f'{m.content.strip("! 🏓")}, '
+                    f'{round((after-before)*1000, 2)}ms of message '
+                    f'latency! 🏓'
+        )
 
     @commands.command(aliases=['fb'])
     @commands.cooldown(rate=1, per=2 * 60, type=commands.BucketType.user)
@@ -304,8 +308,7 @@ class Meta:
             timestamp=ctx.message.created_at
         )
 
-        me = await self.bot.application_info()
-        me = me.owner
+        me = self.bot.app_info.owner
 
         embed.set_author(
             name=ctx.author.name,
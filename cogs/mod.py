@@ -6,22 +6,34 @@
 # error junk
 # from https://github.com/Rapptz/RoboDanny/blob/rewrite/cogs/mod.py
 
-import datetime
+import asyncio
+import functools
 import logging
 import re
-import string
 import time
 from collections import Counter
 
 import discord
-import emoji
 import humanize
 from discord.ext import commands
 
+from cogs.utils import filters
 from cogs.utils.checks import has_permissions
+from cogs.utils.paginator import Pages
+from cogs.utils import purger
+from cogs.utils.purger import PurgeJob
+from cogs.utils.raid import RaidDetector, created_at
+from cogs.utils.recent import MessageRecord
 
 log = logging.getLogger(__name__)
 
+# how many messages a purge can look through
+PURGE_MAX = 10_000
+# how often the purge progress message is updated, in seconds
+PURGE_EDIT_INTERVAL = 2.0
+# how many authors and repeated messages a purge preview lists
+PREVIEW_TOP = 5
+
 
 def purge_count(arg):
     try:
@@ -29,16 +41,36 @@ def purge_count(arg):
     except ValueError:
         raise commands.BadArgument('The purge amount needs to be an int.')
 
-    if arg > 300:
-        raise commands.BadArgument('The purge amount can\'t be above 300')
+    if arg > PURGE_MAX:
+        raise commands.BadArgument(
+            f'The purge amount can\'t be above {PURGE_MAX}'
+        )
+
+    return arg
 
-    # add one because of the message sent to invoke the command
-    return arg + 1
+
+def filter_expression(arg):
+    try:
+        return filters.compile_filter(arg)
+    except filters.FilterError as e:
+        raise commands.BadArgument(str(e))
 
 
 class Mod:
     def __init__(self, bot):
         self.bot = bot
+        # channel id -> PurgeJob
+        self.purges = {}
+        self.raids = RaidDetector()
+
+        # call_once, so it's only counted when a command actually gets
+        # invoked and not every time something like help checks can_run
+        bot.add_check(self.spam_check, call_once=True)
+
+    def __unload(self):
+        self.bot.remove_check(self.spam_check, call_once=True)
+        for job in self.purges.values():
+            job.cancel()
 
     @staticmethod
     async def __error(ctx, error):
@@ -67,14 +99,15 @@ class Mod:
 
         You must have Manage Messages permissions"""
 
+        history = self.recent_history(ctx.channel)
+
         # noinspection PyShadowingNames
         async def cleanup(ctx, limit):
             count = 0
-            async for message in ctx.channel.history(
-                    limit=limit, before=ctx.message
-            ):
+            async for message in history(limit=limit, before=ctx.message):
                 if message.author == ctx.me:
-                    await message.delete()
+                    await self.bot.http.delete_message(ctx.channel.id,
+                                                       message.id)
                     count += 1
 
             return {'Self': count}
@@ -84,7 +117,7 @@ class Mod:
             # `startswith` can't take a list, but it can take a tuple...
             prefix_tuple = self.bot.get_guild_prefixes(ctx.guild)
 
-            def check(m):
+            def matches(m):
                 for prefix in prefix_tuple:
                     if prefix[1]:
                         if re.match(prefix[0], m.content):
@@ -95,12 +128,19 @@ class Mod:
 
                 return False
 
-            deleted = await ctx.channel.purge(
-                limit=limit,
-                check=check
-            )
+            authors = Counter()
 
-            return Counter(m.author.display_name for m in deleted)
+            def check(m):
+                if matches(m):
+                    authors[m.author.display_name] += 1
+                    return True
+                return False
+
+            job = PurgeJob(self.bot, ctx.channel, check, limit,
+                           before=ctx.message, history=history)
+            await job.run()
+
+            return authors
 
         fun = cleanup
         if ctx.me.permissions_in(ctx.channel).manage_messages:
@@ -135,42 +175,105 @@ class Mod:
     @commands.command()
     @has_permissions(manage_messages=True)
     async def lockdown(self, ctx):
-        channel_ld = self.bot.lockdown.get(ctx.channel, None)
-        if channel_ld:
+        """Toggle a lockdown on this channel.
+
+        Only people with Manage Messages can use commands during one. It
+        wears off by itself after two minutes. Channels also get locked
+        automatically if commands are coming in way too fast."""
+        guard = self.bot.spam_guard
+        if guard.locked_for(ctx.channel.id):
             # There is a lockdown on the channel, turn it off
-            del self.bot.lockdown[ctx.channel]
+            guard.unlock(ctx.channel.id)
         else:
             # turn on lockdown
-            self.bot.lockdown[ctx.channel] = time.time()
+            guard.lock(ctx.channel.id)
 
         await ctx.auto_react()
 
-    async def __global_check(self, ctx):
-        owner = await self.bot.is_owner(ctx.author)
-        if owner:
-            return True
+    def spam_check(self, ctx):
+        # no awaits in here, this runs before every single command
+        self.bot.spam_guard.check(ctx.author.id, ctx.channel.id,
+                                  exempt=self.spam_exempt(ctx))
+        return True
 
-        if ctx.author.permissions_in(ctx.channel).manage_messages:
+    def spam_exempt(self, ctx):
+        if self.bot.owns(ctx.author):
             return True
 
-        channel_ld = self.bot.lockdown.get(ctx.channel, None)
-        if channel_ld:
-            if time.time() - channel_ld > 120:
-                # It's been a minute
-                del self.bot.lockdown[ctx.channel]
-                return True
+        # could be a plain User if they couldn't be fetched
+        return isinstance(ctx.author, discord.Member) and \
+            self.bot.perm_cache.channel(ctx.channel, ctx.author) \
+            .manage_messages
+
+    async def on_member_join(self, member):
+        guild = member.guild
+        alert = self.raids.join(guild.id, member.id)
+        if alert is None:
+            return
+
+        log.warning(f'Possible raid on {guild} ({guild.id}): {alert.joins} '
+                    f'joins in {alert.window:.0f}s, {alert.young} of them '
+                    f'young accounts')
+
+        channel = guild.system_channel
+        if channel is None or not channel.permissions_for(guild.me) \
+                .send_messages:
+            return
+
+        await channel.send(
+            f'\N{WARNING SIGN} {alert.joins} members joined in the last '
+            f'{alert.window:.0f} seconds, {alert.young} of them with '
+            f'accounts under a week old. This might be a raid. '
+            f'`raid suspects` lists them, and `purge new` cleans up after '
+            f'them.'
+        )
 
-            time_to_wait = humanize.naturaldelta(
-                datetime.datetime.fromtimestamp(channel_ld + 120)
-            )
-            await ctx.author.send(
-                f'Sorry, but the bot is on lockdown because some people were '
-                f'spamming it. Please wait {time_to_wait}.'
-            )
-            return False
-        else:
-            # No lockdown active, continue
-            return True
+    async def on_guild_remove(self, guild):
+        self.raids.forget(guild.id)
+
+    @commands.group(invoke_without_command=True)
+    @commands.guild_only()
+    @has_permissions(manage_messages=True)
+    async def raid(self, ctx):
+        """Show how many members joined recently, and how old their
+        accounts are"""
+        joins, histogram = self.raids.status(ctx.guild.id)
+
+        e = discord.Embed(
+            title=f'{joins} joins in the last {self.raids.window:.0f} seconds',
+            colour=discord.Colour.blurple()
+        )
+        e.description = '\n'.join(f'**{name}**: {count}'
+                                   for name, count in histogram)
+        e.set_footer(text=f'An alert goes off at {self.raids.threshold} '
+                          f'joins.')
+        await ctx.send(embed=e)
+
+    @raid.command(name='suspects')
+    @commands.guild_only()
+    @has_permissions(manage_messages=True)
+    async def raid_suspects(self, ctx, minutes: int = 10,
+                            everyone: bool = False):
+        """List members that joined in the last X minutes (default 10) with
+        accounts under a week old, or everyone if `everyone` is yes"""
+        now = time.time()
+        suspects = self.raids.suspects(ctx.guild.id, now - minutes * 60,
+                                       young_only=not everyone)
+        if not suspects:
+            return await ctx.send(f'Nobody suspicious joined in the last '
+                                  f'{minutes} minutes.')
+
+        entries = [
+            f'<@{member_id}> ({member_id}), joined '
+            f'{humanize.naturaldelta(now - joined)} ago, account '
+            f'{humanize.naturaldelta(joined - created_at(member_id))} old'
+            for member_id, joined in suspects
+        ]
+
+        pages = Pages(ctx, entries=entries, pack=True)
+        pages.embed.title = f'Clean up with: {ctx.prefix}purge new ' \
+                            f'<count> {minutes}'
+        await pages.paginate()
 
     @commands.group(aliases=['delete', 'prune'],
                     invoke_without_command=True)
@@ -184,139 +287,73 @@ class Mod:
         if not count:
             return await ctx.show_help('purge')
 
-        await ctx.message.delete()
-
-        r = await ctx.channel.purge(limit=count)
-
-        await self.p_wrap(ctx, r)
+        await self.run_purge(ctx, count)
 
     @purge.command(name='all')
     @has_permissions(manage_messages=True, check_both=True)
     async def purge_all(self, ctx, count: purge_count = 20):
         """Alias for `purge 20`"""
-
-        await ctx.message.delete()
-
-        r = await ctx.channel.purge(limit=count)
-
-        await self.p_wrap(ctx, r)
+        await self.run_purge(ctx, count)
 
     @purge.command(name='embeds', alises=['embed'])
     @has_permissions(manage_messages=True, check_both=True)
     async def purge_embeds(self, ctx, count: purge_count = 20):
         """Purge any messages with an embed (image, link, or otherwise)"""
-
-        await ctx.message.delete()
-
-        r = await ctx.channel.purge(
-            limit=count,
-            check=lambda m: len(m.embeds) > 0 or len(m.attachments) > 0
-        )
-
-        await self.p_wrap(ctx, r)
+        await self.run_purge(ctx, count, filters.has_embeds())
 
     @purge.command(name='with', aliases=['in', 'contains'])
     @has_permissions(manage_messages=True, check_both=True)
     async def purge_with(self, ctx, content: str.lower,
                          count: purge_count = 20):
         """Purge any message containing a certain string."""
-
-        await ctx.message.delete()
-
-        r = await ctx.channel.purge(
-            limit=count, check=lambda m: content in m.content.lower()
-        )
-
-        await self.p_wrap(ctx, r)
+        await self.run_purge(ctx, count, filters.contains(content))
 
     @purge.command(name='from', aliases=['author'])
     @has_permissions(manage_messages=True, check_both=True)
     async def purge_from(self, ctx, user: commands.MemberConverter,
                          count: purge_count = 20):
         """Purge any messages from a user"""
-
-        await ctx.message.delete()
-
-        r = await ctx.channel.purge(
-            limit=count, check=lambda m: m.author is user
-        )
-
-        await self.p_wrap(ctx, r)
+        await self.run_purge(ctx, count, filters.author(user.id))
 
     @purge.command(name='bots', aliases=['bot'])
     @has_permissions(manage_messages=True, check_both=True)
     async def purge_bots(self, ctx, count: purge_count = 20, prefix: str = '!'):
         """Purge a message from any bots, and optionally starting with a
         certain prefix"""
-
-        await ctx.message.delete()
-
-        r = await ctx.channel.purge(
-            limit=count,
-            check=lambda m: m.author.bot or m.content.startswith(prefix)
-        )
-
-        await self.p_wrap(ctx, r)
+        await self.run_purge(ctx, count, filters.any_of(
+            filters.from_bot(), filters.starts_with(prefix)
+        ))
 
     @purge.command(name='regex', aliases=['re'])
     @has_permissions(manage_messages=True, check_both=True)
     async def purge_regex(self, ctx, regex: str, count: purge_count = 20):
         """Advanced: Purge any message that matches a certain regex"""
 
-        await ctx.message.delete()
-
-        r = await ctx.channel.purge(
-            limit=count,
-            check=lambda m: re.match(regex, m.content)
-        )
+        try:
+            check = filters.matches(regex)
+        except filters.FilterError as e:
+            raise commands.BadArgument(str(e))
 
-        await self.p_wrap(ctx, r)
+        await self.run_purge(ctx, count, check)
 
     @purge.command(name='emoji', alises=['emote', 'emojis'])
     @has_permissions(manage_messages=True, check_both=True)
     async def purge_emojis(self, ctx, count: purge_count = 20):
         """Purge any message that contains emojis"""
-
-        await ctx.message.delete()
-
-        r = await ctx.channel.purge(
-            limit=count,
-            check=lambda m:
-            any([c in emoji.UNICODE_EMOJI for c in m.content])
-            or re.match(r'<:.+:[0-9]+>', m.content)
-        )
-
-        await self.p_wrap(ctx, r)
+        await self.run_purge(ctx, count, filters.has_emoji())
 
     @purge.command(name='urls', aliases=['url', 'links', 'link'])
     @has_permissions(manage_messages=True, check_both=True)
     async def purge_urls(self, ctx, count: purge_count = 20):
-        """Purge any message that contains a certain URL"""
-        regex = r'(?:https?:\/\/)?(?:[\w]+\.)(?:\.?[\w]{2,})+'
-
-        await ctx.message.delete()
-
-        r = await ctx.channel.purge(
-            limit=count,
-            check=lambda m: re.match(regex, m.content)
-        )
-
-        await self.p_wrap(ctx, r)
+        """Purge any message that contains a URL"""
+        await self.run_purge(ctx, count, filters.has_url())
 
     # noinspection SpellCheckingInspection
     @purge.command(name='nonascii', aliases=['noascii'])
     @has_permissions(manage_messages=True, check_both=True)
     async def purge_non_ascii(self, ctx, count: purge_count = 20):
         """Purge any message not containing normal ascii charecters"""
-
-        await ctx.message.delete()
-
-        r = await ctx.channel.purge(
-            limit=count,
-            check=lambda m: any([c not in string.printable for c in m.content])
-        )
-
-        await self.p_wrap(ctx, r)
+        await self.run_purge(ctx, count, filters.non_ascii())
 
     @purge.command(name='reactions', aliases=['react'])
     @has_permissions(manage_messages=True, check_both=True)
@@ -325,25 +362,22 @@ class Mod:
 
         await ctx.message.delete()
 
-        r = [await m.clear_reactions()
-             async for m in ctx.channel.history(limit=count)]
+        cleared = 0
+        async for m in ctx.channel.history(limit=count, before=ctx.message):
+            if m.reactions:
+                await m.clear_reactions()
+                cleared += 1
 
-        await self.p_wrap(ctx, r)
+        await ctx.send(f'Cleared the reactions from {cleared} '
+                       f'message{"" if cleared == 1 else "s"}.',
+                       delete_after=10)
 
     # noinspection SpellCheckingInspection
     @purge.command(name='roleless', aliases=['whitenames'])
     @has_permissions(manage_messages=True, check_both=True)
     async def purge_roleless(self, ctx, count: purge_count = 20):
         """Purge any messages from users with 0 roles"""
-
-        await ctx.message.delete()
-
-        r = await ctx.channel.purge(
-            limit=count,
-            check=lambda m: len(m.author.roles) < 1
-        )
-
-        await self.p_wrap(ctx, r)
+        await self.run_purge(ctx, count, filters.roleless())
 
     # noinspection SpellCheckingInspection
     @purge.command(name='new', aliases=['newusers', 'raid'])
@@ -352,17 +386,91 @@ class Mod:
                         time_ago: int = 60):
         """Purge any messages from members that joined X minutes ago
         (default 60)"""
-        cutoff = datetime.datetime.now() - datetime.timedelta(
-            minutes=time_ago)
+        await self.run_purge(ctx, count, filters.joined_within(time_ago))
 
-        await ctx.message.delete()
+    @purge.command(name='match', aliases=['filter', 'where'])
+    @has_permissions(manage_messages=True, check_both=True)
+    async def purge_match(self, ctx, count: purge_count, *,
+                          expression: filter_expression):
+        """Purge any message matching a filter expression
+
+        Filters are: all, embeds, bots, emoji, urls, nonascii, roleless,
+        with:text, prefix:text, regex:pattern, from:user and new[:minutes].
+        Put quotes around anything with spaces or brackets in it, like
+        with:"free nitro".
+
+        They can be combined with and, or, not and brackets, and two next
+        to each other means and. For example:
+        `purge match 100 bots or (emoji not from:@someone)`
+        """
+        await self.run_purge(ctx, count, expression)
+
+    @purge.command(name='cancel', aliases=['stop'])
+    @has_permissions(manage_messages=True, check_both=True)
+    async def purge_cancel(self, ctx):
+        """Stop the purge going on in this channel"""
+        job = self.purges.get(ctx.channel.id)
+        if job is None:
+            return await ctx.send('There\'s no purge going on here.')
 
-        r = await ctx.channel.purge(
-            limit=count,
-            check=lambda m: m.author.joined_at > cutoff
-        )
+        job.cancel()
+        await ctx.auto_react()
 
-        await self.p_wrap(ctx, r)
+    @purge.command(name='preview', aliases=['dryrun', 'test'])
+    @has_permissions(manage_messages=True, check_both=True)
+    async def purge_preview(self, ctx, count: purge_count, *,
+                            expression: filter_expression = None):
+        """See what `purge match` would delete, without deleting anything
+
+        Takes the same filters as `purge match`, or nothing for everything.
+        """
+        check = expression or filters.everything()
+
+        scanned = buffered = 0
+        matched = []
+        authors = Counter()
+        repeats = Counter()
+        samples = {}
+        history = self.recent_history(ctx.channel)
+        async for m in history(limit=count, before=ctx.message):
+            scanned += 1
+            if isinstance(m, MessageRecord):
+                buffered += 1
+            if not check(m):
+                continue
+
+            matched.append(m.id)
+            authors[str(m.author)] += 1
+            digest = m.digest if isinstance(m, MessageRecord) \
+                else hash(m.content)
+            repeats[digest] += 1
+            samples.setdefault(digest, m.content)
+
+        batches, singles = purger.plan(matched)
+
+        e = discord.Embed(
+            title=f'Would delete {len(matched)} of {scanned} messages',
+            colour=discord.Colour.blurple()
+        )
+        e.description = f'{len(batches)} bulk delete' \
+                        f'{"" if len(batches) == 1 else "s"} and ' \
+                        f'{len(singles)} one by one.'
+        if authors:
+            e.add_field(name='Authors', value='\n'.join(
+                f'{name}: {n}' for name, n in authors.most_common(PREVIEW_TOP)
+            ))
+
+        repeated = [(d, n) for d, n in repeats.most_common(PREVIEW_TOP)
+                    if n > 1]
+        if repeated:
+            e.add_field(name='Repeated', inline=False, value='\n'.join(
+                f'{n}x {samples[d][:50]!r}'
+                for d, n in repeated
+            ))
+
+        e.set_footer(text=f'{buffered} were already cached, '
+                          f'{scanned - buffered} came from history.')
+        await ctx.send(embed=e)
 
     @purge.command(name='me')
     @has_permissions(manage_messages=True, check_both=True)
@@ -370,12 +478,60 @@ class Mod:
         """Same as `clean`"""
         await ctx.run_command('clean', limit=count)
 
-    @staticmethod
-    async def p_wrap(ctx, list_o_messages):
-        await ctx.send(f'I :wastebasket: {len(list_o_messages)-1} '
-                       f'message{"s" if len(list_o_messages) > 1 else ""}.',
+    async def run_purge(self, ctx, count, check=filters.everything()):
+        """Delete the messages out of the last `count` that pass `check`,
+        showing progress as it goes"""
+        if ctx.channel.id in self.purges:
+            return await ctx.send('There\'s already a purge going on here. '
+                                  'Use `purge cancel` to stop it.',
+                                  delete_after=10)
+
+        await ctx.message.delete()
+
+        job = PurgeJob(self.bot, ctx.channel, check, count,
+                       before=ctx.message,
+                       history=self.recent_history(ctx.channel))
+        self.purges[ctx.channel.id] = job
+        status = reporter = edit = None
+
+        async def report():
+            nonlocal edit
+            while True:
+                await asyncio.sleep(PURGE_EDIT_INTERVAL)
+                # not awaited, if deletes are slow the edits just merge
+                edit = self.bot.outbound.edit(status, content=job.progress())
+
+        try:
+            status = await ctx.send(job.progress())
+            reporter = self.bot.loop.create_task(report())
+            await job.run()
+        finally:
+            # whether it finished, failed or got cancelled, so there's never
+            # a status stuck saying it's still going
+            self.purges.pop(ctx.channel.id, None)
+            if reporter is not None:
+                reporter.cancel()
+            if edit is not None:
+                # one that hasn't been sent yet would land after the delete
+                edit.cancel()
+            if status is not None:
+                try:
+                    await status.delete()
+                except discord.HTTPException:
+                    pass
+
+        await ctx.send(f'I :wastebasket: {job.deleted} '
+                       f'message{"" if job.deleted == 1 else "s"}'
+                       f'{" before being cancelled" if job.cancelled else ""}'
+                       f'.' + (f' {job.failed} couldn\'t be deleted.'
+                              if job.failed else ''),
                        delete_after=10)
 
+    def recent_history(self, channel):
+        """``channel.history``, but served from the recent messages buffer
+        where it can be"""
+        return functools.partial(self.bot.recent.history, channel)
+
 
 def setup(bot):
     bot.add_cog(Mod(bot))
@@ -8,6 +8,7 @@ from prawcore.exceptions import NotFound
 
 from cogs.utils import db
 from cogs.utils.checks import is_mod, tor_only
+from cogs.utils.nameindex import IndexedMember
 from cogs.utils.paginator import Pages
 
 
@@ -127,7 +128,7 @@ class Reddit:
                 )
 
         if results is not []:
-            p = Pages(ctx, entries=results)
+            p = Pages(ctx, entries=results, pack=True)
             p.embed.color = getattr(ctx.author, 'color', discord.Color.blue())
             await p.paginate()
         else:
@@ -155,8 +156,8 @@ class Reddit:
             await ctx.send("Sorry! That username doesn't appear to be valid.")
             return
 
-        if ctx.author.guild_permissions.ban_members is True \
-                or await self.bot.is_owner(ctx.author):
+        if self.bot.perm_cache.guild(ctx.author).ban_members is True \
+                or self.bot.owns(ctx.author):
             # I'm bad at DRY
 
             query = """
@@ -204,7 +205,7 @@ ON CONFLICT (user_id)
     @tor_only()
     async def force(
             self, ctx, reddit_username: commands.clean_content,
-            *, discord_username: commands.MemberConverter = None
+            *, discord_username: IndexedMember(loose=False) = None
     ):
         """Mod command for setting someones Reddit account."""
         if not discord_username:
@@ -289,7 +290,8 @@ FROM reddit_config;
             ctx, entries=tuple(
                 f'{self.bot.get_user(r[0]).mention}: '
                 f'[/u/{r[1]}](https://reddit.com/u/{r[1]})' for r in results
-            )
+            ),
+            pack=True
         )
 
         await p.paginate()
@@ -321,7 +323,7 @@ FROM reddit_config;
             f'[{s.title.split(" | ")[2][1:-1]}]'
             f'(https://reddit.com{s.permalink})'
             for s in links
-        ))
+        ), pack=True)
 
         await p.paginate()
 
@@ -347,7 +349,7 @@ FROM reddit_config;
     @commands.command()
     @is_mod()
     @tor_only()
-    async def rankup(self, ctx, *users: commands.MemberConverter):
+    async def rankup(self, ctx, *users: IndexedMember(loose=False)):
         author_string = clean_user(ctx, ctx.author)
         for user in users:
             user_string = await clean_user(ctx, user)
@@ -1,13 +1,13 @@
 import itertools
+import time
 
-import aiohttp
 import discord
 import wolframalpha
 from discord.ext import commands
 from texttable import Texttable, ArraySizeError
 
 import config
-from cogs.admin import haste_upload
+from cogs.utils.cache import ResultCache, normalize_query
 from cogs.utils.paginator import EmbedPages
 
 
@@ -26,6 +26,12 @@ async def send(ctx, *args, **kwargs):
 class Search:
     def __init__(self, bot):
         self.bot = bot
+        # answers like the time somewhere or a stock price go stale, so
+        # they only get kept for a bit
+        self.quick_cache = ResultCache(
+            'quick', persist=getattr(config, 'persist_result_cache', False),
+            ttl=getattr(config, 'quick_cache_ttl', 600.0)
+        )
 
     @staticmethod
     async def __error(ctx, err):
@@ -36,7 +42,7 @@ class Search:
     @commands.cooldown(rate=1, per=20, type=commands.BucketType.user)
     async def wolfram(self, ctx, *, query: commands.clean_content):
         """Do a full wolframalpha query, with a very verbose response."""
-        await ctx.channel.trigger_typing()
+        await ctx.trigger_typing()
 
         client = wolframalpha.Client(config.wolfram)
         res = client.query(query)
@@ -73,8 +79,9 @@ class Search:
                 try:
                     await send(ctx, to_send)
                 except discord.HTTPException:
-                    key = await haste_upload(to_send + '\n' + '\n'.join(images))
-                    await send(ctx, key)
+                    await ctx.paste(
+                        ('wolfram.txt', to_send + '\n' + '\n'.join(images))
+                    )
             if embed_images:
                 p = EmbedPages(ctx, embeds=embed_images)
                 await p.paginate()
@@ -83,8 +90,7 @@ class Search:
         try:
             await send(ctx, code_block(t.draw()))
         except discord.HTTPException:
-            key = await haste_upload(code_block(t.draw()))
-            await send(ctx, key)
+            await ctx.paste(('wolfram.txt', t.draw()))
         if embed_images:
             p = EmbedPages(ctx, embeds=embed_images)
             await p.paginate()
@@ -98,105 +104,111 @@ class Search:
         if query == 'mafs' or query == 'maths':
             return await send(ctx, '2+2 = 4-1 = 3')
 
-        await ctx.channel.trigger_typing()
-        with aiohttp.ClientSession() as s:
-            async with s.get(
-                    'https://api.wolframalpha.com/v2/result',
-                    params={'i': query, 'appid': config.wolfram}
-            ) as res:
-                text = await res.text()
-                if text == "No short answer available":
-                    to_send = ""
-                    to_send += f"{text}. Hint: try doing `{ctx.prefix}wolfram "
-                    to_send += (query[:35] + '…') if len(query) > 35 else query
-                    to_send += "` in a bot commands channel."
-
-                elif text == "Wolfram|Alpha did not understand your input":
-                    to_send = "Sorry, I don't understand what you said."
-                else:
-                    to_send = text
-                await send(ctx, to_send)
+        key = normalize_query(query)
+        text = await self.quick_cache.get(key, connection=ctx.db)
+        if text is None:
+            await ctx.trigger_typing()
+            start = time.perf_counter()
+            resp, body = await self.bot.session.read(
+                'https://api.wolframalpha.com/v2/result',
+                params={'i': query, 'appid': config.wolfram}
+            )
+            text = body.decode(resp.charset or 'utf-8', errors='replace')
+            # failures (501 for no answer or not understood) aren't cached,
+            # they might work next time
+            if resp.status == 200:
+                await self.quick_cache.put(key, text,
+                                           time.perf_counter() - start,
+                                           connection=ctx.db)
+
+        if text == "No short answer available":
+            to_send = ""
+            to_send += f"{text}. Hint: try doing `{ctx.prefix}wolfram "
+            to_send += (query[:35] + '…') if len(query) > 35 else query
+            to_send += "` in a bot commands channel."
+
+        elif text == "Wolfram|Alpha did not understand your input":
+            to_send = "Sorry, I don't understand what you said."
+        else:
+            to_send = text
+        await send(ctx, to_send)
 
     # noinspection SpellCheckingInspection
     @commands.command(aliases=['ddg', 'duck', 'google', 'goog'])
     async def duckduckgo(self, ctx, *, query: str):
         """Search the DuckDuckGo IA API"""
-        await ctx.channel.trigger_typing()
-        with aiohttp.ClientSession() as s:
-            async with s.get(
-                    'https://api.duckduckgo.com',
-                    params={'q': query, 't': 'ToR Genius Discord Bot',
-                            'format': 'json', 'no_html': '1'}
-            ) as res:
-                resp_json = await res.json(
-                    content_type='application/x-javascript'
-                )
-                embeds = {}
-
-                if resp_json['AbstractURL'] != '':
-                    embeds[f'Abstract: {resp_json["Heading"]}'
-                           f' ({resp_json["AbstractSource"]})'] = {
-                        'image': resp_json['Image'],
-                        'desc': f'{resp_json.get("AbstractText", "")}\n\n'
-                                f'{resp_json["AbstractURL"]}'
-                    }
-
-                if resp_json['Definition'] != '':
-                    embeds['Definition'] = {
-                        'desc': f'{resp_json["Definition"]}\n'
-                                f'([{resp_json["DefinitionSource"]}]'
-                                f'({resp_json["DefinitionURL"]}))'
-                    }
-
-                if resp_json['RelatedTopics']:
-                    desc = []
-                    for topic in resp_json['RelatedTopics']:
-                        try:
-                            if len('\n'.join(desc)) > 1000:
-                                break
-                            desc.append(
-                                f'[**{topic["Text"]}**]({topic["FirstURL"]})'
-                            )
-                        except KeyError:
-                            # some weird subtopic thing I guess
-                            continue
-
-                    embeds['Related'] = {
-                        'desc': '\n'.join(desc),
-                        'image': resp_json['RelatedTopics'][0]['Icon']['URL']
-                    }
-
-                if resp_json['Results']:
-                    desc = []
-                    for result in resp_json['Results']:
-                        desc.append(
-                            f'[**{result["Text"]}**]({result["FirstURL"]})'
-                        )
-                    embeds['Top Results'] = {
-                        'desc': '\n'.join(desc),
-                        'image': resp_json['Results'][0]['Icon']['URL']
-                    }
-
-                final_embeds = []
-
-                for embed_title, embed_content in embeds.items():
-                    final_embeds.append(
-                        discord.Embed(
-                            title=embed_title,
-                            description=embed_content['desc'],
-                            color=ctx.author.color
-                        ).set_image(
-                            url=embed_content['image']
-                        ).set_thumbnail(
-                            url='https://i.imgur.com/CVogaGL.png'
-                        )
+        await ctx.trigger_typing()
+        resp_json = await self.bot.session.json(
+            'https://api.duckduckgo.com',
+            params={'q': query, 't': 'ToR Genius Discord Bot',
+                    'format': 'json', 'no_html': '1'}
+        )
+        embeds = {}
+
+        if resp_json['AbstractURL'] != '':
+            embeds[f'Abstract: {resp_json["Heading"]}'
+                   f' ({resp_json["AbstractSource"]})'] = {
+                'image': resp_json['Image'],
+                'desc': f'{resp_json.get("AbstractText", "")}\n\n'
+                        f'{resp_json["AbstractURL"]}'
+            }
+
+        if resp_json['Definition'] != '':
+            embeds['Definition'] = {
+                'desc': f'{resp_json["Definition"]}\n'
+                        f'([{resp_json["DefinitionSource"]}]'
+                        f'({resp_json["DefinitionURL"]}))'
+            }
+
+        if resp_json['RelatedTopics']:
+            desc = []
+            for topic in resp_json['RelatedTopics']:
+                try:
+                    if len('\n'.join(desc)) > 1000:
+                        break
+                    desc.append(
+                        f'[**{topic["Text"]}**]({topic["FirstURL"]})'
                     )
+                except KeyError:
+                    # some weird subtopic thing I guess
+                    continue
+
+            embeds['Related'] = {
+                'desc': '\n'.join(desc),
+                'image': resp_json['RelatedTopics'][0]['Icon']['URL']
+            }
+
+        if resp_json['Results']:
+            desc = []
+            for result in resp_json['Results']:
+                desc.append(
+                    f'[**{result["Text"]}**]({result["FirstURL"]})'
+                )
+            embeds['Top Results'] = {
+                'desc': '\n'.join(desc),
+                'image': resp_json['Results'][0]['Icon']['URL']
+            }
+
+        final_embeds = []
+
+        for embed_title, embed_content in embeds.items():
+            final_embeds.append(
+                discord.Embed(
+                    title=embed_title,
+                    description=embed_content['desc'],
+                    color=ctx.author.color
+                ).set_image(
+                    url=embed_content['image']
+                ).set_thumbnail(
+                    url='https://i.imgur.com/CVogaGL.png'
+                )
+            )
 
-                if not final_embeds:
-                    return await ctx.send('No results found.')
+        if not final_embeds:
+            return await ctx.send('No results found.')
 
-                p = EmbedPages(ctx, embeds=final_embeds)
-                await p.paginate()
+        p = EmbedPages(ctx, embeds=final_embeds)
+        await p.paginate()
 
 
 def setup(bot):
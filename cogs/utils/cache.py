@@ -0,0 +1,154 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Caches for things that are slow to work out but come up over and over,
+# like calc expressions and quick queries.
+import io
+import json
+import time
+import tokenize
+from collections import OrderedDict
+
+from cogs.utils import db
+
+
+class ResultCacheTable(db.Table, table_name='result_cache'):
+    key = db.Column(db.String, primary_key=True)
+    value = db.Column(db.String)
+    # how long it took to work out in the first place, in ms
+    cost = db.Column(db.Integer)
+    created_at = db.Column(db.Datetime,
+                           default="now() at time zone 'utc'")
+    # null for results that are good forever
+    expires_at = db.Column(db.Datetime)
+
+    @classmethod
+    async def create_table(cls, *, exists_ok=True):
+        # the table might be from before results could expire
+        sql = await super().create_table(exists_ok=exists_ok)
+        return sql + '\nALTER TABLE result_cache ' \
+                     'ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP;'
+
+
+def normalize_code(code):
+    """Turns some Python code into a form that doesn't care about spacing"""
+    skip = (tokenize.COMMENT, tokenize.NL, tokenize.ENDMARKER)
+    try:
+        return ' '.join(
+            tokenize.tok_name[tok.type]
+            if tok.type in (tokenize.INDENT, tokenize.DEDENT)
+            else tok.string
+            for tok in tokenize.generate_tokens(io.StringIO(code).readline)
+            if tok.type not in skip
+        )
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        # it won't run anyway, so this is good enough
+        return ' '.join(code.split())
+
+
+def normalize_query(query):
+    """Turns a plain text query into a form that doesn't care about spacing
+    or case"""
+    return ' '.join(query.casefold().split())
+
+
+class ResultCache:
+    """An LRU cache of results that keeps track of how much time it saved.
+
+    Parameters
+    ------------
+    name: str
+        Used to namespace the keys in the database.
+    maxsize: int
+        How many results to keep in memory.
+    persist: bool
+        Whether to also keep results in the ``result_cache`` table. Values
+        have to be JSON serializable if this is on.
+    ttl: Optional[float]
+        How long, in seconds, a result is good for. None means forever.
+    """
+
+    def __init__(self, name, *, maxsize=1024, persist=False, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.persist = persist
+        self.ttl = ttl
+        # key -> (value, cost, when it expires or None), oldest first
+        self._data = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        # in seconds
+        self.time_saved = 0.0
+
+    def _remember(self, key, value, cost, ttl):
+        expires = None if ttl is None else time.monotonic() + ttl
+        self._data[key] = (value, cost, expires)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get(self, key, *, connection=None):
+        """Get a result, or None if it isn't cached or has expired"""
+        try:
+            value, cost, expires = self._data[key]
+        except KeyError:
+            pass
+        else:
+            if expires is None or expires > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                self.time_saved += cost
+                return value
+            del self._data[key]
+
+        if self.persist and connection is not None:
+            query = """
+    SELECT value, cost,
+           extract(epoch FROM expires_at - (now() at time zone 'utc'))
+             AS remaining
+    FROM result_cache
+    WHERE key = $1
+      AND (expires_at IS NULL OR expires_at > now() at time zone 'utc');"""
+            row = await connection.fetchrow(query, f'{self.name}:{key}')
+            if row is not None:
+                value, cost = json.loads(row['value']), row['cost'] / 1000
+                remaining = row['remaining']
+                self._remember(key, value, cost,
+                               None if remaining is None else float(remaining))
+                self.hits += 1
+                self.time_saved += cost
+                return value
+
+        self.misses += 1
+        return None
+
+    async def put(self, key, value, cost, *, connection=None):
+        """Cache a result that took ``cost`` seconds to work out"""
+        self._remember(key, value, cost, self.ttl)
+
+        if self.persist and connection is not None:
+            query = """
+    INSERT INTO result_cache (key, value, cost, expires_at)
+    VALUES ($1, $2, $3,
+            now() at time zone 'utc' + $4::float8 * interval '1 second')
+    ON CONFLICT (key)
+      DO UPDATE SET
+        value = EXCLUDED.value,
+        cost = EXCLUDED.cost,
+        created_at = EXCLUDED.created_at,
+        expires_at = EXCLUDED.expires_at;"""
+
+            await connection.execute(query, f'{self.name}:{key}',
+                                     json.dumps(value), round(cost * 1000),
+                                     self.ttl)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._data),
+            'hit rate': f'{self.hits / total:.1%} of {total}'
+                        if total else 'n/a',
+            'time saved': f'{self.time_saved:.2f}s',
+        }
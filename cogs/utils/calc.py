@@ -0,0 +1,241 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Process pool for the calc command. Importing sympy takes ages, and a big
+# integrate() on the event loop freezes the whole bot, so both of those
+# happen in worker processes that already have sympy loaded instead.
+import ast
+import asyncio
+import io
+import signal
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout
+
+try:
+    import resource
+except ImportError:
+    # windows
+    resource = None
+
+# everything from sympy and sympy.abc, filled in once per worker
+_namespace = None
+
+# names that give a different answer every time, so code using any of them
+# can't be cached. sympy's random things (randprime, randMatrix, ...) all
+# start with rand, and are caught separately.
+NONDETERMINISTIC = frozenset({
+    'random', 'secrets', 'uuid', 'time', 'datetime', 'date', 'os', 'sys',
+    'urandom', 'now', 'today', 'perf_counter', 'monotonic', 'open', 'id',
+    'hash',
+})
+
+
+class CalcTimeout(Exception):
+    pass
+
+
+def cacheable(body):
+    """Whether some calc code gives the same result every time it's run,
+    going by the names it uses"""
+    try:
+        tree = ast.parse(body)
+    except SyntaxError:
+        return False
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            names = [node.id]
+        elif isinstance(node, ast.Attribute):
+            names = [node.attr]
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names = [a.name.split('.')[0] for a in node.names]
+            if isinstance(node, ast.ImportFrom) and node.module:
+                names.append(node.module.split('.')[0])
+        else:
+            continue
+
+        for name in names:
+            if name in NONDETERMINISTIC or name.lower().startswith('rand'):
+                return False
+
+    return True
+
+
+def _on_alarm(signum, frame):
+    raise CalcTimeout()
+
+
+def _address_space():
+    """This process's virtual memory size in bytes, None if it's unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError):
+        return None
+
+
+def _limit_memory(memory_limit):
+    # workers are forked from the bot, so they start out with all of its
+    # address space already. The limit is on top of that, otherwise a big
+    # enough bot would have workers that can't do anything at all.
+    current = _address_space()
+    if current is None:
+        # no /proc, so there's no telling where a sane limit would be
+        return
+
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = current + memory_limit
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _setup_worker(memory_limit):
+    global _namespace
+    if _namespace is not None:
+        return
+
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+    _namespace = {}
+    exec('from sympy import *\nfrom sympy.abc import *', _namespace)
+
+    # after importing sympy, so the limit is all for the actual maths
+    if memory_limit and resource is not None:
+        _limit_memory(memory_limit)
+
+
+def _warm(memory_limit):
+    _setup_worker(memory_limit)
+    return True
+
+
+def _evaluate(body, time_limit, memory_limit, latex):
+    """Runs in a worker. Returns (stdout, result, error) as strings."""
+    _setup_worker(memory_limit)
+
+    env = dict(_namespace)
+    stdout = io.StringIO()
+    result = None
+
+    signal.setitimer(signal.ITIMER_REAL, time_limit)
+    try:
+        tree = ast.parse(body, '<calc>')
+
+        # the last line gets evaluated, like it used to be returned
+        last = None
+        if tree.body and isinstance(tree.body[-1], ast.Expr):
+            last = ast.Expression(tree.body.pop().value)
+
+        with redirect_stdout(stdout):
+            exec(compile(tree, '<calc>', 'exec'), env)
+            if last is not None:
+                result = eval(compile(last, '<calc>', 'eval'), env)
+
+        if result is not None:
+            result = env['latex'](result) if latex else str(result)
+    except CalcTimeout:
+        return stdout.getvalue(), None, f'Timed out after {time_limit}s.'
+    except MemoryError:
+        return stdout.getvalue(), None, 'Ran out of memory.'
+    except Exception:
+        return stdout.getvalue(), None, traceback.format_exc()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+    return stdout.getvalue(), result, None
+
+
+class CalcPool:
+    """A pool of worker processes with sympy already imported.
+
+    Parameters
+    ------------
+    workers: int
+        How many worker processes to keep around.
+    time_limit: float
+        How long, in seconds, a single expression can run for.
+    memory_limit: int
+        How much more address space each worker can use once it has sympy
+        loaded, in bytes.
+    """
+
+    def __init__(self, loop, *, workers=2, time_limit=10.0,
+                 memory_limit=512 * 1024 * 1024):
+        self.loop = loop
+        self.workers = workers
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        # every worker gets an executor of its own, so one that has to be
+        # killed doesn't take everyone else's calls down with it
+        self._executors = [None] * workers
+        # indexes of the workers that aren't busy
+        self._idle = asyncio.Queue()
+        for slot in range(workers):
+            self._idle.put_nowait(slot)
+
+    def _get_executor(self, slot):
+        if self._executors[slot] is None:
+            self._executors[slot] = ProcessPoolExecutor(max_workers=1)
+        return self._executors[slot]
+
+    async def _warm(self, slot):
+        await self.loop.run_in_executor(self._get_executor(slot), _warm,
+                                        self.memory_limit)
+
+    async def warm(self):
+        """Start the workers and get them to import sympy"""
+        await asyncio.gather(*[self._warm(slot)
+                               for slot in range(self.workers)])
+
+    def _kill(self, slot):
+        executor, self._executors[slot] = self._executors[slot], None
+        if executor is None:
+            return
+
+        # a worker stuck in C code won't notice the alarm, so it has to go
+        # noinspection PyProtectedMember
+        for process in list(executor._processes.values()):
+            process.kill()
+        executor.shutdown(wait=False)
+
+    def _recycle(self, slot):
+        self._kill(slot)
+        self.loop.create_task(self._warm(slot))
+
+    async def evaluate(self, body, *, latex=False):
+        """Evaluate some sympy code in a worker.
+
+        Returns a tuple of (stdout, result, error), any of which can be None.
+        """
+        # waiting for a free worker doesn't count towards the time limit
+        slot = await self._idle.get()
+        try:
+            future = self.loop.run_in_executor(
+                self._get_executor(slot), _evaluate, body, self.time_limit,
+                self.memory_limit, latex
+            )
+
+            # give the worker a second to notice its own alarm first
+            return await asyncio.wait_for(future, self.time_limit + 1)
+        except asyncio.TimeoutError:
+            self._recycle(slot)
+            return None, None, f'Timed out after {self.time_limit}s.'
+        except BrokenProcessPool:
+            # the worker died, most likely from hitting the memory limit
+            self._recycle(slot)
+            return None, None, 'The worker died. Probably ran out of memory.'
+        except asyncio.CancelledError:
+            # the worker is still busy with it, and whoever gets it next
+            # would have that count towards their own time limit
+            self._recycle(slot)
+            raise
+        finally:
+            self._idle.put_nowait(slot)
+
+    def close(self):
+        for slot in range(self.workers):
+            self._kill(slot)
@@ -9,6 +9,7 @@
 # May tweak it a bit, but I'm hungry and just want to have checks on prefix
 # junk
 
+import discord
 from discord.ext import commands
 
 
@@ -16,67 +17,113 @@ from discord.ext import commands
 # https://github.com/Rapptz/RoboDanny/blob/rewrite/cogs/utils/checks.py
 
 
-async def check_permissions(ctx, perms, *, check=all, check_self=False,
-                            check_both=False):
-    owner = await ctx.bot.is_owner(ctx.author)
+class PermissionMask:
+    """A set of permissions, compiled down to two bitmasks up front so that
+    testing a member's permissions is an AND and a compare instead of a
+    getattr per permission.
+
+    Parameters
+    ------------
+    perms: Dict[str, bool]
+        Permission name -> whether it has to be on (True) or off (False).
+    check: Callable
+        ``all`` if every permission has to match, ``any`` if one is enough.
+    """
+
+    __slots__ = ('need', 'forbid', 'check', 'bits')
+
+    def __init__(self, perms, *, check=all):
+        self.need = 0
+        self.forbid = 0
+        self.check = check
+        # (bit, whether it has to be on), for checks that aren't all or any
+        self.bits = []
+
+        for name, value in perms.items():
+            single = discord.Permissions.none()
+            try:
+                setattr(single, name, True)
+            except AttributeError:
+                single.value = 0
+            if not single.value:
+                raise TypeError(f'Invalid permission: {name}')
+
+            if value:
+                self.need |= single.value
+            else:
+                self.forbid |= single.value
+            self.bits.append((single.value, bool(value)))
+
+    def test(self, permissions):
+        value = permissions.value
+        if self.check is all:
+            return value & self.need == self.need and not value & self.forbid
+        if self.check is any:
+            return bool(value & self.need or ~value & self.forbid)
+
+        return self.check(
+            bool(value & bit) == want for bit, want in self.bits
+        )
+
+
+def _mask(perms, check):
+    if isinstance(perms, PermissionMask):
+        return perms
+    return PermissionMask(perms, check=check)
+
+
+def check_permissions(ctx, perms, *, check=all, check_self=False,
+                      check_both=False):
+    mask = _mask(perms, check)
+    owner = ctx.bot.owns(ctx.author)
     if owner and not check_self and not check_both:
         return True
 
+    cache = ctx.bot.perm_cache
     if check_both:
-        resolved1 = ctx.channel.permissions_for(ctx.author)
-        resolved1_check = check(
-            getattr(resolved1, name, None) == value for name, value in
-            perms.items()
-        )
+        author_check = mask.test(cache.channel(ctx.channel, ctx.author))
+        me_check = mask.test(cache.channel(ctx.channel, ctx.guild.me))
+        return (author_check or owner) and me_check
 
-        resolved2 = ctx.channel.permissions_for(ctx.guild.me)
-        resolved2_check = check(
-            getattr(resolved2, name, None) == value for name, value in
-            perms.items()
-        )
-
-        return (resolved1_check or owner) and resolved2_check
+    return mask.test(cache.channel(
+        ctx.channel, ctx.author if not check_self else ctx.guild.me
+    ))
 
-    resolved = ctx.channel.permissions_for(
-        ctx.author if not check_self else ctx.guild.me
-    )
-    return check(
-        getattr(resolved, name, None) == value for name, value in perms.items()
-    )
 
+def has_permissions(*, check=all, check_self=False, check_both=False,
+                    **perms):
+    mask = PermissionMask(perms, check=check)
 
-def has_permissions(*, check=all, **perms):
-    async def pred(ctx):
-        return await check_permissions(ctx, perms, check=check)
+    def pred(ctx):
+        return check_permissions(ctx, mask, check_self=check_self,
+                                 check_both=check_both)
 
     return commands.check(pred)
 
 
-async def check_guild_permissions(ctx, perms, *, check=all):
-    is_owner = await ctx.bot.is_owner(ctx.author)
-    if is_owner:
+def check_guild_permissions(ctx, perms, *, check=all):
+    mask = _mask(perms, check)
+    if ctx.bot.owns(ctx.author):
         return True
 
     if ctx.guild is None:
         return False
 
-    resolved = ctx.author.guild_permissions
-    return check(
-        getattr(resolved, name, None) == value for name, value in perms.items()
-    )
+    return mask.test(ctx.bot.perm_cache.guild(ctx.author))
 
 
 def is_mod():
-    async def pred(ctx):
-        return await check_guild_permissions(ctx, {'ban_members': True})
+    mask = PermissionMask({'ban_members': True})
+
+    def pred(ctx):
+        return check_guild_permissions(ctx, mask)
 
     return commands.check(pred)
 
 
 def tor_only():
     async def pred(ctx):
-        owner = await ctx.bot.is_owner(ctx.author)
-        if owner:
+        if ctx.bot.owns(ctx.author):
             return True
 
         ok = ctx.guild.id in [318873523579781132, 369960111679995905]
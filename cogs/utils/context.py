@@ -1,6 +1,8 @@
 import asyncio
+import io
 from collections import namedtuple
 
+import discord
 import exrex
 from discord.ext import commands
 
@@ -63,10 +65,44 @@ class Context(commands.Context):
             await self.bot.pool.release(self.db)
             self.db = None
 
+    async def send(self, content=None, **kwargs):
+        # goes through the outbound queue so replies beat reactions and typing
+        message = await self.bot.outbound.send(self, super().send, content,
+                                               **kwargs)
+        # so it gets cleaned up if the command is edited and run again
+        self.bot.reruns.record(self.message.id, message.id)
+        return message
+
+    async def paste(self, *documents):
+        """Send some (filename, content) pairs that are too long for a
+        message. They're linked from the paste store if it's public, or
+        attached as files otherwise. Documents with None content are skipped.
+        """
+        documents = [(name, str(content)) for name, content in documents
+                     if content is not None]
+        store = self.bot.pastes
+
+        if store.public:
+            links = []
+            for name, content in documents:
+                key = await store.put(content)
+                links.append(f'{name}: <{store.url_for(key, name)}>')
+            return await self.send('\n'.join(links))
+
+        return await self.send(files=[
+            discord.File(io.BytesIO(content.encode('utf-8')), filename=name)
+            for name, content in documents
+        ])
+
+    async def trigger_typing(self):
+        # low priority and nobody needs to wait for it
+        self.bot.outbound.typing(self.channel)
+
     async def auto_react(self, emoji='<:check:410612082929565696>'):
         # noinspection PyBroadException
         try:
-            await self.message.add_reaction(emoji.strip('<:>'))
+            await self.bot.outbound.add_reaction(self.message,
+                                                 emoji.strip('<:>'))
         except:
             # No reaction perms probably
             await self.send(emoji)
@@ -155,7 +191,7 @@ class Context(commands.Context):
             return False
 
         for emoji in (self.emojis.tick_yes, self.emojis.xmark):
-            await msg.add_reaction(emoji.strip('<:>'))
+            await self.bot.outbound.add_reaction(msg, emoji.strip('<:>'))
 
         if reacquire:
             await self.release()
@@ -0,0 +1,213 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Boils the output of EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) down to the
+# handful of things that are actually worth looking at when a query is slow.
+import json
+
+import asyncpg
+
+# tables with at least this many rows are worth an index
+LARGE_TABLE_ROWS = 10_000
+# how far off the planner's row estimate has to be to be worth a mention
+ESTIMATE_FACTOR = 10
+
+
+class PlanNode:
+    """One node out of a plan, with times already multiplied out by loops"""
+    __slots__ = ('type', 'schema', 'relation', 'index', 'depth', 'total',
+                 'exclusive', 'rows', 'estimate')
+
+    def __init__(self, plan, depth):
+        self.type = plan['Node Type']
+        self.schema = plan.get('Schema')
+        self.relation = plan.get('Relation Name')
+        self.index = plan.get('Index Name')
+        self.depth = depth
+
+        loops = plan.get('Actual Loops', 1)
+        # in ms, for every loop put together
+        self.total = plan.get('Actual Total Time', 0.0) * loops
+        self.exclusive = self.total
+        # both of these are per loop
+        self.rows = plan.get('Actual Rows', 0)
+        self.estimate = plan.get('Plan Rows', 0)
+
+    @property
+    def qualified_relation(self):
+        if self.schema:
+            return f'{self.schema}.{self.relation}'
+        return self.relation
+
+    def __str__(self):
+        name = self.type
+        if self.relation:
+            name += f' on {self.qualified_relation}'
+        if self.index:
+            name += f' using {self.index}'
+        return name
+
+
+def flatten(plan, depth=0):
+    """Turn a plan tree into a list of PlanNodes, parents first.
+
+    The exclusive time of a node is its own time without its children's.
+    """
+    node = PlanNode(plan, depth)
+    nodes = [node]
+    for child in plan.get('Plans', ()):
+        child_nodes = flatten(child, depth + 1)
+        node.exclusive -= child_nodes[0].total
+        nodes.extend(child_nodes)
+
+    # parallel workers can make children add up to more than the parent
+    node.exclusive = max(node.exclusive, 0.0)
+    return nodes
+
+
+def parse(raw):
+    """Get the top level object out of the QUERY PLAN column"""
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    return raw[0]
+
+
+def most_expensive(nodes, count=5):
+    return sorted(nodes, key=lambda n: n.exclusive, reverse=True)[:count]
+
+
+def seq_scans(nodes, table_rows, threshold=LARGE_TABLE_ROWS):
+    """Sequential scans on tables with more than ``threshold`` rows.
+
+    ``table_rows`` maps qualified relation names to pg_class.reltuples.
+    """
+    return [
+        (node, table_rows[node.qualified_relation])
+        for node in nodes
+        if node.type == 'Seq Scan'
+        and table_rows.get(node.qualified_relation, 0) >= threshold
+    ]
+
+
+def estimate_misses(nodes, factor=ESTIMATE_FACTOR):
+    misses = []
+    for node in nodes:
+        actual, estimate = max(node.rows, 1), max(node.estimate, 1)
+        off = max(actual, estimate) / min(actual, estimate)
+        if off >= factor:
+            misses.append((node, off))
+
+    return sorted(misses, key=lambda m: m[1], reverse=True)
+
+
+def buffer_hits(plan):
+    """Returns (hit, read) for the shared buffers the whole query used"""
+    # the root node's counts already include all of its children
+    return plan.get('Shared Hit Blocks', 0), plan.get('Shared Read Blocks', 0)
+
+
+async def table_rows(connection, nodes):
+    """Look up pg_class.reltuples for every table that got scanned"""
+    tables = {
+        (n.schema or 'public', n.relation) for n in nodes if n.relation
+    }
+    if not tables:
+        return {}
+
+    schemas, relations = zip(*tables)
+    query = """
+SELECT s, r, (SELECT c.reltuples FROM pg_class c
+              WHERE c.oid = to_regclass(format('%I.%I', s, r)))
+FROM unnest($1::text[], $2::text[]) AS t(s, r);"""
+
+    records = await connection.fetch(query, list(schemas), list(relations))
+    rows = {}
+    for schema, relation, reltuples in records:
+        rows[f'{schema}.{relation}'] = reltuples or 0
+        # for plans that don't say what schema they're in
+        rows.setdefault(relation, reltuples or 0)
+
+    return rows
+
+
+async def statement_totals(connection, query_id, query):
+    """Get the pg_stat_statements row for a query, if there is one.
+
+    Returns None if the extension isn't installed or the query hasn't
+    shown up in it yet.
+    """
+    # total_time got split into planning and execution in postgres 13
+    columns = await connection.fetch("""
+SELECT attname FROM pg_attribute
+WHERE attrelid = to_regclass('pg_stat_statements')
+  AND attname IN ('total_time', 'total_exec_time');""")
+
+    if not columns:
+        return None
+
+    total = columns[0]['attname']
+    base = f"""
+SELECT calls, {total} AS total_time, {total} / calls AS mean_time, rows,
+       shared_blks_hit, shared_blks_read
+FROM pg_stat_statements"""
+
+    try:
+        if query_id is not None:
+            return await connection.fetchrow(f'{base} WHERE queryid = $1;',
+                                             query_id)
+        # without a query id we can only match queries with no constants
+        return await connection.fetchrow(
+            f'{base} WHERE query = $1 ORDER BY calls DESC LIMIT 1;', query
+        )
+    except asyncpg.PostgresError:
+        return None
+
+
+def _ratio(hit, read):
+    total = hit + read
+    if not total:
+        return 'n/a'
+    return f'{hit / total:.1%} ({hit} hit, {read} read)'
+
+
+def summarize(explained, rows, totals=None):
+    """Turn an explained query into a list of (name, value) embed fields"""
+    plan = explained['Plan']
+    nodes = flatten(plan)
+
+    fields = [(
+        'Timing',
+        f'Planning: {explained.get("Planning Time", 0.0):.2f}ms\n'
+        f'Execution: {explained.get("Execution Time", 0.0):.2f}ms'
+    )]
+
+    fields.append(('Most expensive nodes', '\n'.join(
+        f'`{node.exclusive:.2f}ms` {node}' for node in most_expensive(nodes)
+    )))
+
+    scans = seq_scans(nodes, rows)
+    if scans:
+        fields.append(('Sequential scans on large tables', '\n'.join(
+            f'{node.qualified_relation} (~{int(reltuples)} rows)'
+            for node, reltuples in scans
+        )))
+
+    misses = estimate_misses(nodes)
+    if misses:
+        fields.append(('Row estimate misses', '\n'.join(
+            f'{node}: estimated {node.estimate}, got {node.rows} '
+            f'({off:.0f}x off)' for node, off in misses[:5]
+        )))
+
+    fields.append(('Buffer hit ratio', _ratio(*buffer_hits(plan))))
+
+    if totals is not None:
+        fields.append(('pg_stat_statements', (
+            f'{totals["calls"]} calls, {totals["total_time"]:.2f}ms total, '
+            f'{totals["mean_time"]:.2f}ms mean, {totals["rows"]} rows\n'
+            f'Buffer hit ratio: '
+            f'{_ratio(totals["shared_blks_hit"], totals["shared_blks_read"])}'
+        )))
+
+    return fields
@@ -0,0 +1,319 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Message filters for purge. Everything is compiled up front into plain
+# functions, so the per message cost during a history scan is as small as
+# it can be: no regexes compiled per message, no lists built per character.
+#
+# Filters can be combined into expressions, like
+#   bots or (emoji and not from:80088516616269824)
+#   with:"free nitro" urls
+# where putting two filters next to each other means "and".
+import datetime
+import re
+import string
+
+import emoji
+
+
+class FilterError(Exception):
+    pass
+
+
+def _trie_pattern(words):
+    """Builds a regex matching any of ``words``, with common prefixes
+    factored out so it doesn't have to try every word at every position."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = None
+
+    def build(node):
+        branches = []
+        leaves = []
+        for char, child in sorted(node.items()):
+            if char == '':
+                continue
+            if list(child) == ['']:
+                leaves.append(re.escape(char))
+            else:
+                branches.append(re.escape(char) + build(child))
+
+        if len(leaves) == 1:
+            branches.append(leaves[0])
+        elif leaves:
+            branches.append(f'[{"".join(leaves)}]')
+
+        if len(branches) == 1 and not ('' in node and len(branches[0]) > 1):
+            pattern = branches[0]
+        else:
+            pattern = f'(?:{"|".join(branches)})'
+
+        return f'{pattern}?' if '' in node else pattern
+
+    return build(trie)
+
+
+# almost every emoji is a single character, and checking a message's
+# characters against a set is way faster than any regex (a regex character
+# class with astral plane characters in it gets checked one by one)
+_emoji_chars = frozenset(e for e in emoji.UNICODE_EMOJI if len(e) == 1)
+# the sequences that don't already start with one of those, like keycaps
+# (#\N{COMBINING ENCLOSING KEYCAP}), plus custom emojis
+_emoji_sequences = [
+    e for e in emoji.UNICODE_EMOJI if len(e) > 1 and e[0] not in _emoji_chars
+]
+_emoji_sequences = re.compile(r'<a?:\w+:[0-9]+>' + (
+    f'|{_trie_pattern(_emoji_sequences)}' if _emoji_sequences else ''
+))
+# only try at the start of words, instead of backtracking through every
+# letter of every word
+_url = re.compile(r'(?:https?://)?\b\w+\.(?:\.?\w{2,})+')
+_non_ascii = re.compile(f'[^{re.escape(string.printable)}]')
+_mention = re.compile(r'<@!?([0-9]+)>')
+
+
+# == Criteria ==
+# each of these returns a function that takes a message
+
+
+def everything():
+    return lambda m: True
+
+
+def has_embeds():
+    return lambda m: bool(m.embeds or m.attachments)
+
+
+def contains(text):
+    text = text.lower()
+    return lambda m: text in m.content.lower()
+
+
+def starts_with(prefix):
+    return lambda m: m.content.startswith(prefix)
+
+
+def author(user_id):
+    return lambda m: m.author.id == user_id
+
+
+def from_bot():
+    return lambda m: m.author.bot
+
+
+def matches(pattern):
+    try:
+        match = re.compile(pattern).match
+    except re.error as e:
+        raise FilterError(f'Bad regex: {e}')
+    return lambda m: match(m.content) is not None
+
+
+def has_emoji():
+    chars = _emoji_chars
+    search = _emoji_sequences.search
+    return lambda m: not chars.isdisjoint(m.content) \
+        or search(m.content) is not None
+
+
+def has_url():
+    search = _url.search
+    # no dot, no URL, and that's a lot cheaper to check than the regex
+    return lambda m: '.' in m.content and search(m.content) is not None
+
+
+def non_ascii():
+    search = _non_ascii.search
+    return lambda m: search(m.content) is not None
+
+
+def roleless():
+    # everyone has @everyone
+    return lambda m: len(getattr(m.author, 'roles', ())) <= 1
+
+
+def joined_within(minutes):
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(minutes=minutes)
+
+    def check(m):
+        joined_at = getattr(m.author, 'joined_at', None)
+        return joined_at is not None and joined_at > cutoff
+
+    return check
+
+
+# == Combinators ==
+
+
+def all_of(*checks):
+    if len(checks) == 1:
+        return checks[0]
+
+    def check(m):
+        for c in checks:
+            if not c(m):
+                return False
+        return True
+
+    return check
+
+
+def any_of(*checks):
+    if len(checks) == 1:
+        return checks[0]
+
+    def check(m):
+        for c in checks:
+            if c(m):
+                return True
+        return False
+
+    return check
+
+
+def negate(c):
+    return lambda m: not c(m)
+
+
+# == Parsing ==
+
+
+def _user_id(arg):
+    match = _mention.fullmatch(arg)
+    if match:
+        return int(match.group(1))
+    if arg.isdigit():
+        return int(arg)
+    raise FilterError(f'{arg} isn\'t a user mention or id.')
+
+
+def _minutes(arg):
+    try:
+        return int(arg or 60)
+    except ValueError:
+        raise FilterError(f'{arg} isn\'t a number of minutes.')
+
+
+# name -> (takes an argument, factory)
+CRITERIA = {
+    'all': (False, everything),
+    'embeds': (False, has_embeds),
+    'bots': (False, from_bot),
+    'emoji': (False, has_emoji),
+    'urls': (False, has_url),
+    'nonascii': (False, non_ascii),
+    'roleless': (False, roleless),
+    'with': (True, contains),
+    'prefix': (True, starts_with),
+    'regex': (True, matches),
+    'from': (True, lambda arg: author(_user_id(arg))),
+    'new': (None, lambda arg: joined_within(_minutes(arg))),
+}
+
+_token = re.compile(r'\s*(?:(\()|(\))|((?:[^\s()"]|"[^"]*")+))')
+
+
+def _tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _token.match(expression, pos)
+        if match is None:
+            raise FilterError(f'Couldn\'t understand {expression[pos:]!r}.')
+        tokens.append(match.group(match.lastindex))
+        pos = match.end()
+    return tokens
+
+
+def _criterion(token):
+    name, sep, arg = token.partition(':')
+    name = name.lower()
+    if len(arg) > 1 and arg[0] == arg[-1] == '"':
+        arg = arg[1:-1]
+
+    try:
+        takes_arg, factory = CRITERIA[name]
+    except KeyError:
+        raise FilterError(f'There\'s no filter called {name}. Try one of: '
+                          f'{", ".join(CRITERIA)}')
+
+    if takes_arg is None:
+        return factory(arg or None)
+    if takes_arg and not arg:
+        raise FilterError(f'{name} needs something after it, like '
+                          f'`{name}:something`.')
+    if not takes_arg and sep:
+        raise FilterError(f'{name} doesn\'t take anything after it.')
+
+    return factory(arg) if takes_arg else factory()
+
+
+class _Parser:
+    # expr   := term ("or" term)*
+    # term   := factor (["and"] factor)*
+    # factor := "not" factor | "(" expr ")" | criterion
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def expr(self):
+        terms = [self.term()]
+        while (self.peek() or '').lower() == 'or':
+            self.take()
+            terms.append(self.term())
+        return any_of(*terms)
+
+    def term(self):
+        factors = [self.factor()]
+        while True:
+            token = self.peek()
+            if token is None or token == ')' or token.lower() == 'or':
+                break
+            if token.lower() == 'and':
+                self.take()
+            factors.append(self.factor())
+        return all_of(*factors)
+
+    def factor(self):
+        token = self.take()
+        if token is None:
+            raise FilterError('The filter ended too early.')
+
+        lowered = token.lower()
+        if lowered == 'not':
+            return negate(self.factor())
+        if token == '(':
+            inner = self.expr()
+            if self.take() != ')':
+                raise FilterError('There\'s a ( without a matching ).')
+            return inner
+        if token == ')' or lowered in ('and', 'or'):
+            raise FilterError(f'Didn\'t expect {token} there.')
+
+        return _criterion(token)
+
+
+def compile_filter(expression):
+    """Turn a filter expression into a function that takes a message and
+    returns whether it matches. Raises FilterError."""
+    parser = _Parser(_tokenize(expression))
+    check = parser.expr()
+    if parser.peek() is not None:
+        raise FilterError(f'Didn\'t expect {parser.peek()} there.')
+    return check
@@ -0,0 +1,127 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Join and account creation dates for whole guilds, for spotting raids and
+# waves of new accounts. Every guild's dates are kept as sorted arrays of
+# unix times, so a histogram is a binary search per bucket edge instead of
+# a pass over every member, however many members there are.
+import datetime
+import io
+from array import array
+from bisect import bisect_left, insort
+
+from PIL import Image, ImageDraw
+
+from cogs.utils.raid import created_at
+
+KINDS = ('joined', 'created')
+BUCKETS = 48
+
+_UNIX_EPOCH = datetime.datetime(1970, 1, 1)
+
+IMAGE_SIZE = (800, 320)
+MARGIN = 24
+BACKGROUND = (0x36, 0x39, 0x3f)
+BAR = (0x72, 0x89, 0xda)
+TEXT = (0xdc, 0xdd, 0xde)
+
+
+def joined_at(member):
+    """Unix time the member joined, None if Discord didn't say"""
+    if member.joined_at is None:
+        return None
+    return (member.joined_at - _UNIX_EPOCH).total_seconds()
+
+
+class GuildDates:
+    """Sorted join and creation times for one guild's members.
+
+    Parameters
+    ------------
+    members: Iterable[discord.Member]
+        Everyone in the guild right now.
+    """
+
+    __slots__ = ('joined', 'created')
+
+    def __init__(self, members):
+        joined = []
+        created = []
+        for member in members:
+            created.append(created_at(member.id))
+            time = joined_at(member)
+            if time is not None:
+                joined.append(time)
+
+        joined.sort()
+        created.sort()
+        self.joined = array('d', joined)
+        self.created = array('d', created)
+
+    def __getitem__(self, kind):
+        return self.joined if kind == 'joined' else self.created
+
+    @staticmethod
+    def _remove(values, value):
+        index = bisect_left(values, value)
+        if index < len(values) and values[index] == value:
+            del values[index]
+
+    def add(self, member):
+        insort(self.created, created_at(member.id))
+        time = joined_at(member)
+        if time is not None:
+            insort(self.joined, time)
+
+    def remove(self, member):
+        self._remove(self.created, created_at(member.id))
+        time = joined_at(member)
+        if time is not None:
+            self._remove(self.joined, time)
+
+    def histogram(self, kind, start, end, buckets=BUCKETS):
+        """How many members fall in each of ``buckets`` equal buckets from
+        ``start`` to ``end`` (unix times)"""
+        values = self[kind]
+        step = (end - start) / buckets
+        edges = [bisect_left(values, start + step * i)
+                 for i in range(buckets + 1)]
+        return [b - a for a, b in zip(edges, edges[1:])]
+
+
+def _label(timestamp, span):
+    date = datetime.datetime.utcfromtimestamp(timestamp)
+    return date.strftime('%d %b %H:%M' if span < 3 * 86400 else '%d %b %Y')
+
+
+def render(counts, start, end, title):
+    """PNG bytes of a bar chart of ``counts``. Run it in an executor."""
+    width, height = IMAGE_SIZE
+    image = Image.new('RGB', IMAGE_SIZE, BACKGROUND)
+    draw = ImageDraw.Draw(image)
+
+    top = MARGIN * 2
+    bottom = height - MARGIN * 2
+    bar_width = (width - MARGIN * 2) / len(counts)
+    highest = max(counts) or 1
+
+    for i, count in enumerate(counts):
+        if not count:
+            continue
+        left = MARGIN + i * bar_width
+        bar_top = bottom - (bottom - top) * count / highest
+        draw.rectangle((left, bar_top, left + max(bar_width - 1, 1), bottom),
+                       fill=BAR)
+
+    draw.text((MARGIN, MARGIN // 2), title, fill=TEXT)
+    draw.text((width - MARGIN - 80, MARGIN // 2), f'max {highest}/bar',
+              fill=TEXT)
+    span = end - start
+    draw.text((MARGIN, bottom + MARGIN // 2), _label(start, span), fill=TEXT)
+    draw.text((width - MARGIN - 100, bottom + MARGIN // 2),
+              _label(end, span), fill=TEXT)
+
+    bio = io.BytesIO()
+    image.save(bio, 'PNG')
+    return bio.getvalue()
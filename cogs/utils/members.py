@@ -0,0 +1,250 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# How many members to keep around. By default discord.py keeps every member
+# of every guild, which on big guilds is most of our memory, while only a
+# handful of commands actually need them. The policy is picked with
+# ``member_cache`` in the config:
+#
+#   full    every member, like before
+#   active  only members that sent something in the last ``active_ttl``
+#   none    nobody but us and the owners
+#
+# With anything but full, members that aren't cached get fetched from the
+# API when they're needed, and kept in a small LRU. With active, a fetched
+# member who's active goes back in the guild's cache, so they get member
+# updates again. Members that get dropped are announced with a
+# ``member_uncache`` event and ones that get put back with a
+# ``member_recache`` one, since as far as discord.py knows they never left
+# or joined, so anything keeping track of members has to hear about it some
+# other way.
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+
+import discord
+
+POLICIES = ('full', 'active', 'none')
+
+# attributes that point at things lots of members share, so they don't
+# count towards any one member's size
+_SHARED = frozenset({'guild', '_state', '_roles', 'roles', 'activity'})
+# members sampled per guild when estimating sizes
+SIZE_SAMPLE = 50
+
+
+def _slots(obj):
+    for cls in type(obj).__mro__:
+        yield from getattr(cls, '__slots__', ())
+
+
+def member_size(member):
+    """Rough size of a member in bytes, counting the member itself, its
+    user and the strings and such hanging off of them"""
+    size = 0
+    seen = set()
+    stack = [member]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        for name in _slots(obj):
+            if name in _SHARED:
+                continue
+            value = getattr(obj, name, None)
+            if isinstance(value, discord.abc.User):
+                stack.append(value)
+            elif value is not None:
+                seen.add(id(value))
+                size += sys.getsizeof(value)
+
+    return size
+
+
+class MemberCache:
+    """Applies the member cache policy, and fetches members that aren't
+    cached.
+
+    Parameters
+    ------------
+    policy: str
+        One of ``POLICIES``.
+    active_ttl: float
+        How long, in seconds, someone counts as active after they were last
+        seen.
+    fetch_size: int
+        How many fetched members to keep.
+    fetch_ttl: float
+        How long, in seconds, a fetched member is kept before it gets
+        fetched again, since their roles and such might have changed.
+    prune_interval: float
+        How often, in seconds, inactive members get dropped.
+    """
+
+    def __init__(self, bot, *, policy='full', active_ttl=3600.0,
+                 fetch_size=1000, fetch_ttl=300.0, prune_interval=600.0):
+        if policy not in POLICIES:
+            raise ValueError(f'member_cache has to be one of '
+                             f'{", ".join(POLICIES)}, not {policy!r}')
+
+        self.bot = bot
+        self.policy = policy
+        self.active_ttl = active_ttl
+        self.fetch_size = fetch_size
+        self.fetch_ttl = fetch_ttl
+        self.prune_interval = prune_interval
+
+        # guild id -> member id -> when they were last seen, oldest first.
+        # Kept with every policy, so the estimates can say what active
+        # would look like.
+        self.active = {}
+        # (guild id, member id) -> (Member, when it expires), oldest first
+        self.fetched = OrderedDict()
+        self._pruner = None
+
+        self.fetches = 0
+        self.fetch_hits = 0
+        self.pruned = 0
+
+    @property
+    def chunks(self):
+        """Whether discord.py should fetch offline members at all"""
+        return self.policy == 'full'
+
+    def start(self):
+        if self.policy != 'full' and self._pruner is None:
+            self._pruner = self.bot.loop.create_task(self._prune_loop())
+
+    def close(self):
+        if self._pruner is not None:
+            self._pruner.cancel()
+            self._pruner = None
+
+    def seen(self, guild_id, member_id):
+        # by id, since someone who was pruned only comes back as a User
+        now = time.monotonic()
+        active = self.active.get(guild_id)
+        if active is None:
+            active = self.active[guild_id] = OrderedDict()
+
+        active[member_id] = now
+        active.move_to_end(member_id)
+
+        # forget whoever went quiet, they're always at the front
+        cutoff = now - self.active_ttl
+        while active:
+            member_id, last_seen = next(iter(active.items()))
+            if last_seen >= cutoff:
+                break
+            del active[member_id]
+
+    def _active_ids(self, guild_id, now):
+        active = self.active.get(guild_id, {})
+        cutoff = now - self.active_ttl
+        return {m for m, last_seen in active.items() if last_seen >= cutoff}
+
+    def prune(self):
+        """Drop every cached member the policy says shouldn't be cached.
+        Returns how many were dropped."""
+        if self.policy == 'full':
+            return 0
+
+        now = time.monotonic()
+        pruned = 0
+        for guild in self.bot.guilds:
+            keep = set(self.bot.owner_ids)
+            keep.add(self.bot.user.id)
+            if self.policy == 'active':
+                keep |= self._active_ids(guild.id, now)
+
+            for member in list(guild.members):
+                if member.id not in keep:
+                    # noinspection PyProtectedMember
+                    guild._remove_member(member)
+                    self.bot.dispatch('member_uncache', member)
+                    pruned += 1
+
+        self.pruned += pruned
+        return pruned
+
+    async def _prune_loop(self):
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            self.prune()
+            await asyncio.sleep(self.prune_interval)
+
+    async def fetch(self, guild, member_id):
+        """Get a member, from the cache if they're in it and from the API if
+        they aren't. Returns None if they aren't in the guild."""
+        member = guild.get_member(member_id)
+        if member is not None:
+            return member
+
+        key = (guild.id, member_id)
+        now = time.monotonic()
+        entry = self.fetched.get(key)
+        if entry is not None and entry[1] > now:
+            self.fetch_hits += 1
+            self.fetched.move_to_end(key)
+            return entry[0]
+
+        self.fetches += 1
+        try:
+            data = await self.bot.http.get_member(guild.id, member_id)
+        except discord.NotFound:
+            self.fetched.pop(key, None)
+            return None
+
+        # noinspection PyProtectedMember
+        member = discord.Member(data=data, guild=guild,
+                                state=self.bot._connection)
+
+        if self.policy == 'active' \
+                and member_id in self._active_ids(guild.id, now):
+            # the policy says they should be cached, probably pruned while
+            # they were quiet
+            # noinspection PyProtectedMember
+            guild._add_member(member)
+            self.fetched.pop(key, None)
+            self.bot.dispatch('member_recache', member)
+            return member
+
+        self.fetched[key] = (member, now + self.fetch_ttl)
+        self.fetched.move_to_end(key)
+        while len(self.fetched) > self.fetch_size:
+            self.fetched.popitem(last=False)
+
+        return member
+
+    def estimate(self, guild):
+        """Estimated bytes the guild's members take up now, and would take
+        up with each policy"""
+        sample = guild.members[:SIZE_SAMPLE]
+        average = sum(map(member_size, sample)) / len(sample) if sample \
+            else 0
+
+        total = getattr(guild, 'member_count', None) or len(guild.members)
+        active = len(self._active_ids(guild.id, time.monotonic()))
+        owners = sum(1 for i in self.bot.owner_ids if guild.get_member(i))
+
+        return {
+            'now': len(guild.members) * average,
+            'full': total * average,
+            'active': (active + 1) * average,
+            'none': (owners + 1) * average,
+        }
+
+    def stats(self):
+        return {
+            'policy': self.policy,
+            'cached': sum(len(g.members) for g in self.bot.guilds),
+            'fetched': len(self.fetched),
+            'fetches': self.fetches,
+            'fetch hits': self.fetch_hits,
+            'pruned': self.pruned,
+        }
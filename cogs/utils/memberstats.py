@@ -0,0 +1,141 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Running counts of games, names and nicks per guild. Counting them from
+# guild.members every time means going through every member on every
+# command, which on a big guild is a lot of members. Instead every guild
+# is counted once, then kept up to date from member events.
+
+
+def game(member):
+    return getattr(member.activity, 'name', None)
+
+
+def name(member):
+    return member.name
+
+
+def nick(member):
+    return member.display_name
+
+
+class RankedCounter:
+    """A Counter that's always ready to be listed most common first.
+
+    Keys are kept in buckets by count, so adding or removing one is O(1),
+    and listing them only means sorting the distinct counts, of which there
+    are way fewer than keys.
+    """
+
+    __slots__ = ('counts', 'buckets', 'lowered')
+
+    def __init__(self):
+        # key -> count
+        self.counts = {}
+        # count -> {key: None}, a dict so it keeps insertion order
+        self.buckets = {}
+        # key -> key.lower(), so searching doesn't lower every key again
+        self.lowered = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _move(self, key, old, new):
+        if old:
+            bucket = self.buckets[old]
+            del bucket[key]
+            if not bucket:
+                del self.buckets[old]
+
+        if new:
+            self.buckets.setdefault(new, {})[key] = None
+            self.counts[key] = new
+        else:
+            del self.counts[key]
+            del self.lowered[key]
+
+    def add(self, key):
+        if key is None:
+            return
+
+        old = self.counts.get(key, 0)
+        if not old:
+            self.lowered[key] = key.lower()
+        self._move(key, old, old + 1)
+
+    def remove(self, key):
+        old = self.counts.get(key, 0)
+        if old:
+            self._move(key, old, old - 1)
+
+    def replace(self, old_key, new_key):
+        if old_key != new_key:
+            self.remove(old_key)
+            self.add(new_key)
+
+    def most_common(self, query=''):
+        """(key, count) pairs, most common first, only the keys containing
+        ``query`` (which should already be lowercase) if it's given"""
+        lowered = self.lowered
+        for count in sorted(self.buckets, reverse=True):
+            for key in self.buckets[count]:
+                if not query or query in lowered[key]:
+                    yield key, count
+
+
+class MemberStats:
+    """Games, names and nicks for one guild.
+
+    Parameters
+    ------------
+    members: Iterable[discord.Member]
+        Everyone in the guild right now, counted once to start with.
+    """
+
+    KINDS = {'games': game, 'names': name, 'nicks': nick}
+
+    __slots__ = ('counters', 'counted')
+
+    def __init__(self, members):
+        self.counters = {kind: RankedCounter() for kind in self.KINDS}
+        # member id -> the keys they were counted under, one per kind.
+        # Updates are diffed against these instead of the before member,
+        # which shares its User with the after one, so it already has the
+        # new name by the time we get it.
+        self.counted = {}
+        for member in members:
+            self.add(member)
+
+    def __getitem__(self, kind):
+        return self.counters[kind]
+
+    def _keys(self, member):
+        return tuple(key(member) for key in self.KINDS.values())
+
+    def add(self, member):
+        if member.id in self.counted:
+            return self.update(member, member)
+
+        keys = self.counted[member.id] = self._keys(member)
+        for counter, key in zip(self.counters.values(), keys):
+            counter.add(key)
+
+    def remove(self, member):
+        keys = self.counted.pop(member.id, None)
+        if keys is None:
+            return
+
+        for counter, key in zip(self.counters.values(), keys):
+            counter.remove(key)
+
+    def update(self, before, after):
+        old = self.counted.get(after.id)
+        if old is None:
+            # someone we hadn't seen yet, like from a late member chunk
+            return self.add(after)
+
+        new = self.counted[after.id] = self._keys(after)
+        for counter, old_key, new_key in zip(self.counters.values(), old,
+                                             new):
+            counter.replace(old_key, new_key)
@@ -0,0 +1,126 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Helpers for figuring out where the bot's memory is going.
+import gc
+import os
+import sys
+import sysconfig
+import tracemalloc
+
+_root = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)
+)))
+_stdlib = sysconfig.get_paths()['stdlib']
+
+# tracemalloc's own bookkeeping and the import machinery are just noise
+_noise = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def rss():
+    """The process' resident set size in bytes, or None if we can't tell"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # this is the peak and not the current size, but it's better than nothing
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def gc_counts():
+    """Pending objects and collections so far for every gc generation"""
+    return [
+        (count, stats['collections'])
+        for count, stats in zip(gc.get_count(), gc.get_stats())
+    ]
+
+
+def module_for(filename):
+    """Which part of the bot (or which library) a file belongs to"""
+    path = os.path.abspath(filename)
+    if path.startswith(_root + os.sep) and 'site-packages' not in path:
+        # cogs/admin.py -> cogs.admin
+        return os.path.splitext(os.path.relpath(path, _root))[0] \
+            .replace(os.sep, '.')
+
+    parts = path.split(os.sep)
+    if 'site-packages' in parts:
+        # the top level package, like discord or asyncpg
+        rest = parts[parts.index('site-packages') + 1:]
+        return os.path.splitext(rest[0])[0] if rest else path
+
+    if path.startswith(_stdlib + os.sep):
+        return 'stdlib.' + os.path.splitext(
+            os.path.relpath(path, _stdlib)
+        )[0].split(os.sep)[0]
+
+    return filename
+
+
+def _ours(filename):
+    path = os.path.abspath(filename)
+    return path.startswith(_root + os.sep) and 'site-packages' not in path
+
+
+def owner(traceback):
+    """The module an allocation gets credited to: the most recent frame in
+    the bot's own code, since a Message that a cog keeps around is the
+    cog's fault and not discord.py's, even though discord.py made it. Only
+    falls back to wherever it was actually allocated if none of the frames
+    are ours, so the more frames tracemalloc keeps the better this works."""
+    # tracebacks go from the oldest frame to the most recent one
+    for frame in reversed(traceback):
+        if _ours(frame.filename):
+            return module_for(frame.filename)
+    return module_for(traceback[-1].filename)
+
+
+def take_snapshot():
+    """Slow with lots of traces, run it in an executor"""
+    return tracemalloc.take_snapshot().filter_traces(_noise)
+
+
+def diff_by_module(old, new):
+    """Returns [(module, size_diff, count_diff)], biggest growth first.
+    Slow, run it in an executor."""
+    totals = {}
+    for stat in new.compare_to(old, 'traceback'):
+        module = owner(stat.traceback)
+        size, count = totals.get(module, (0, 0))
+        totals[module] = (size + stat.size_diff, count + stat.count_diff)
+
+    return sorted(((module, size, count)
+                   for module, (size, count) in totals.items()),
+                  key=lambda t: t[1], reverse=True)
+
+
+def diff_by_line(old, new):
+    """The allocation sites that grew the most, as StatisticDiffs. Slow,
+    run it in an executor."""
+    return new.compare_to(old, 'lineno')
+
+
+def format_bytes(size, *, sign=False):
+    prefix = '+' if sign and size > 0 else ''
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return f'{prefix}{size:.1f} {unit}' if unit != 'B' \
+                else f'{prefix}{size} {unit}'
+        size /= 1024
+    return f'{prefix}{size:.1f} GiB'
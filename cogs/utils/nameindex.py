@@ -0,0 +1,297 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Finding members by name without going through every member. Every guild
+# that gets searched gets a trigram index over its members' names and
+# display names, which is then kept up to date from member events.
+#
+# A name containing "abcd" has to contain both "abc" and "bcd", so a
+# substring search only has to look at the members that have all of the
+# query's trigrams, which is usually a handful.
+import asyncio
+import re
+from collections import Counter
+
+from discord.ext import commands
+
+# how alike two names have to be (shared trigrams / all trigrams) for a
+# fuzzy match
+FUZZY_CUTOFF = 0.3
+# how many members to index before letting something else run
+BUILD_CHUNK = 1000
+
+_member_id = re.compile(r'<@!?([0-9]+)>$|([0-9]{15,21})$')
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _padded(text):
+    # padding makes short names have trigrams too, and makes the start and
+    # end of names count for a bit more in fuzzy matches
+    return trigrams(f'  {text} ')
+
+
+class NameIndex:
+    """Trigram index over one guild's names and display names.
+
+    Parameters
+    ------------
+    members: Iterable[discord.Member]
+        Who to start out with.
+    """
+
+    __slots__ = ('names', 'postings', 'fuzzy_postings')
+
+    def __init__(self, members=()):
+        # member id -> (name, display name), both lowercase
+        self.names = {}
+        # trigram -> member ids with it in one of their names
+        self.postings = {}
+        # same, but padded trigrams, for fuzzy matches
+        self.fuzzy_postings = {}
+
+        for member in members:
+            self.add(member)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _grams(self, names):
+        exact = set()
+        padded = set()
+        for name in names:
+            exact |= trigrams(name)
+            padded |= _padded(name)
+        return exact, padded
+
+    def add(self, member):
+        if member.id in self.names:
+            self.remove(member)
+
+        names = (member.name.lower(), member.display_name.lower())
+        self.names[member.id] = names
+
+        exact, padded = self._grams(names)
+        for gram in exact:
+            self.postings.setdefault(gram, set()).add(member.id)
+        for gram in padded:
+            self.fuzzy_postings.setdefault(gram, set()).add(member.id)
+
+    def remove(self, member):
+        names = self.names.pop(member.id, None)
+        if names is None:
+            return
+
+        exact, padded = self._grams(names)
+        for postings, grams in ((self.postings, exact),
+                                (self.fuzzy_postings, padded)):
+            for gram in grams:
+                ids = postings[gram]
+                ids.discard(member.id)
+                if not ids:
+                    del postings[gram]
+
+    def update(self, before, after):
+        if (after.name.lower(), after.display_name.lower()) \
+                != self.names.get(after.id):
+            self.remove(before)
+            self.add(after)
+
+    def exact(self, query):
+        """Ids of members whose name or display name is exactly ``query``,
+        ignoring case"""
+        query = query.lower()
+        return [member_id for member_id in self._candidates(query)
+                if query in self.names[member_id]]
+
+    def _candidates(self, query):
+        grams = trigrams(query)
+        if not grams:
+            # too short to have any trigrams, so there's nothing to narrow
+            # it down with
+            return list(self.names)
+
+        sets = sorted((self.postings.get(gram, ()) for gram in grams),
+                      key=len)
+        if not sets[0]:
+            return []
+        return set(sets[0]).intersection(*sets[1:])
+
+    def search(self, query, limit=None):
+        """Ids of members with ``query`` in their name or display name,
+        best first: exact matches, then names starting with it, then the
+        rest, shortest names first within each"""
+        query = query.lower()
+        ranked = []
+        for member_id in self._candidates(query):
+            name, display = self.names[member_id]
+            best = None
+            for text in (name, display):
+                if query not in text:
+                    continue
+                rank = (0 if text == query
+                        else 1 if text.startswith(query) else 2, len(text))
+                best = rank if best is None else min(best, rank)
+            if best is not None:
+                ranked.append((best, member_id))
+
+        ranked.sort()
+        return [member_id for _, member_id in ranked[:limit]]
+
+    def fuzzy(self, query, limit=10, cutoff=FUZZY_CUTOFF):
+        """(member id, score) of members with names like ``query``, for
+        typos and the like, best first. Scores go from 0 to 1."""
+        query = query.lower()
+        grams = _padded(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.fuzzy_postings.get(gram, ()))
+
+        scores = []
+        for member_id, count in shared.items():
+            score = 0.0
+            for text in self.names[member_id]:
+                # trigrams of each name, roughly, without building them
+                total = len(grams) + len(text) + 1 - count
+                score = max(score, count / total if total > 0 else 0.0)
+            if score >= cutoff:
+                scores.append((score, member_id))
+
+        scores.sort(key=lambda s: (-s[0], s[1]))
+        return [(member_id, score) for score, member_id in scores[:limit]]
+
+
+class MemberIndex:
+    """Keeps a NameIndex for every guild that has been searched."""
+
+    def __init__(self):
+        # guild id -> NameIndex
+        self.guilds = {}
+        # guild id -> task indexing it for the first time
+        self.building = {}
+
+    async def get(self, guild):
+        task = self.building.get(guild.id)
+        if task is None and guild.id not in self.guilds:
+            task = self.building[guild.id] = asyncio.ensure_future(
+                self._build(guild)
+            )
+
+        if task is not None:
+            # shielded, so one search getting cancelled doesn't cancel it
+            # for everyone else waiting on it too
+            await asyncio.shield(task)
+        return self.guilds[guild.id]
+
+    async def _build(self, guild):
+        # a big guild takes a while, so it's done in chunks. The index is
+        # put in place first so that member events that happen in the
+        # meantime still get applied.
+        index = self.guilds[guild.id] = NameIndex()
+        try:
+            for i, member in enumerate(list(guild.members), 1):
+                index.add(member)
+                if i % BUILD_CHUNK == 0:
+                    await asyncio.sleep(0)
+        except BaseException:
+            self.guilds.pop(guild.id, None)
+            raise
+        finally:
+            self.building.pop(guild.id, None)
+
+    def add(self, member):
+        index = self.guilds.get(member.guild.id)
+        if index is not None:
+            index.add(member)
+
+    def remove(self, member):
+        index = self.guilds.get(member.guild.id)
+        if index is not None:
+            index.remove(member)
+
+    def update(self, before, after):
+        index = self.guilds.get(after.guild.id)
+        if index is not None:
+            index.update(before, after)
+
+    def forget(self, guild_id):
+        self.guilds.pop(guild_id, None)
+        task = self.building.pop(guild_id, None)
+        if task is not None:
+            task.cancel()
+
+    def clear(self):
+        for task in self.building.values():
+            task.cancel()
+        self.building.clear()
+        self.guilds.clear()
+
+    def stats(self):
+        return {
+            'guilds': len(self.guilds),
+            'members': sum(len(i) for i in self.guilds.values()),
+        }
+
+
+class IndexedMember(commands.MemberConverter):
+    """MemberConverter, but names are looked up in the bot's member index
+    instead of going through every member.
+
+    Takes the same things MemberConverter does: mentions, ids, name#discrim,
+    names and nicknames. If ``loose`` is on, which it is when it's used as
+    an annotation, it also takes part of a name, or a slightly misspelled
+    one, and picks the best match.
+    """
+
+    def __init__(self, *, loose=True):
+        self.loose = loose
+
+    @staticmethod
+    def _first_cached(guild, member_ids):
+        # the best match might not be cached anymore, in which case the next
+        # best one that is will do
+        for member_id in member_ids:
+            member = guild.get_member(member_id)
+            if member is not None:
+                return member
+        return None
+
+    async def convert(self, ctx, argument):
+        if ctx.guild is None:
+            return await super().convert(ctx, argument)
+
+        guild = ctx.guild
+        match = _member_id.match(argument)
+        if match is not None:
+            member = await ctx.bot.member_cache.fetch(
+                guild, int(match.group(1) or match.group(2))
+            )
+            if member is not None:
+                return member
+            raise commands.BadArgument(f'Member "{argument}" not found')
+
+        index = await ctx.bot.member_index.get(guild)
+
+        name, _, discrim = argument.rpartition('#')
+        if name and len(discrim) == 4 and discrim.isdigit():
+            for member_id in index.exact(name):
+                member = guild.get_member(member_id)
+                if member is not None and member.discriminator == discrim:
+                    return member
+
+        member = self._first_cached(guild, index.exact(argument))
+        if member is None and self.loose:
+            member = self._first_cached(guild, index.search(argument))
+            if member is None:
+                member = self._first_cached(
+                    guild, (member_id for member_id, _ in
+                            index.fuzzy(argument, limit=None))
+                )
+
+        if member is not None:
+            return member
+
+        raise commands.BadArgument(f'Member "{argument}" not found')
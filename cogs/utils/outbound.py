@@ -0,0 +1,238 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Queues up the REST calls the bot makes on its own (replies, edits,
+# reactions, typing) per channel, so that a burst of paginator clicks or a
+# `loading` run doesn't pile up behind Discord's rate limits.
+import asyncio
+import collections
+import itertools
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+# Lower goes first
+HIGH = 0  # command replies
+NORMAL = 1  # edits
+LOW = 2  # reactions, typing and deletes
+
+# (rate, per) for each route, per channel. discord.py still handles any 429
+# we end up getting, this just stops us from getting them in the first place.
+ROUTE_LIMITS = {
+    'send': (5, 5.0),
+    'edit': (5, 5.0),
+    'reaction': (1, 0.25),
+    'typing': (5, 5.0),
+    'delete': (5, 1.0),
+    'bulk_delete': (1, 1.0),
+}
+
+
+class _Bucket:
+    """Sliding window over the last `rate` requests on a route"""
+    __slots__ = ('rate', 'per', 'window')
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.window = collections.deque(maxlen=rate)
+
+    def delay(self, now):
+        if len(self.window) < self.rate:
+            return 0.0
+        return max(0.0, self.window[0] + self.per - now)
+
+    def hit(self, now):
+        self.window.append(now)
+
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'route', 'key', 'func', 'args', 'kwargs',
+                 'future')
+
+    def __init__(self, priority, seq, route, key, func, args, kwargs, future):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.key = key
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Lane:
+    """Everything queued up for one channel"""
+    __slots__ = ('queue', 'edits', 'buckets', 'worker')
+
+    def __init__(self):
+        self.queue = asyncio.PriorityQueue()
+        self.edits = {}
+        self.buckets = {}
+        self.worker = None
+
+
+def _channel_id(destination):
+    # works for contexts, messages, channels and users
+    return getattr(destination, 'channel', destination).id
+
+
+def _log_failure(future):
+    if future.cancelled():
+        return
+
+    # retrieving it here stops asyncio from complaining about fire and forget
+    # calls, whoever awaits the future still gets the exception
+    exc = future.exception()
+    if exc is not None:
+        log.debug(f'Outbound request failed: {exc!r}')
+
+
+class OutboundScheduler:
+    """Bot-wide queue for outgoing REST calls.
+
+    Every channel gets its own priority queue, drained by a worker that
+    respects the per-route limits in ``ROUTE_LIMITS``. Replies go before
+    edits, which go before reactions and typing. An edit to a message that
+    already has an edit waiting replaces the waiting edit's fields instead
+    of queueing another request.
+
+    All the methods return a future, so they can either be awaited or just
+    fired off.
+    """
+
+    def __init__(self, loop, *, idle_timeout=30.0):
+        self.loop = loop
+        self.idle_timeout = idle_timeout
+        self._lanes = {}
+        self._seq = itertools.count()
+        self.sent = 0
+        self.coalesced = 0
+
+    def _submit(self, channel_id, route, priority, func, *args, key=None,
+                **kwargs):
+        lane = self._lanes.get(channel_id)
+        if lane is None:
+            lane = self._lanes[channel_id] = _Lane()
+
+        future = self.loop.create_future()
+        future.add_done_callback(_log_failure)
+        job = _Job(priority, next(self._seq), route, key, func, args, kwargs,
+                   future)
+
+        if key is not None:
+            lane.edits[key] = job
+        lane.queue.put_nowait(job)
+
+        if lane.worker is None or lane.worker.done():
+            lane.worker = self.loop.create_task(self._drain(channel_id, lane))
+
+        return future
+
+    async def _drain(self, channel_id, lane):
+        while True:
+            try:
+                job = await asyncio.wait_for(lane.queue.get(),
+                                             self.idle_timeout)
+            except asyncio.TimeoutError:
+                if lane.queue.empty():
+                    # nothing going on in this channel anymore
+                    self._lanes.pop(channel_id, None)
+                    return
+                continue
+
+            if job.future.done():
+                # cancelled while it was waiting, so later edits mustn't be
+                # merged into it either
+                if job.key is not None and lane.edits.get(job.key) is job:
+                    del lane.edits[job.key]
+                continue
+
+            bucket = lane.buckets.get(job.route)
+            if bucket is None:
+                bucket = lane.buckets[job.route] = _Bucket(
+                    *ROUTE_LIMITS[job.route]
+                )
+
+            delay = bucket.delay(time.monotonic())
+            if delay:
+                await asyncio.sleep(delay)
+
+            # from here on newer edits can't be merged into this one
+            if job.key is not None and lane.edits.get(job.key) is job:
+                del lane.edits[job.key]
+
+            bucket.hit(time.monotonic())
+            self.sent += 1
+
+            # noinspection PyBroadException
+            try:
+                result = await job.func(*job.args, **job.kwargs)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+
+    def send(self, destination, func, *args, **kwargs):
+        """Queue a message send. ``func`` is the send method to call."""
+        return self._submit(_channel_id(destination), 'send', HIGH, func,
+                            *args, **kwargs)
+
+    def edit(self, message, **fields):
+        """Queue an edit to a message, merging it with any waiting edit"""
+        lane = self._lanes.get(message.channel.id)
+        if lane is not None:
+            pending = lane.edits.get(message.id)
+            # a cancelled one won't be sent, so it needs a new job
+            if pending is not None and not pending.future.done():
+                pending.kwargs.update(fields)
+                self.coalesced += 1
+                return pending.future
+
+        return self._submit(message.channel.id, 'edit', NORMAL, message.edit,
+                            key=message.id, **fields)
+
+    def add_reaction(self, message, emoji):
+        return self._submit(message.channel.id, 'reaction', LOW,
+                            message.add_reaction, emoji)
+
+    def remove_reaction(self, message, emoji, member):
+        return self._submit(message.channel.id, 'reaction', LOW,
+                            message.remove_reaction, emoji, member)
+
+    def delete(self, destination, func, *args, bulk=False):
+        """Queue a message delete. ``func`` is the HTTP method to call."""
+        return self._submit(_channel_id(destination),
+                            'bulk_delete' if bulk else 'delete', LOW, func,
+                            *args)
+
+    def typing(self, channel):
+        return self._submit(_channel_id(channel), 'typing', LOW,
+                            channel.trigger_typing)
+
+    def stats(self):
+        return {
+            'requests sent': self.sent,
+            'edits coalesced': self.coalesced,
+            'active channels': len(self._lanes),
+        }
+
+    def close(self):
+        for lane in self._lanes.values():
+            if lane.worker is not None:
+                lane.worker.cancel()
+
+            while not lane.queue.empty():
+                lane.queue.get_nowait().future.cancel()
+
+        self._lanes.clear()
@@ -14,10 +14,25 @@ import re
 import discord
 
 
+# https://discordapp.com/developers/docs/resources/channel#embed-limits
+EMBED_DESCRIPTION_LIMIT = 2048
+EMBED_FIELD_LIMIT = 25
+EMBED_FIELD_NAME_LIMIT = 256
+EMBED_FIELD_VALUE_LIMIT = 1024
+EMBED_TOTAL_LIMIT = 6000
+
+
 class CannotPaginate(Exception):
     pass
 
 
+def _clip(text, limit):
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return text[:limit - 1] + '\N{HORIZONTAL ELLIPSIS}'
+
+
 class Pages:
     """Implements a paginator that queries the user for the
     pagination interface.
@@ -34,9 +49,13 @@ class Pages:
     entries: List[str]
         A list of entries to paginate.
     per_page: int
-        How many entries show up per page.
+        How many entries show up per page. Ignored if ``pack`` is set.
     show_entry_count: bool
         Whether to show an entry count in the footer.
+    pack: bool
+        Whether to fit as many entries as the embed limits allow on each
+        page instead of a fixed ``per_page`` count. Page boundaries are
+        worked out once, up front.
 
     Attributes
     -----------
@@ -48,8 +67,12 @@ class Pages:
         Our permissions for the channel.
     """
 
+    # leave some room for the "Confused?" hint on the first page
+    page_budget = EMBED_DESCRIPTION_LIMIT - 64
+    page_entry_limit = None
+
     def __init__(self, ctx, *, entries, per_page=12, show_entry_count=True,
-                 hide_no_results=False):
+                 hide_no_results=False, pack=False):
         self.hide_no_results = hide_no_results
         self.bot = ctx.bot
         self.entries = entries
@@ -57,12 +80,14 @@ class Pages:
         self.channel = ctx.channel
         self.author = ctx.author
         self.per_page = per_page
-        pages, left_over = divmod(len(self.entries), self.per_page)
-        if left_over:
-            pages += 1
-        self.maximum_pages = pages
+        self.pack = pack
+        if pack:
+            self.page_starts = self.pack_entries()
+        else:
+            self.page_starts = list(range(0, len(self.entries), per_page))
+        self.maximum_pages = len(self.page_starts)
         self.embed = discord.Embed(colour=discord.Colour.blurple())
-        self.paginating = len(entries) > per_page
+        self.paginating = self.maximum_pages > 1
         self.show_entry_count = show_entry_count
         self.reaction_emojis = [
             ('\N{BLACK LEFT-POINTING DOUBLE TRIANGLE WITH VERTICAL BAR}',
@@ -97,18 +122,47 @@ class Pages:
                 raise CannotPaginate(
                     'Bot does not have Read Message History permission.')
 
+    def entry_length(self, index, entry):
+        """How many characters an entry takes up on a page"""
+        # the line itself plus the newline joining it to the next one
+        return len(f'{index + 1}. {entry}') + 1
+
+    def pack_entries(self):
+        """Greedily splits the entries into pages that fit in one embed.
+
+        Returns the index of the first entry of every page.
+        """
+        starts = []
+        size = count = 0
+        for index, entry in enumerate(self.entries):
+            # entries too long for a page on their own get clipped when shown
+            length = min(self.entry_length(index, entry), self.page_budget)
+            if not starts or size + length > self.page_budget \
+                    or count == self.page_entry_limit:
+                starts.append(index)
+                size = count = 0
+
+            size += length
+            count += 1
+
+        return starts
+
     def get_page(self, page):
-        base = (page - 1) * self.per_page
-        return self.entries[base:base + self.per_page]
+        base = self.page_starts[page - 1]
+        try:
+            end = self.page_starts[page]
+        except IndexError:
+            end = len(self.entries)
+        return self.entries[base:end]
 
     async def show_page(self, page, *, first=False):
         # noinspection PyAttributeOutsideInit
         self.current_page = page
         entries = self.get_page(page)
         p = []
-        for index, entry in enumerate(entries,
-                                      1 + ((page - 1) * self.per_page)):
-            p.append(f'{index}. {entry}')
+        for index, entry in enumerate(entries, 1 + self.page_starts[page - 1]):
+            line = f'{index}. {entry}'
+            p.append(_clip(line, self.page_budget) if self.pack else line)
 
         if self.maximum_pages > 1:
             if self.show_entry_count:
@@ -125,7 +179,8 @@ class Pages:
 
         if not first:
             self.embed.description = '\n'.join(p)
-            await self.message.edit(embed=self.embed)
+            # not awaited, so fast clicking just collapses into the last page
+            self.bot.outbound.edit(self.message, embed=self.embed)
             return
 
         p.append('')
@@ -133,10 +188,11 @@ class Pages:
         self.embed.description = '\n'.join(p)
         self.message = await self.channel.send(embed=self.embed)
 
-        await self.message.add_reaction('🔣')
+        await self.bot.outbound.add_reaction(self.message, '🔣')
 
     async def add_rest_reactions(self):
-        await self.message.remove_reaction('🔣', self.message.guild.me)
+        await self.bot.outbound.remove_reaction(self.message, '🔣',
+                                              self.message.guild.me)
         for (reaction, _) in self.reaction_emojis:
             if self.maximum_pages == 2 and reaction in ('\u23ed', '\u23ee'):
                 # no |<< or >>| buttons if we only have two pages
@@ -144,7 +200,7 @@ class Pages:
                 # it from the default set
                 continue
 
-            await self.message.add_reaction(reaction)
+            await self.bot.outbound.add_reaction(self.message, reaction)
 
     async def checked_show_page(self, page):
         if page != 0 and page <= self.maximum_pages:
@@ -219,7 +275,7 @@ class Pages:
         self.embed.clear_fields()
         self.embed.set_footer(
             text=f'We were on page {self.current_page} before this message.')
-        await self.message.edit(embed=self.embed)
+        await self.bot.outbound.edit(self.message, embed=self.embed)
 
         async def go_back_to_current_page():
             await asyncio.sleep(60.0)
@@ -280,11 +336,8 @@ class Pages:
                 finally:
                     break
 
-            # noinspection PyBroadException
-            try:
-                await self.message.remove_reaction(reaction, user)
-            except:
-                pass  # can't remove it so don't bother doing so
+            # if we can't remove it, the queue just drops the error
+            self.bot.outbound.remove_reaction(self.message, reaction, user)
 
             await self.match()
 
@@ -349,7 +402,9 @@ class EmbedPages:
             return await self.channel.send(embed=embed)
 
         if not first:
-            return await self.message.edit(embed=embed)
+            # not awaited, so fast clicking just collapses into the last page
+            self.bot.outbound.edit(self.message, embed=embed)
+            return
 
         p.append('')
         p.append('Confused? React with \N{INFORMATION SOURCE} for more info.')
@@ -358,10 +413,11 @@ class EmbedPages:
         embed.description += '\n'.join(p)
         self.message = await self.channel.send(embed=embed)
 
-        await self.message.add_reaction('🔣')
+        await self.bot.outbound.add_reaction(self.message, '🔣')
 
     async def add_rest_reactions(self):
-        await self.message.remove_reaction('🔣', self.message.guild.me)
+        await self.bot.outbound.remove_reaction(self.message, '🔣',
+                                              self.message.guild.me)
         for (reaction, _) in self.reaction_emojis:
             if self.maximum_pages == 2 and reaction in ('\u23ed', '\u23ee'):
                 # no |<< or >>| buttons if we only have two pages
@@ -369,7 +425,7 @@ class EmbedPages:
                 # it from the default set
                 continue
 
-            await self.message.add_reaction(reaction)
+            await self.bot.outbound.add_reaction(self.message, reaction)
 
     async def checked_show_page(self, page):
         if page != 0 and page <= self.maximum_pages:
@@ -446,7 +502,7 @@ class EmbedPages:
         embed.clear_fields()
         embed.set_footer(
             text=f'We were on page {self.current_page} before this message.')
-        await self.message.edit(embed=embed)
+        await self.bot.outbound.edit(self.message, embed=embed)
 
         async def go_back_to_current_page():
             await asyncio.sleep(60.0)
@@ -502,11 +558,8 @@ class EmbedPages:
                 finally:
                     break
 
-            # noinspection PyBroadException
-            try:
-                await self.message.remove_reaction(reaction, user)
-            except:
-                pass  # can't remove it so don't bother doing so
+            # if we can't remove it, the queue just drops the error
+            self.bot.outbound.remove_reaction(self.message, reaction, user)
 
             await self.match()
 
@@ -516,6 +569,15 @@ class FieldPages(Pages):
     tuples having (key, value) to show as embed fields instead.
     """
 
+    # leave some room for the title and footer
+    page_budget = EMBED_TOTAL_LIMIT - 256
+    page_entry_limit = EMBED_FIELD_LIMIT
+
+    def entry_length(self, index, entry):
+        key, value = entry
+        return min(len(str(key)), EMBED_FIELD_NAME_LIMIT) \
+            + min(len(str(value)), EMBED_FIELD_VALUE_LIMIT)
+
     async def show_page(self, page, *, first=False):
         # noinspection PyAttributeOutsideInit
         self.current_page = page
@@ -525,6 +587,9 @@ class FieldPages(Pages):
         self.embed.description = discord.Embed.Empty
 
         for key, value in entries:
+            if self.pack:
+                key = _clip(key, EMBED_FIELD_NAME_LIMIT)
+                value = _clip(value, EMBED_FIELD_VALUE_LIMIT)
             self.embed.add_field(name=key, value=value, inline=False)
 
         if self.maximum_pages > 1:
@@ -540,7 +605,8 @@ class FieldPages(Pages):
             return await self.channel.send(embed=self.embed)
 
         if not first:
-            await self.message.edit(embed=self.embed)
+            # not awaited, so fast clicking just collapses into the last page
+            self.bot.outbound.edit(self.message, embed=self.embed)
             return
 
         self.message = await self.channel.send(embed=self.embed)
@@ -551,7 +617,129 @@ class FieldPages(Pages):
                 # it from the default set
                 continue
 
-            await self.message.add_reaction(reaction)
+            await self.bot.outbound.add_reaction(self.message, reaction)
+
+
+class CursorPages:
+    """Paginates text pages that only get made when someone asks for them,
+    like rows coming out of a database cursor.
+
+    Pages can only be fetched going forwards, so the ones that were already
+    shown are kept around for going back.
+
+    Parameters
+    ------------
+    ctx: Context
+        The context of the command.
+    fetch: Callable[[], Awaitable[Tuple[Optional[str], bool]]]
+        Gets the next page and whether there might be more after it. The
+        page can be None if it turns out there wasn't anything left.
+    first_page: str
+        The first page, already fetched.
+    more: bool
+        Whether there might be more pages after the first one.
+    """
+
+    def __init__(self, ctx, *, fetch, first_page, more=True):
+        self.bot = ctx.bot
+        self.fetch = fetch
+        self.pages = [first_page]
+        self.more = more
+        self.current_page = 1
+        self.message = None
+        self.channel = ctx.channel
+        self.author = ctx.author
+        self.paginating = more
+        self.reaction_emojis = [
+            ('\N{BLACK LEFT-POINTING TRIANGLE}', self.previous_page),
+            ('\N{BLACK RIGHT-POINTING TRIANGLE}', self.next_page),
+            ('\N{BLACK SQUARE FOR STOP}', self.stop_pages),
+        ]
+
+        if ctx.guild is not None:
+            self.permissions = self.channel.permissions_for(ctx.guild.me)
+        else:
+            self.permissions = self.channel.permissions_for(ctx.bot.user)
+
+        if not self.permissions.send_messages:
+            raise CannotPaginate('Bot cannot send messages.')
+
+        if self.paginating:
+            if not self.permissions.add_reactions:
+                raise CannotPaginate(
+                    'Bot does not have add reactions permission.')
+
+            if not self.permissions.read_message_history:
+                raise CannotPaginate(
+                    'Bot does not have Read Message History permission.')
+
+    def show_page(self, page):
+        self.current_page = page
+        # not awaited, so fast clicking just collapses into the last page
+        self.bot.outbound.edit(self.message, content=self.pages[page - 1])
+
+    async def next_page(self):
+        """goes to the next page"""
+        if self.current_page == len(self.pages) and self.more:
+            page, self.more = await self.fetch()
+            if page is not None:
+                self.pages.append(page)
+
+        if self.current_page < len(self.pages):
+            self.show_page(self.current_page + 1)
+
+    async def previous_page(self):
+        """goes to the previous page"""
+        if self.current_page > 1:
+            self.show_page(self.current_page - 1)
+
+    async def stop_pages(self):
+        """stops the interactive pagination session"""
+        await self.message.delete()
+        self.paginating = False
+
+    def react_check(self, reaction, user):
+        if user is None or user.id != self.author.id:
+            return False
+
+        if reaction.message.id != self.message.id:
+            return False
+
+        for (emoji, func) in self.reaction_emojis:
+            if reaction.emoji == emoji:
+                # noinspection PyAttributeOutsideInit
+                self.match = func
+                return True
+        return False
+
+    async def paginate(self):
+        """Send the first page and run the interactive loop if necessary."""
+        self.message = await self.channel.send(self.pages[0])
+        if not self.paginating:
+            return
+
+        for (reaction, _) in self.reaction_emojis:
+            self.bot.outbound.add_reaction(self.message, reaction)
+
+        while self.paginating:
+            try:
+                reaction, user = await self.bot.wait_for('reaction_add',
+                                                         check=self.react_check,
+                                                         timeout=120.0)
+            except asyncio.TimeoutError:
+                self.paginating = False
+                # noinspection PyBroadException
+                try:
+                    await self.message.clear_reactions()
+                except:
+                    pass
+                finally:
+                    break
+
+            # if we can't remove it, the queue just drops the error
+            self.bot.outbound.remove_reaction(self.message, reaction, user)
+
+            await self.match()
 
 
 # ?help
@@ -746,7 +934,8 @@ class HelpPaginator(Pages):
             return await self.channel.send(embed=self.embed)
 
         if not first:
-            await self.message.edit(embed=self.embed)
+            # not awaited, so fast clicking just collapses into the last page
+            self.bot.outbound.edit(self.message, embed=self.embed)
             return
 
         self.message = await self.channel.send(embed=self.embed)
@@ -757,7 +946,7 @@ class HelpPaginator(Pages):
                 # it from the default set
                 continue
 
-            await self.message.add_reaction(reaction)
+            await self.bot.outbound.add_reaction(self.message, reaction)
 
     async def show_help(self):
         """shows this message"""
@@ -773,7 +962,7 @@ class HelpPaginator(Pages):
 
         self.embed.set_footer(
             text=f'We were on page {self.current_page} before this message.')
-        await self.message.edit(embed=self.embed)
+        await self.bot.outbound.edit(self.message, embed=self.embed)
 
         async def go_back_to_current_page():
             await asyncio.sleep(30.0)
@@ -808,7 +997,7 @@ class HelpPaginator(Pages):
 
         self.embed.set_footer(
             text=f'We were on page {self.current_page} before this message.')
-        await self.message.edit(embed=self.embed)
+        await self.bot.outbound.edit(self.message, embed=self.embed)
 
         async def go_back_to_current_page():
             await asyncio.sleep(30.0)
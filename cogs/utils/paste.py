@@ -0,0 +1,199 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Our own little pastebin, so long outputs don't have to make a round trip
+# to gist/hastebin (which are slow, and sometimes just down).
+import gzip
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from collections import OrderedDict
+
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+
+_key = re.compile(r'^[0-9a-f]{20}$')
+
+
+class PasteStore:
+    """Content-addressed, gzipped paste store with a tiny web server.
+
+    Pastes are keyed by a hash of their content, so pasting the same thing
+    twice just gives back the same link. Once the store goes over
+    ``max_bytes`` on disk, the least recently used pastes are thrown out.
+
+    Parameters
+    ------------
+    directory: str
+        Where the pastes are kept.
+    max_bytes: int
+        How big the (compressed) pastes can get in total.
+    base_url: Optional[str]
+        The public URL the web server is reachable at. If this isn't set the
+        server isn't started, and the store isn't ``public``.
+    host: str
+        What the web server binds to.
+    port: int
+        What port the web server listens on.
+    """
+
+    def __init__(self, loop, directory='pastes', *,
+                 max_bytes=256 * 1024 * 1024, base_url=None, host='0.0.0.0',
+                 port=8080):
+        self.loop = loop
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.host = host
+        self.port = port
+        self._runner = None
+
+        self.stored = 0
+        self.deduplicated = 0
+        self.served = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        # key -> size on disk, oldest first
+        self._files = OrderedDict()
+        self.total_bytes = 0
+        entries = []
+        for name in os.listdir(directory):
+            key, ext = os.path.splitext(name)
+            if ext == '.gz' and _key.match(key):
+                stat = os.stat(os.path.join(directory, name))
+                entries.append((stat.st_mtime, key, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._files[key] = size
+            self.total_bytes += size
+
+    @property
+    def public(self):
+        return self.base_url is not None
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.gz')
+
+    def _write(self, key, data):
+        path = self._path(key)
+        # unique, since the same paste can be written twice at once
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with open(fd, 'wb') as f:
+                f.write(gzip.compress(data))
+            os.replace(temp, path)
+        except BaseException:
+            os.remove(temp)
+            raise
+        return os.path.getsize(path)
+
+    def _read(self, key):
+        with open(self._path(key), 'rb') as f:
+            return f.read()
+
+    def _touch(self, key):
+        os.utime(self._path(key))
+
+    def _evict(self):
+        # always keep the newest one, even if it's huge
+        while self.total_bytes > self.max_bytes and len(self._files) > 1:
+            key, size = self._files.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    async def put(self, content):
+        """Store some text, returning its key"""
+        data = str(content).encode('utf-8')
+        key = hashlib.sha256(data).hexdigest()[:20]
+
+        if key in self._files:
+            self._files.move_to_end(key)
+            self.deduplicated += 1
+            await self.loop.run_in_executor(None, self._touch, key)
+            return key
+
+        size = await self.loop.run_in_executor(None, self._write, key, data)
+        if key in self._files:
+            # someone else pasted the same thing while we were writing
+            return key
+
+        self._files[key] = size
+        self.total_bytes += size
+        self.stored += 1
+        self._evict()
+        return key
+
+    async def get(self, key):
+        """Get the gzipped content of a paste, or None if it doesn't exist"""
+        if key not in self._files:
+            return None
+
+        self._files.move_to_end(key)
+        try:
+            return await self.loop.run_in_executor(None, self._read, key)
+        except FileNotFoundError:
+            size = self._files.pop(key, 0)
+            self.total_bytes -= size
+            return None
+
+    def url_for(self, key, filename=None):
+        if not self.public:
+            return None
+        if filename:
+            return f'{self.base_url}/{key}/{filename}'
+        return f'{self.base_url}/{key}'
+
+    async def _handle(self, request):
+        key = request.match_info['key']
+        if not _key.match(key):
+            raise web.HTTPNotFound()
+
+        data = await self.get(key)
+        if data is None:
+            raise web.HTTPNotFound()
+
+        self.served += 1
+        headers = {'Cache-Control': 'public, max-age=31536000, immutable'}
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            # already compressed on disk, no point in doing it again
+            headers['Content-Encoding'] = 'gzip'
+        else:
+            data = await self.loop.run_in_executor(None, gzip.decompress, data)
+
+        return web.Response(body=data, headers=headers,
+                            content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        if not self.public or self._runner is not None:
+            return
+
+        app = web.Application()
+        app.router.add_get('/{key}', self._handle)
+        app.router.add_get('/{key}/{filename}', self._handle)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        log.info(f'Serving pastes on {self.host}:{self.port}')
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self):
+        return {
+            'pastes': len(self._files),
+            'size on disk': f'{self.total_bytes / 1024:.1f} KiB',
+            'stored': self.stored,
+            'deduplicated': self.deduplicated,
+            'served': self.served,
+        }
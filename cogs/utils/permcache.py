@@ -0,0 +1,108 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Resolved permissions, so checks don't walk every role and overwrite on
+# every command. Entries only go stale when roles, a member's roles or a
+# channel's overwrites change, and the bot drops the affected ones when
+# that happens. That only works for members in the guild's cache, since
+# nobody else gets member updates, so anyone that isn't (fetched members,
+# with a member cache policy other than full) is never cached here.
+from collections import OrderedDict
+
+
+class PermissionCache:
+    """guild id -> member id -> channel id -> Permissions.
+
+    The channel id is None for guild wide permissions.
+
+    Parameters
+    ------------
+    max_members: int
+        How many members to keep per guild, least recently checked ones
+        go first.
+    """
+
+    def __init__(self, *, max_members=1000):
+        self.max_members = max_members
+        self.guilds = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, guild_id, member_id):
+        members = self.guilds.get(guild_id)
+        if members is None:
+            members = self.guilds[guild_id] = OrderedDict()
+
+        entry = members.get(member_id)
+        if entry is None:
+            entry = members[member_id] = {}
+            if len(members) > self.max_members:
+                members.popitem(last=False)
+        else:
+            members.move_to_end(member_id)
+
+        return entry
+
+    def channel(self, channel, member):
+        """Same as ``channel.permissions_for(member)``"""
+        guild = getattr(channel, 'guild', None)
+        if guild is None:
+            # DMs, these are fixed anyway
+            return channel.permissions_for(member)
+
+        if guild.get_member(member.id) is None:
+            self.misses += 1
+            return channel.permissions_for(member)
+
+        entry = self._entry(guild.id, member.id)
+        perms = entry.get(channel.id)
+        if perms is None:
+            self.misses += 1
+            perms = entry[channel.id] = channel.permissions_for(member)
+        else:
+            self.hits += 1
+        return perms
+
+    def guild(self, member):
+        """Same as ``member.guild_permissions``"""
+        if member.guild.get_member(member.id) is None:
+            self.misses += 1
+            return member.guild_permissions
+
+        entry = self._entry(member.guild.id, member.id)
+        perms = entry.get(None)
+        if perms is None:
+            self.misses += 1
+            perms = entry[None] = member.guild_permissions
+        else:
+            self.hits += 1
+        return perms
+
+    def forget_guild(self, guild_id):
+        self.guilds.pop(guild_id, None)
+
+    def forget_member(self, guild_id, member_id):
+        members = self.guilds.get(guild_id)
+        if members is not None:
+            members.pop(member_id, None)
+
+    def forget_channel(self, guild_id, channel_id):
+        members = self.guilds.get(guild_id)
+        if members is None:
+            return
+
+        for entry in members.values():
+            entry.pop(channel_id, None)
+
+    def clear(self):
+        self.guilds.clear()
+
+    def stats(self):
+        return {
+            'guilds': len(self.guilds),
+            'members': sum(len(m) for m in self.guilds.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,143 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Profiles a single coroutine in the middle of a running bot. The profiler
+# is only switched on while that coroutine is actually running, so the
+# rest of the bot doesn't pay for it (and doesn't show up in the results).
+import collections
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+
+class _Profiled:
+    """Awaitable that drives a coroutine one step at a time, with the
+    profiler on for each step and off whenever it's waiting on something"""
+
+    def __init__(self, coro, profiler):
+        self.coro = coro
+        self.profiler = profiler
+
+    def __await__(self):
+        coro = self.coro
+        value = exc = None
+
+        while True:
+            self.profiler.enter()
+            try:
+                if exc is not None:
+                    future = coro.throw(exc)
+                else:
+                    future = coro.send(value)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self.profiler.exit()
+
+            value = exc = None
+            try:
+                value = yield future
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as e:
+                exc = e
+
+
+def _frame_name(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:' \
+           f'{code.co_firstlineno})'
+
+
+class Profiler:
+    """Deterministic (cProfile) and sampling profiler for one coroutine.
+
+    The samples are kept as folded stacks, which speedscope and
+    flamegraph.pl can both load.
+
+    Parameters
+    ------------
+    interval: float
+        How often to take a sample, in seconds. It's really limited by how
+        often the sampling thread can get the GIL.
+    """
+
+    def __init__(self, *, interval=0.001):
+        self.interval = interval
+        self.profile = cProfile.Profile()
+        self.samples = collections.Counter()
+        self.wall_time = 0.0
+        self._active = False
+        self._running = False
+        self._thread_id = None
+
+    def enter(self):
+        self._active = True
+        self.profile.enable()
+
+    def exit(self):
+        self.profile.disable()
+        self._active = False
+
+    def _sample(self):
+        stop = _Profiled.__await__.__code__
+        while self._running:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None and frame.f_code is not stop:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    async def run(self, coro):
+        """Await a coroutine with the profilers on"""
+        self._thread_id = threading.get_ident()
+        self._running = True
+        sampler = threading.Thread(target=self._sample, daemon=True)
+        sampler.start()
+
+        start = time.perf_counter()
+        try:
+            return await _Profiled(coro, self)
+        finally:
+            self.wall_time = time.perf_counter() - start
+            self._running = False
+            sampler.join()
+
+    def folded(self):
+        return '\n'.join(f'{stack} {count}'
+                         for stack, count in self.samples.most_common())
+
+    def report(self):
+        """The full pstats output, sorted by cumulative time"""
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out) \
+            .sort_stats('cumulative').print_stats()
+        return out.getvalue()
+
+    def top(self, count=15):
+        """Lines for the functions with the most cumulative time"""
+        stats = pstats.Stats(self.profile).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][3],
+                      reverse=True)
+
+        lines = []
+        for (filename, line, func), (_, calls, _, cumulative, _) in \
+                rows[:count]:
+            where = os.path.basename(filename)
+            where = f'{where}:{line}' if line else where
+            lines.append(f'{cumulative * 1000:9.2f}ms {calls:>7} '
+                         f'{func} ({where})')
+
+        return lines
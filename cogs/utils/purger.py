@@ -0,0 +1,155 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Big purges. channel.purge is fine for a few hundred messages, but after a
+# raid there can be thousands, and Discord only lets us bulk delete ones
+# that are less than two weeks old, 100 at a time. Everything older has to
+# go one by one.
+import asyncio
+import datetime
+
+import discord
+
+BULK_SIZE = 100
+# a bit under two weeks, in case our clock and Discord's don't agree
+BULK_MAX_AGE = datetime.timedelta(days=14) - datetime.timedelta(minutes=5)
+
+
+def bulk_cutoff(now=None):
+    """Messages with ids above this can be bulk deleted"""
+    now = now or datetime.datetime.utcnow()
+    return discord.utils.time_snowflake(now - BULK_MAX_AGE)
+
+
+def plan(message_ids, now=None):
+    """Split some message ids into batches that can be bulk deleted and
+    ones that have to be deleted one at a time.
+
+    Returns a tuple of (batches, singles).
+    """
+    cutoff = bulk_cutoff(now)
+    recent = [i for i in message_ids if i > cutoff]
+    singles = [i for i in message_ids if i <= cutoff]
+
+    batches = [recent[i:i + BULK_SIZE]
+               for i in range(0, len(recent), BULK_SIZE)]
+
+    # bulk deletes need at least two messages
+    if batches and len(batches[-1]) == 1:
+        singles.insert(0, batches.pop()[0])
+
+    return batches, singles
+
+
+class PurgeJob:
+    """Scans a channel's history and deletes whatever passes ``check``.
+
+    Deletes go through the outbound queue (bulk ones as soon as a batch of
+    100 fills up) while the scan carries on, so scanning and deleting
+    overlap instead of waiting on each other.
+
+    Parameters
+    ------------
+    check: Callable[[discord.Message], bool]
+        Which messages to delete.
+    limit: int
+        How many messages to look through.
+    before: Optional[Snowflake]
+        Where to start looking from.
+    history: Optional[Callable]
+        What to scan, called like ``channel.history``. Defaults to
+        ``channel.history`` itself.
+    """
+
+    def __init__(self, bot, channel, check, limit, *, before=None,
+                 history=None):
+        self.bot = bot
+        self.channel = channel
+        self.check = check
+        self.limit = limit
+        self.before = before
+        self.history = history or channel.history
+
+        self.scanned = 0
+        self.matched = 0
+        self.deleted = 0
+        self.failed = 0
+        self.scanning = True
+        self.cancelled = False
+        self._pending = []
+
+    def _done(self, count):
+        def callback(future):
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                self.deleted += count
+            else:
+                self.failed += count
+        return callback
+
+    def _queue(self, message_ids):
+        http = self.bot.http
+        if len(message_ids) > 1:
+            future = self.bot.outbound.delete(
+                self.channel, http.delete_messages, self.channel.id,
+                message_ids, bulk=True
+            )
+        else:
+            future = self.bot.outbound.delete(
+                self.channel, http.delete_message, self.channel.id,
+                message_ids[0]
+            )
+
+        future.add_done_callback(self._done(len(message_ids)))
+        self._pending.append(future)
+
+    def cancel(self):
+        """Stop scanning, and drop any deletes that haven't happened yet"""
+        self.cancelled = True
+        for future in self._pending:
+            future.cancel()
+
+    async def run(self):
+        cutoff = bulk_cutoff()
+        recent = []
+        singles = []
+
+        async for message in self.history(limit=self.limit,
+                                          before=self.before):
+            if self.cancelled:
+                break
+
+            self.scanned += 1
+            if not self.check(message):
+                continue
+
+            self.matched += 1
+            if message.id > cutoff:
+                recent.append(message.id)
+                if len(recent) == BULK_SIZE:
+                    self._queue(recent)
+                    recent = []
+            else:
+                singles.append(message.id)
+
+        self.scanning = False
+        if not self.cancelled:
+            batches, leftover = plan(recent)
+            for batch in batches:
+                self._queue(batch)
+
+            # old messages are the slowest, so they go last
+            for message_id in leftover + singles:
+                self._queue([message_id])
+
+        await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def progress(self):
+        state = 'Scanning' if self.scanning else 'Deleting'
+        if self.cancelled:
+            state = 'Cancelled'
+        return f'{state}... scanned {self.scanned}, deleted ' \
+               f'{self.deleted}/{self.matched}' + \
+               (f', {self.failed} failed' if self.failed else '')
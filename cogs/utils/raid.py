@@ -0,0 +1,203 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Spots raids as they happen, from the joins alone. Every guild gets a
+# fixed size ring buffer of its recent joins, made of flat arrays, so a
+# flood of thousands of joins doesn't mean thousands of new objects.
+import time
+from array import array
+
+# discord's epoch, in seconds
+DISCORD_EPOCH = 1420070400
+
+# upper edges of the account age histogram, in seconds
+AGE_BINS = (
+    ('< 1 hour', 60 * 60),
+    ('< 1 day', 24 * 60 * 60),
+    ('< 1 week', 7 * 24 * 60 * 60),
+    ('< 1 month', 30 * 24 * 60 * 60),
+    ('< 1 year', 365 * 24 * 60 * 60),
+    ('older', float('inf')),
+)
+
+
+def created_at(snowflake):
+    """When an id was made, in unix time, without making a datetime"""
+    return (snowflake >> 22) / 1000 + DISCORD_EPOCH
+
+
+def _age_bin(age):
+    for index, (_, edge) in enumerate(AGE_BINS):
+        if age < edge:
+            return index
+    return len(AGE_BINS) - 1
+
+
+class JoinWindow:
+    """Ring buffer of one guild's joins, with a running count and account
+    age histogram for the ones inside the window.
+
+    Parameters
+    ------------
+    capacity: int
+        How many joins to keep. Joins past this push the oldest ones out,
+        even if they're still inside the window.
+    window: float
+        How far back, in seconds, joins count.
+    """
+
+    __slots__ = ('capacity', 'window', 'times', 'ids', 'bins', 'head',
+                 'size', 'start', 'histogram')
+
+    def __init__(self, capacity, window):
+        self.capacity = capacity
+        self.window = window
+        self.times = array('d', bytes(8 * capacity))
+        self.ids = array('Q', bytes(8 * capacity))
+        self.bins = array('B', bytes(capacity))
+        # where the next join goes
+        self.head = 0
+        # how many joins are in the buffer at all
+        self.size = 0
+        # how many of the newest ones are inside the window
+        self.start = 0
+        self.histogram = array('l', [0] * len(AGE_BINS))
+
+    def _index(self, back):
+        """Index of the join ``back`` places before the newest one"""
+        return (self.head - 1 - back) % self.capacity
+
+    def expire(self, now):
+        """Drop joins that are now outside the window"""
+        cutoff = now - self.window
+        while self.start:
+            index = self._index(self.start - 1)
+            if self.times[index] >= cutoff:
+                break
+            self.histogram[self.bins[index]] -= 1
+            self.start -= 1
+
+    def add(self, member_id, now):
+        if self.start == self.capacity:
+            # the oldest join in the window gets overwritten
+            self.histogram[self.bins[self.head]] -= 1
+            self.start -= 1
+
+        age_bin = _age_bin(now - created_at(member_id))
+        self.times[self.head] = now
+        self.ids[self.head] = member_id
+        self.bins[self.head] = age_bin
+        self.histogram[age_bin] += 1
+
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.start += 1
+        self.expire(now)
+
+    @property
+    def count(self):
+        return self.start
+
+    def young(self, bins):
+        """How many joins in the window are from accounts in the first
+        ``bins`` age bins"""
+        return sum(self.histogram[:bins])
+
+    def members(self, since=None):
+        """(member id, join time) for the joins in the window, newest
+        first, or everything since ``since`` that's still in the buffer"""
+        count = self.start if since is None else self.size
+        for back in range(count):
+            index = self._index(back)
+            if since is not None and self.times[index] < since:
+                break
+            yield self.ids[index], self.times[index]
+
+
+class RaidAlert:
+    __slots__ = ('guild_id', 'joins', 'young', 'window')
+
+    def __init__(self, guild_id, joins, young, window):
+        self.guild_id = guild_id
+        self.joins = joins
+        self.young = young
+        self.window = window
+
+
+class RaidDetector:
+    """Keeps a JoinWindow for every guild and decides when to sound the
+    alarm.
+
+    Parameters
+    ------------
+    threshold: int
+        How many joins inside the window sets it off.
+    window: float
+        How long, in seconds, the window is.
+    young_bins: int
+        How many of the ``AGE_BINS`` count as young accounts.
+    capacity: int
+        How many joins to keep per guild.
+    cooldown: float
+        How long, in seconds, to wait before alerting the same guild again.
+    """
+
+    def __init__(self, *, threshold=10, window=60.0, young_bins=3,
+                 capacity=1024, cooldown=300.0):
+        self.threshold = threshold
+        self.window = window
+        self.young_bins = young_bins
+        self.capacity = capacity
+        self.cooldown = cooldown
+        # guild id -> JoinWindow
+        self.guilds = {}
+        # guild id -> when it was last alerted
+        self.alerted = {}
+
+    def join(self, guild_id, member_id, now=None):
+        """Record a join. Returns a RaidAlert if this one set it off."""
+        now = now or time.time()
+        joins = self.guilds.get(guild_id)
+        if joins is None:
+            joins = self.guilds[guild_id] = JoinWindow(self.capacity,
+                                                       self.window)
+
+        joins.add(member_id, now)
+        if joins.count < self.threshold:
+            return None
+
+        if now - self.alerted.get(guild_id, 0) < self.cooldown:
+            return None
+
+        self.alerted[guild_id] = now
+        return RaidAlert(guild_id, joins.count, joins.young(self.young_bins),
+                         self.window)
+
+    def status(self, guild_id, now=None):
+        """Returns (joins in the window, [(bin name, count)])"""
+        joins = self.guilds.get(guild_id)
+        if joins is None:
+            return 0, [(name, 0) for name, _ in AGE_BINS]
+
+        joins.expire(now or time.time())
+        return joins.count, [(name, joins.histogram[i])
+                             for i, (name, _) in enumerate(AGE_BINS)]
+
+    def suspects(self, guild_id, since, *, young_only=True):
+        """(member id, join time) for joins since ``since`` (unix time),
+        from young accounts only unless ``young_only`` is off"""
+        joins = self.guilds.get(guild_id)
+        if joins is None:
+            return []
+
+        young_edge = AGE_BINS[self.young_bins - 1][1]
+        return [
+            (member_id, joined)
+            for member_id, joined in joins.members(since)
+            if not young_only or joined - created_at(member_id) < young_edge
+        ]
+
+    def forget(self, guild_id):
+        self.guilds.pop(guild_id, None)
+        self.alerted.pop(guild_id, None)
@@ -0,0 +1,212 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Automatic anti-spam for commands. Every decision is a couple of dict
+# lookups and some arithmetic, no awaits, so it's cheap enough to run
+# before every single command.
+import time
+from collections import OrderedDict
+
+from discord.ext import commands
+
+
+class RateLimited(commands.CheckFailure):
+    """Raised by the global check when a command gets rate limited, so the
+    error handler knows to keep quiet about it"""
+
+    def __init__(self, retry_after, *, locked=False):
+        self.retry_after = retry_after
+        self.locked = locked
+        super().__init__(f'Rate limited, try again in {retry_after:.0f}s.')
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class BucketMap:
+    """Token buckets keyed by whatever, with a size cap.
+
+    A bucket that has been left alone long enough to fill back up is the
+    same as a brand new one, so those are thrown out as they're found.
+    Buckets are kept in least recently used order, so finding them only
+    ever means looking at the front.
+
+    Parameters
+    ------------
+    rate: float
+        How many tokens every bucket gets back per second.
+    burst: int
+        How many tokens a bucket can hold.
+    maxsize: int
+        How many buckets to keep at most.
+    """
+
+    def __init__(self, rate, burst, *, maxsize=10_000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _sweep(self, now):
+        buckets = self._buckets
+        refill = self.burst / self.rate
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if now - bucket.updated < refill and len(buckets) <= self.maxsize:
+                break
+            del buckets[key]
+
+    def take(self, key, now):
+        """Take a token. Returns 0 if there was one, otherwise how many
+        seconds until there will be."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens
+                                + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._buckets.move_to_end(key)
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            retry_after = 0.0
+        else:
+            retry_after = (1 - bucket.tokens) / self.rate
+
+        self._sweep(now)
+        return retry_after
+
+
+class SpamGuard:
+    """Per user and per channel rate limits on commands.
+
+    A user going over their limit just gets their command ignored. A whole
+    channel going over its limit means something is up, so it gets locked
+    for a while, and only people with Manage Messages can use commands
+    there until it's over.
+
+    Parameters
+    ------------
+    user_rate: float
+        Commands per second a user can keep up.
+    user_burst: int
+        Commands a user can send in a row before the rate kicks in.
+    channel_rate: float
+        Commands per second a channel can keep up.
+    channel_burst: int
+        Commands a channel can see in a row before it gets locked.
+    lock_duration: float
+        How long, in seconds, a channel stays locked.
+    notify_window: float
+        How long, in seconds, to wait before telling someone they're rate
+        limited again.
+    maxsize: int
+        Cap on how many users and channels are tracked.
+    """
+
+    def __init__(self, *, user_rate=0.5, user_burst=5, channel_rate=1.0,
+                 channel_burst=20, lock_duration=120.0, notify_window=60.0,
+                 maxsize=10_000):
+        self.users = BucketMap(user_rate, user_burst, maxsize=maxsize)
+        self.channels = BucketMap(channel_rate, channel_burst,
+                                  maxsize=maxsize)
+        self.lock_duration = lock_duration
+        self.notify_window = notify_window
+        self.maxsize = maxsize
+
+        # channel id -> when the lock is over, in monotonic time
+        self.locks = {}
+        # key -> when they were last told, oldest first
+        self._notified = OrderedDict()
+
+        self.limited = 0
+        self.auto_locks = 0
+
+    def lock(self, channel_id, duration=None):
+        self.locks[channel_id] = time.monotonic() + (duration
+                                                     or self.lock_duration)
+
+    def unlock(self, channel_id):
+        self.locks.pop(channel_id, None)
+
+    def locked_for(self, channel_id, now=None):
+        """How many more seconds a channel is locked for, 0 if it isn't"""
+        until = self.locks.get(channel_id)
+        if until is None:
+            return 0.0
+
+        now = now or time.monotonic()
+        if until <= now:
+            del self.locks[channel_id]
+            return 0.0
+        return until - now
+
+    def check(self, user_id, channel_id, *, exempt=False):
+        """Count a command, raising RateLimited if it shouldn't run.
+
+        Exempt users (owners, mods) are let through without counting
+        towards anything, even in locked channels.
+        """
+        if exempt:
+            return
+
+        now = time.monotonic()
+
+        locked = self.locked_for(channel_id, now)
+        if locked:
+            self.limited += 1
+            raise RateLimited(locked, locked=True)
+
+        # the user goes first, so one person spamming only uses up their
+        # own bucket and can't get the channel locked on their own
+        retry_after = self.users.take(user_id, now)
+        if retry_after:
+            self.limited += 1
+            raise RateLimited(retry_after)
+
+        if self.channels.take(channel_id, now):
+            self.lock(channel_id)
+            self.auto_locks += 1
+            self.limited += 1
+            raise RateLimited(self.lock_duration, locked=True)
+
+    def should_notify(self, key):
+        """Whether to tell ``key`` about being limited. At most once per
+        ``notify_window`` for the same key."""
+        now = time.monotonic()
+        notified = self._notified
+
+        # forget anyone whose window is over
+        while notified:
+            oldest, when = next(iter(notified.items()))
+            if now - when < self.notify_window \
+                    and len(notified) <= self.maxsize:
+                break
+            del notified[oldest]
+
+        if key in notified:
+            return False
+
+        notified[key] = now
+        return True
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'user buckets': len(self.users),
+            'channel buckets': len(self.channels),
+            'locked channels': sum(1 for c in list(self.locks)
+                                   if self.locked_for(c, now)),
+            'limited': self.limited,
+            'auto locks': self.auto_locks,
+        }
@@ -0,0 +1,188 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# The last few hundred messages of every channel, as the gateway hands them
+# to us. Purges and cleans look here first, so the common case (cleaning up
+# something that happened a minute ago) doesn't need a single history
+# request. Anything older than what's here still comes from history.
+from collections import OrderedDict, deque
+
+import discord
+
+EMBEDS = 1 << 0
+ATTACHMENTS = 1 << 1
+DELETED = 1 << 2
+
+
+def _flags(message):
+    return (EMBEDS if message.embeds else 0) \
+        | (ATTACHMENTS if message.attachments else 0)
+
+
+class MessageRecord:
+    """What's kept of a message. Has the same attributes the purge filters
+    look at, so they can run on these and on real messages alike.
+
+    ``content`` is the same string the message had, not a copy.
+    """
+
+    __slots__ = ('id', 'author', 'content', 'digest', 'flags')
+
+    def __init__(self, message):
+        self.id = message.id
+        self.author = message.author
+        self.flags = 0
+        self.update(message)
+
+    def update(self, message):
+        self.content = message.content
+        self.digest = hash(message.content)
+        self.flags = _flags(message) | (self.flags & DELETED)
+
+    @property
+    def embeds(self):
+        return (None,) if self.flags & EMBEDS else ()
+
+    @property
+    def attachments(self):
+        return (None,) if self.flags & ATTACHMENTS else ()
+
+    @property
+    def deleted(self):
+        return bool(self.flags & DELETED)
+
+
+class ChannelBuffer:
+    """Ring buffer of one channel's records, oldest first.
+
+    Every message from the oldest record on has been seen, so everything
+    newer than ``oldest`` is in here (or was deleted).
+    """
+
+    __slots__ = ('records', 'index')
+
+    def __init__(self, size):
+        self.records = deque(maxlen=size)
+        # message id -> record, for edits and deletes
+        self.index = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def oldest(self):
+        return self.records[0].id if self.records else None
+
+    def add(self, message):
+        records = self.records
+        if len(records) == records.maxlen:
+            self.index.pop(records[0].id, None)
+
+        record = MessageRecord(message)
+        records.append(record)
+        self.index[record.id] = record
+
+    def newest_first(self, before=None):
+        for record in reversed(self.records):
+            if record.flags & DELETED:
+                continue
+            if before is not None and record.id >= before:
+                continue
+            yield record
+
+
+class RecentMessages:
+    """Keeps a ChannelBuffer for the channels that were active most
+    recently.
+
+    Parameters
+    ------------
+    per_channel: int
+        How many messages to keep for each channel.
+    max_channels: int
+        How many channels to keep messages for. The ones that have been
+        quiet the longest get dropped first.
+    """
+
+    def __init__(self, *, per_channel=200, max_channels=500):
+        self.per_channel = per_channel
+        self.max_channels = max_channels
+        # channel id -> ChannelBuffer, least recently active first
+        self.channels = OrderedDict()
+
+        self.hits = 0
+        self.fallbacks = 0
+
+    def add(self, message):
+        channels = self.channels
+        buffer = channels.get(message.channel.id)
+        if buffer is None:
+            buffer = channels[message.channel.id] = \
+                ChannelBuffer(self.per_channel)
+            if len(channels) > self.max_channels:
+                channels.popitem(last=False)
+        else:
+            channels.move_to_end(message.channel.id)
+
+        buffer.add(message)
+
+    def _record(self, channel_id, message_id):
+        buffer = self.channels.get(channel_id)
+        if buffer is None:
+            return None
+        return buffer.index.get(message_id)
+
+    def edit(self, message):
+        record = self._record(message.channel.id, message.id)
+        if record is not None:
+            record.update(message)
+
+    def delete(self, channel_id, message_id):
+        buffer = self.channels.get(channel_id)
+        if buffer is None:
+            return
+
+        record = buffer.index.pop(message_id, None)
+        if record is not None:
+            record.flags |= DELETED
+
+    def clear(self):
+        """Forget everything. Needed whenever messages might have been
+        missed, like after a reconnect that couldn't resume."""
+        self.channels.clear()
+
+    async def history(self, channel, *, limit, before=None):
+        """Like ``channel.history``, newest first, but whatever is in the
+        buffer comes from the buffer. Yields MessageRecords for those, and
+        Messages for anything older."""
+        before_id = getattr(before, 'id', before)
+        buffer = self.channels.get(channel.id)
+
+        if buffer is not None and buffer.records:
+            # copied, since messages keep coming in while we're yielding
+            oldest = buffer.oldest
+            records = list(buffer.newest_first(before_id))[:limit]
+            self.hits += len(records)
+            limit -= len(records)
+            for record in records:
+                yield record
+
+            # nothing older than the oldest record is in the buffer
+            if before_id is None or oldest < before_id:
+                before = discord.Object(id=oldest)
+
+        if limit <= 0:
+            return
+
+        self.fallbacks += 1
+        async for message in channel.history(limit=limit, before=before):
+            yield message
+
+    def stats(self):
+        return {
+            'channels': len(self.channels),
+            'messages': sum(len(b) for b in self.channels.values()),
+            'buffer hits': self.hits,
+            'history fallbacks': self.fallbacks,
+        }
@@ -0,0 +1,102 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Lets people edit a command message to run it again. Only ids are kept,
+# not Message objects, and only for a little while.
+import time
+from collections import OrderedDict
+
+
+class _Entry:
+    __slots__ = ('channel_id', 'responses', 'expires')
+
+    def __init__(self, channel_id, expires):
+        self.channel_id = channel_id
+        self.responses = []
+        self.expires = expires
+
+
+class RerunCache:
+    """Maps command messages to the ids of the responses they got, plus the
+    task that's running them if there is one.
+
+    Parameters
+    ------------
+    maxsize: int
+        How many command messages to remember.
+    ttl: float
+        How long, in seconds, after a command's last response an edit to it
+        still reruns it.
+    max_responses: int
+        How many responses to remember per command. Any past that just
+        don't get cleaned up on a rerun.
+    """
+
+    def __init__(self, *, maxsize=1000, ttl=300.0, max_responses=10):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_responses = max_responses
+        # trigger id -> _Entry, least recently used first
+        self._entries = OrderedDict()
+        # trigger id -> task
+        self._running = {}
+
+        self.reruns = 0
+        self.cancelled = 0
+
+    def _prune(self, now):
+        entries = self._entries
+        while entries:
+            trigger_id, entry = next(iter(entries.items()))
+            if entry.expires > now and len(entries) <= self.maxsize:
+                break
+            del entries[trigger_id]
+
+    def track(self, trigger_id, channel_id):
+        """Start remembering a command message"""
+        now = time.monotonic()
+        self._entries[trigger_id] = _Entry(channel_id, now + self.ttl)
+        self._entries.move_to_end(trigger_id)
+        self._prune(now)
+
+    def record(self, trigger_id, response_id):
+        """Remember a response to a command message we're tracking"""
+        entry = self._entries.get(trigger_id)
+        if entry is None:
+            return
+
+        if len(entry.responses) < self.max_responses:
+            entry.responses.append(response_id)
+        entry.expires = time.monotonic() + self.ttl
+        self._entries.move_to_end(trigger_id)
+
+    def pop(self, trigger_id):
+        """Forget a command message, returning its entry if it hasn't
+        expired yet"""
+        entry = self._entries.pop(trigger_id, None)
+        if entry is None or entry.expires <= time.monotonic():
+            return None
+        return entry
+
+    def start(self, trigger_id, task):
+        self._running[trigger_id] = task
+
+    def finish(self, trigger_id, task):
+        if self._running.get(trigger_id) is task:
+            del self._running[trigger_id]
+
+    def cancel(self, trigger_id):
+        """Cancel the command if it's still running"""
+        task = self._running.pop(trigger_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            self.cancelled += 1
+
+    def stats(self):
+        return {
+            'tracked': len(self._entries),
+            'running': len(self._running),
+            'reruns': self.reruns,
+            'cancelled': self.cancelled,
+        }
@@ -0,0 +1,132 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# One HTTP session for the whole bot, instead of a new ClientSession (and a
+# new TCP/TLS handshake) every time some command wants to hit an API.
+import json
+import logging
+
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+class PooledSession:
+    """Shared aiohttp session with keep-alive connection pooling.
+
+    Parameters
+    ------------
+    limit: int
+        How many connections can be open at once.
+    limit_per_host: int
+        How many connections can be open to the same host at once.
+    dns_ttl: int
+        How long, in seconds, DNS lookups are cached.
+    timeout: float
+        Default total timeout for a request, in seconds.
+    max_size: int
+        Default cap on how many bytes a response body can be.
+    """
+
+    def __init__(self, loop, *, limit=100, limit_per_host=10, dns_ttl=300,
+                 timeout=30.0, max_size=8 * 1024 * 1024):
+        self.loop = loop
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.timeout = timeout
+        self.max_size = max_size
+        self._session = None
+
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    # the session has to be made inside a coroutine, so it's made on the
+    # first request instead of in __init__
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(self._on_create)
+            trace.on_connection_reuseconn.append(self._on_reuse)
+
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_ttl,
+                loop=self.loop
+            )
+
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[trace],
+                loop=self.loop
+            )
+
+        return self._session
+
+    async def _on_create(self, session, ctx, params):
+        self.connections_created += 1
+
+    async def _on_reuse(self, session, ctx, params):
+        self.connections_reused += 1
+
+    async def read(self, url, *, method='GET', max_size=None, **kwargs):
+        """Make a request and read the body, up to ``max_size`` bytes.
+
+        Returns a tuple of the response and the body. Raises
+        ResponseTooLarge if the body is bigger than the cap.
+        """
+        max_size = max_size or self.max_size
+        self.requests += 1
+
+        async with self._get_session().request(method, url, **kwargs) as resp:
+            if resp.content_length is not None \
+                    and resp.content_length > max_size:
+                raise ResponseTooLarge(
+                    f'{url} is {resp.content_length} bytes, the limit is '
+                    f'{max_size}.'
+                )
+
+            body = bytearray()
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                body.extend(chunk)
+                if len(body) > max_size:
+                    raise ResponseTooLarge(
+                        f'{url} is over the limit of {max_size} bytes.'
+                    )
+
+            return resp, bytes(body)
+
+    async def content(self, url, **kwargs):
+        _, body = await self.read(url, **kwargs)
+        return body
+
+    async def text(self, url, **kwargs):
+        resp, body = await self.read(url, **kwargs)
+        return body.decode(resp.charset or 'utf-8', errors='replace')
+
+    async def json(self, url, **kwargs):
+        # decoded here so APIs that lie about their content type still work
+        return json.loads(await self.text(url, **kwargs))
+
+    def stats(self):
+        total = self.connections_created + self.connections_reused
+        return {
+            'requests': self.requests,
+            'connections created': self.connections_created,
+            'connections reused': self.connections_reused,
+            'reuse rate': f'{self.connections_reused / total:.1%}'
+                          if total else 'n/a',
+        }
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,186 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# Color swatch images for the color commands. Pixels are built as raw RGB
+# bytes by repeating whole runs (a color times a swatch's width, a row of
+# swatches times their height), so there's no per pixel Python and no
+# drawing calls, and the image size is capped however many colors there
+# are. PIL only does the PNG encoding, and all of it runs off the event
+# loop.
+import io
+import math
+from collections import OrderedDict
+
+from PIL import Image
+
+MAX_COLORS = 64
+MAX_COLUMNS = 8
+MAX_SIZE = 1024
+CELL_SIZE = 256
+
+GRADIENT_SIZE = (768, 128)
+# how many tints and shades palette shows on each side of a color
+PALETTE_STEPS = 3
+
+# what empty cells get filled with, Discord's dark background
+BACKGROUND = (0x36, 0x39, 0x3f)
+
+
+def rgb(value):
+    return value >> 16, value >> 8 & 0xff, value & 0xff
+
+
+def _check(values):
+    if not values:
+        raise ValueError('No colors given.')
+    if len(values) > MAX_COLORS:
+        raise ValueError(f'That\'s too many colors, the limit is '
+                         f'{MAX_COLORS}.')
+
+
+def _cells(rows, cell_width, cell_height, columns):
+    """Raw RGB bytes for a grid, each row being a list of (r, g, b)"""
+    blank = bytes(BACKGROUND) * cell_width
+    out = []
+    for row in rows:
+        line = b''.join(bytes(c) * cell_width for c in row) \
+            + blank * (columns - len(row))
+        out.append(line * cell_height)
+    return b''.join(out)
+
+
+def grid(values):
+    """Lays the colors out in a grid, at most ``MAX_SIZE`` pixels each way.
+
+    Returns (size, RGB bytes).
+    """
+    _check(values)
+    columns = min(len(values), MAX_COLUMNS)
+    rows = math.ceil(len(values) / columns)
+    cell = min(CELL_SIZE, MAX_SIZE // columns, MAX_SIZE // rows)
+
+    colors = [rgb(v) for v in values]
+    data = _cells([colors[i:i + columns]
+                   for i in range(0, len(colors), columns)],
+                  cell, cell, columns)
+    return (columns * cell, rows * cell), data
+
+
+def gradient(values, size=GRADIENT_SIZE):
+    """A left to right gradient through the colors.
+
+    Returns (size, RGB bytes).
+    """
+    _check(values)
+    width, height = size
+    stops = [rgb(v) for v in values]
+    if len(stops) == 1:
+        stops *= 2
+
+    # only one row is worked out, the rest are copies of it
+    row = bytearray()
+    span = (width - 1) / (len(stops) - 1)
+    for x in range(width):
+        position = x / span
+        index = min(int(position), len(stops) - 2)
+        t = position - index
+        start, end = stops[index], stops[index + 1]
+        row.extend(round(a + (b - a) * t) for a, b in zip(start, end))
+
+    return size, bytes(row) * height
+
+
+def palette(values):
+    """Every color in a row, with tints to its right and shades to its
+    left, darkest to lightest.
+
+    Returns (size, RGB bytes).
+    """
+    _check(values)
+    columns = PALETTE_STEPS * 2 + 1
+    cell = min(CELL_SIZE // 2, MAX_SIZE // columns, MAX_SIZE // len(values))
+
+    rows = []
+    for value in values:
+        color = rgb(value)
+        row = []
+        for step in range(-PALETTE_STEPS, PALETTE_STEPS + 1):
+            # towards black for shades, towards white for tints
+            t = abs(step) / (PALETTE_STEPS + 1)
+            target = 0 if step < 0 else 255
+            row.append(tuple(round(c + (target - c) * t) for c in color))
+        rows.append(row)
+
+    return (columns * cell, len(values) * cell), _cells(rows, cell, cell,
+                                                       columns)
+
+
+RENDERERS = {'grid': grid, 'gradient': gradient, 'palette': palette}
+
+
+def render(kind, values):
+    """PNG bytes for ``kind`` of ``values``. Slow-ish, so run it in an
+    executor."""
+    size, data = RENDERERS[kind](values)
+    bio = io.BytesIO()
+    Image.frombytes('RGB', size, data).save(bio, 'PNG')
+    return bio.getvalue()
+
+
+class SwatchCache:
+    """LRU cache of rendered PNGs, by kind and colors.
+
+    Parameters
+    ------------
+    maxsize: int
+        How many images to keep.
+    max_bytes: int
+        How many bytes of PNGs to keep, at most.
+    """
+
+    def __init__(self, *, maxsize=128, max_bytes=16 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    async def render(self, loop, kind, values):
+        """PNG bytes for ``kind`` (one of ``RENDERERS``) of ``values``.
+        Raises ValueError for bad color lists."""
+        key = (kind, tuple(values))
+        png = self._data.get(key)
+        if png is not None:
+            self.hits += 1
+            self._data.move_to_end(key)
+            return png
+
+        self.misses += 1
+        png = await loop.run_in_executor(None, render, kind, values)
+
+        # the same thing might have been rendered in the meantime, in which
+        # case it's already counted
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._data[key] = png
+        self.size += len(png)
+        while len(self._data) > self.maxsize or self.size > self.max_bytes:
+            _, old = self._data.popitem(last=False)
+            self.size -= len(old)
+
+        return png
+
+    def stats(self):
+        return {
+            'images': len(self._data),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,106 @@
+# Copyright (c) 2017 Perry Fraser
+#
+# Licensed under the MIT License. https://opensource.org/licenses/MIT
+
+# timeit, but for a running bot: snippets can be coroutines, and the event
+# loop gets to run between batches so the gateway heartbeat doesn't notice.
+import ast
+import asyncio
+import math
+import statistics
+import textwrap
+import time
+
+# how long one batch should take, in seconds
+BATCH_TIME = 0.05
+# how long the whole thing should take, in seconds
+TOTAL_TIME = 2.0
+
+
+def is_async(body):
+    """Whether a snippet awaits anything (and so has to be a coroutine)"""
+    try:
+        tree = ast.parse(f'async def _():\n{textwrap.indent(body, "  ")}')
+    except SyntaxError:
+        return True
+
+    return any(isinstance(node, (ast.Await, ast.AsyncFor, ast.AsyncWith))
+               for node in ast.walk(tree))
+
+
+def compile_snippet(body, env):
+    """Turns a snippet into a function in ``env``, a coroutine function if
+    it needs to be one. Raises SyntaxError."""
+    header = 'async def func():' if is_async(body) else 'def func():'
+    exec(f'{header}\n{textwrap.indent(body, "  ")}', env)
+    return env['func']
+
+
+async def run_batch(func, number):
+    """Time ``number`` calls, in seconds"""
+    if asyncio.iscoroutinefunction(func):
+        start = time.perf_counter()
+        for _ in range(number):
+            await func()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - start
+
+
+async def autorange(func, *, target=BATCH_TIME):
+    """Find how many calls make a batch take at least ``target`` seconds,
+    going 1, 2, 5, 10, 20, 50... like timeit does."""
+    i = 1
+    while True:
+        for number in (i, i * 2, i * 5):
+            elapsed = await run_batch(func, number)
+            await asyncio.sleep(0)
+            if elapsed >= target:
+                return number
+        i *= 10
+
+
+async def bench(func, *, warmup=2, total=TOTAL_TIME, min_runs=5,
+                max_runs=100):
+    """Time a function over a bunch of batches.
+
+    Returns a tuple of (loops per batch, seconds per loop for every batch).
+    """
+    number = await autorange(func)
+
+    for _ in range(warmup):
+        await run_batch(func, number)
+        await asyncio.sleep(0)
+
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < max_runs:
+        samples.append(await run_batch(func, number) / number)
+        # let everything else have a go between batches
+        await asyncio.sleep(0)
+
+        if len(samples) >= min_runs and time.perf_counter() - start >= total:
+            break
+
+    return number, samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p95 = ordered[max(0, math.ceil(len(ordered) * 0.95) - 1)]
+    return {
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'p95': p95,
+        'stdev': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e3), ('\N{MICRO SIGN}s', 1e6)):
+        if seconds * scale >= 1:
+            return f'{seconds * scale:.3g}{unit}'
+    return f'{seconds * 1e9:.3g}ns'